@@ -0,0 +1,219 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Lower rank is admitted first
+PRIORITY_RANKS = {"high": 0, "normal": 1, "low": 2}
+
+# Header carrying how many milliseconds the client is willing to wait
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+class OverloadedError(RuntimeError):
+    """Raised when the estimated queue wait exceeds the admission SLO."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class DeadlineExceededError(RuntimeError):
+    """Raised when a request's deadline passes before it reaches the model."""
+
+def deadline_from_header(value: Optional[str]) -> Optional[float]:
+    """Turn an ``X-Request-Deadline-Ms`` value into a ``time.monotonic`` deadline."""
+    if not value:
+        return None
+    try:
+        return time.monotonic() + max(float(value), 0.0) / 1000
+    except ValueError:
+        return None
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+def _rank(priority: Optional[str]) -> int:
+    return PRIORITY_RANKS.get(priority or "normal", PRIORITY_RANKS["normal"])
+
+class AdmissionTicket:
+    """A request's priority, which can still be raised while it waits.
+
+    Requests sharing one model call (see ``RequestCoalescer``) pass the same
+    ticket, so the call waits at the highest priority among them.
+    """
+
+    __slots__ = ("rank", "_controller", "_future")
+
+    def __init__(self, priority: str = "normal"):
+        self.rank = _rank(priority)
+        self._controller: Optional["AdmissionController"] = None
+        self._future: Optional[asyncio.Future] = None
+
+    def raise_priority(self, priority: str):
+        """Wait at ``priority`` from now on if it is higher than the current one."""
+        rank = _rank(priority)
+        if rank >= self.rank:
+            return
+        if self._controller is not None:
+            self._controller._requeue(self, rank)
+        else:
+            self.rank = rank
+
+class AdmissionController:
+    """Priority queue in front of model inference.
+
+    At most ``max_concurrent`` requests hold an inference slot at once; the
+    rest wait in priority order (``high``, ``normal``, ``low``; first come,
+    first served within a priority). A request is shed instead of queued when
+    its estimated wait exceeds ``queue_slo_ms`` (``OverloadedError``) or
+    would run past its deadline, and a waiting request is dropped as soon as
+    its deadline passes (``DeadlineExceededError``).
+
+    The wait estimate is the number of requests ahead, spread over the
+    slots, times a moving average of how long a request holds a slot.
+    Not thread-safe; use it from the event loop.
+    """
+
+    def __init__(self, max_concurrent: int, queue_slo_ms: float = 2000, name: str = "inference"):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self.queue_slo = queue_slo_ms / 1000
+        self.name = name
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._waiting = [0] * len(PRIORITY_RANKS)  # live waiters per rank
+        self._order = itertools.count()
+        self._service_seconds: Optional[float] = None
+        self.metrics = {
+            "admitted": 0,
+            "queued": 0,
+            "shed_overload": 0,
+            "shed_deadline": 0,
+            "average_queue_wait_ms": 0.0,
+            "max_queue_wait_ms": 0.0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._waiting)
+
+    def estimated_wait(self, priority: str = "normal") -> float:
+        """Seconds a request of ``priority`` arriving now would wait for a slot."""
+        return self._estimate(_rank(priority))
+
+    def retry_after(self, priority: str = "normal") -> Optional[float]:
+        """Seconds to wait before retrying if a request would be shed now, else None."""
+        estimated = self.estimated_wait(priority)
+        return estimated if estimated > self.queue_slo else None
+
+    @asynccontextmanager
+    async def admit(self, priority: Union[str, AdmissionTicket] = "normal", deadline: Optional[float] = None):
+        """Hold an inference slot for the body of the ``async with`` block.
+
+        ``priority`` is a priority name or a shared ``AdmissionTicket``.
+        """
+        ticket = priority if isinstance(priority, AdmissionTicket) else AdmissionTicket(priority)
+        await self._acquire(ticket, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record_service(time.monotonic() - started)
+            self._release()
+
+    async def _acquire(self, ticket: AdmissionTicket, deadline: Optional[float]):
+        arrived = time.monotonic()
+        if deadline is not None and deadline <= arrived:
+            self._shed_deadline()
+
+        if self._active < self.max_concurrent and not self.queue_depth:
+            self._active += 1
+            self._record_admission(0.0)
+            return
+
+        estimated = self._estimate(ticket.rank)
+        if estimated > self.queue_slo:
+            self.metrics["shed_overload"] += 1
+            raise OverloadedError(
+                f"{self.name} queue wait of {estimated:.1f}s exceeds the {self.queue_slo:.1f}s SLO",
+                retry_after=estimated
+            )
+        if deadline is not None and arrived + estimated > deadline:
+            self._shed_deadline()
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (ticket.rank, next(self._order), future))
+        self._waiting[ticket.rank] += 1
+        ticket._controller, ticket._future = self, future
+        self.metrics["queued"] += 1
+        try:
+            await asyncio.wait_for(future, None if deadline is None else deadline - arrived)
+        except asyncio.TimeoutError:
+            self._waiting[ticket.rank] -= 1
+            self._shed_deadline()
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller went away
+                self._release()
+            else:
+                self._waiting[ticket.rank] -= 1
+            raise
+        finally:
+            ticket._controller = ticket._future = None
+        self._record_admission(time.monotonic() - arrived)
+
+    def _estimate(self, rank: int) -> float:
+        if self._active < self.max_concurrent and not self.queue_depth:
+            return 0.0
+        ahead = sum(self._waiting[:rank + 1])
+        return (ahead // self.max_concurrent + 1) * (self._service_seconds or 0.0)
+
+    def _requeue(self, ticket: AdmissionTicket, rank: int):
+        # The old heap entry stays behind and is skipped once the future is done
+        self._waiting[ticket.rank] -= 1
+        self._waiting[rank] += 1
+        ticket.rank = rank
+        heapq.heappush(self._waiters, (rank, next(self._order), ticket._future))
+
+    def _release(self):
+        # Hand the slot straight to the next live waiter
+        while self._waiters:
+            rank, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._waiting[rank] -= 1
+            future.set_result(None)
+            return
+        self._active -= 1
+
+    def _shed_deadline(self):
+        self.metrics["shed_deadline"] += 1
+        raise DeadlineExceededError("Request deadline passed before inference started")
+
+    def _record_admission(self, wait_seconds: float):
+        self.metrics["admitted"] += 1
+        wait_ms = wait_seconds * 1000
+        self.metrics["average_queue_wait_ms"] += (
+            (wait_ms - self.metrics["average_queue_wait_ms"]) / self.metrics["admitted"]
+        )
+        self.metrics["max_queue_wait_ms"] = max(self.metrics["max_queue_wait_ms"], wait_ms)
+
+    def _record_service(self, seconds: float):
+        if self._service_seconds is None:
+            self._service_seconds = seconds
+        else:
+            self._service_seconds += 0.2 * (seconds - self._service_seconds)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "active": self._active,
+            "queue_depth": self.queue_depth,
+            "estimated_wait_ms": self.estimated_wait() * 1000,
+        }
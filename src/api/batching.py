@@ -0,0 +1,77 @@
+import logging
+import os
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from .schemas.base import BatchItemError, BatchItemResult, ChatResponse
+from ..admission import DeadlineExceededError, OverloadedError
+from ..chatbot import Chatbot
+from ..executors import ExecutorSaturatedError
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+
+def check_batch_size(size: int):
+    """Reject empty batches and batches over ``BATCH_MAX_ITEMS``."""
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if size > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch has {size} queries; at most {MAX_BATCH_ITEMS} are allowed"
+        )
+
+def batch_error(error: Exception) -> BatchItemError:
+    if isinstance(error, OverloadedError):
+        return BatchItemError(status=503, detail="Server is overloaded. Please retry shortly.")
+    if isinstance(error, DeadlineExceededError):
+        return BatchItemError(status=504, detail=str(error))
+    if isinstance(error, ExecutorSaturatedError):
+        return BatchItemError(status=503, detail="Inference queue is full. Please retry shortly.")
+    return BatchItemError(status=500, detail=str(error))
+
+def stream_batch(
+    chatbot: Chatbot,
+    queries: AsyncIterator[Tuple[str, Dict, Optional[str]]],
+    domain: str,
+    on_result: Optional[Callable[[str, str, float], None]] = None,
+    deadline: Optional[float] = None
+) -> StreamingResponse:
+    """Answer ``(text, context, priority)`` queries as NDJSON, one ``BatchItemResult`` per line.
+
+    Lines follow query order and are written as soon as each result is
+    ready. A failed query gets an ``error`` line instead of failing the
+    whole batch. Queries without a priority are admitted at low priority,
+    and queries not started by ``deadline`` get a 504 line. ``on_result``
+    is called with the text, response and confidence of every answered
+    query.
+    """
+    pending: Dict[int, Tuple[str, Dict]] = {}
+
+    async def tracked_queries():
+        index = 0
+        async for text, context, priority in queries:
+            pending[index] = (text, context)
+            index += 1
+            yield text, context, priority
+
+    async def lines():
+        async for index, outcome in chatbot.generate_responses(tracked_queries(), domain=domain, deadline=deadline):
+            text, context = pending.pop(index)
+            if isinstance(outcome, Exception):
+                logger.error(f"Error answering batch query {index}: {str(outcome)}")
+                item = BatchItemResult(index=index, error=batch_error(outcome))
+            else:
+                response, confidence = outcome
+                item = BatchItemResult(
+                    index=index,
+                    result=ChatResponse(response=response, confidence=confidence, context=context)
+                )
+                if on_result:
+                    on_result(text, response, confidence)
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
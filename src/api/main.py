@@ -7,6 +7,8 @@ import uvicorn
 from .routes import financial, support, auth
 from .middleware.authentication import AuthenticationMiddleware
 from .middleware.rate_limiter import RateLimitMiddleware
+from ..security import password_executor
+from ..token_cache import token_cache
 
 app = FastAPI(
     title="Custom NLP Chatbot",
@@ -23,7 +25,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add custom middleware
+# Add custom middleware; the last one added runs first, so every request
+# is counted by the rate limiter, including ones that fail authentication
 app.add_middleware(AuthenticationMiddleware)
 app.add_middleware(RateLimitMiddleware)
 
@@ -32,6 +35,21 @@ app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(financial.router, prefix="/api/v1/financial", tags=["Financial"])
 app.include_router(support.router, prefix="/api/v1/support", tags=["Support"])
 
+@app.on_event("startup")
+async def start_background_tasks():
+    financial.context_manager.start_expiry_sweeper()
+    support.context_manager.start_expiry_sweeper()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await financial.context_manager.stop_expiry_sweeper()
+    await support.context_manager.stop_expiry_sweeper()
+    financial.context_manager.close()
+    support.context_manager.close()
+    await financial.market_data_client.close()
+    await financial.chatbot.close()
+    await support.chatbot.close()
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"Global exception handler caught: {exc}")
@@ -44,5 +62,15 @@ async def global_exception_handler(request: Request, exc: Exception):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "auth_tokens": token_cache.get_metrics(),
+        "password_hashing": password_executor.get_metrics(),
+        "financial_admission": financial.chatbot.admission.get_metrics(),
+        "support_admission": support.chatbot.admission.get_metrics(),
+        "market_data": financial.market_data_client.get_metrics(),
+    }
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
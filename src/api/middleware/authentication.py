@@ -1,49 +1,76 @@
-from fastapi import Request, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from starlette.middleware.base import BaseHTTPMiddleware
-from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from jose import JWTError
 from datetime import datetime
 from typing import Optional
 import os
 
-class AuthenticationMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.security = HTTPBearer()
+from ...token_cache import TokenRevokedError, token_cache
+
+ALGORITHM = "HS256"
+
+class AuthenticationError(Exception):
+    """A request could not be authenticated."""
+
+def get_bearer_token(scope: Scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and credentials:
+                return credentials.strip()
+            return None
+    return None
+
+def authenticate(scope: Scope, secret_key: Optional[str] = None, algorithm: str = ALGORITHM) -> dict:
+    """Return the verified token payload of a request.
+
+    Raises ``AuthenticationError`` when the request has no valid token.
+    Verified payloads are cached until the token expires, so calling this
+    from several middlewares costs one signature check per token.
+    """
+    token = get_bearer_token(scope)
+    if not token:
+        raise AuthenticationError("Invalid authentication token")
+    secret_key = secret_key or os.getenv("JWT_SECRET_KEY", "your-secret-key")  # In production, use env var
+    try:
+        payload = token_cache.verify(token, secret_key, algorithm)
+        if payload.get("exp") and datetime.utcfromtimestamp(payload["exp"]) < datetime.utcnow():
+            raise AuthenticationError("Token has expired")
+        return payload
+    except TokenRevokedError:
+        raise AuthenticationError("Token has been revoked")
+    except JWTError:
+        raise AuthenticationError("Could not validate credentials")
+
+class AuthenticationMiddleware:
+    """Pure ASGI middleware that verifies the bearer token of every request.
+
+    Unauthenticated requests get a 401 response straight from the
+    middleware; authenticated ones reach the app with the token payload in
+    ``request.state.user``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
         self.secret_key = os.getenv("JWT_SECRET_KEY", "your-secret-key")  # In production, use env var
-        self.algorithm = "HS256"
+        self.algorithm = ALGORITHM
         self.public_paths = {"/health", "/auth/login", "/auth/register", "/docs", "/openapi.json"}
 
-    async def dispatch(self, request: Request, call_next):
-        if request.url.path in self.public_paths:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.public_paths:
+            await self.app(scope, receive, send)
+            return
 
         try:
-            token = await self._get_token(request)
-            if not token:
-                raise HTTPException(status_code=401, detail="Invalid authentication token")
-
-            payload = self._verify_token(token)
-            request.state.user = payload
-            
-            return await call_next(request)
-        except HTTPException as e:
-            raise e
-        except Exception as e:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-
-    async def _get_token(self, request: Request) -> Optional[str]:
-        try:
-            auth = await self.security(request)
-            return auth.credentials if isinstance(auth, HTTPAuthorizationCredentials) else None
-        except:
-            return None
+            payload = authenticate(scope, self.secret_key, self.algorithm)
+        except AuthenticationError as e:
+            response = JSONResponse(
+                {"detail": str(e)},
+                status_code=401,
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+            await response(scope, receive, send)
+            return
 
-    def _verify_token(self, token: str) -> dict:
-        try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            if payload.get("exp") and datetime.utcfromtimestamp(payload["exp"]) < datetime.utcnow():
-                raise HTTPException(status_code=401, detail="Token has expired")
-            return payload
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Could not validate credentials")
+        scope.setdefault("state", {})["user"] = payload
+        await self.app(scope, receive, send)
@@ -1,64 +1,93 @@
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from datetime import datetime, timedelta
-import asyncio
-from collections import defaultdict
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import hashlib
+import math
 import os
+import time
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.rate_limits = defaultdict(list)  # IP -> list of request timestamps
+from ...rate_limit import RateLimitResult, create_rate_limit_backend
+from .authentication import AuthenticationError, authenticate
+
+RATE_LIMIT_KEYS = ("ip", "sub", "api_key")
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware limiting how many requests each client makes.
+
+    Requests over the limit get a 429 response straight from the
+    middleware; allowed ones pass through untouched apart from the
+    ``X-RateLimit-*`` headers added to the response start message, so
+    streaming responses are never buffered.
+
+    It runs before authentication, so requests that go on to fail
+    authentication are counted too.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
         self.max_requests = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "100"))  # requests per window
         self.window_size = int(os.getenv("RATE_LIMIT_WINDOW_SIZE", "3600"))  # window size in seconds
-        self.cleanup_interval = 3600  # cleanup old entries every hour
-        asyncio.create_task(self._cleanup_task())
-
-    async def dispatch(self, request: Request, call_next):
-        if request.url.path == "/health":  # Don't rate limit health checks
-            return await call_next(request)
+        self.algorithm = os.getenv("RATE_LIMIT_ALGORITHM", "sliding_window")  # or token_bucket
+        self.key_by = os.getenv("RATE_LIMIT_KEY", "ip")  # ip, sub (JWT subject) or api_key
+        if self.key_by not in RATE_LIMIT_KEYS:
+            raise ValueError(f"Unknown rate limit key: {self.key_by}. Expected one of {', '.join(RATE_LIMIT_KEYS)}")
+        self.backend = create_rate_limit_backend(
+            self.algorithm,
+            self.max_requests,
+            self.window_size,
+            kind=os.getenv("RATE_LIMIT_BACKEND", "memory"),  # memory or redis (shared by workers)
+            redis_url=os.getenv("REDIS_URL")
+        )
 
-        client_ip = request.client.host
-        now = datetime.now()
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Don't rate limit health checks
+        if scope["type"] != "http" or scope["path"] == "/health":
+            await self.app(scope, receive, send)
+            return
 
-        # Remove old timestamps
-        self.rate_limits[client_ip] = [
-            ts for ts in self.rate_limits[client_ip]
-            if now - ts < timedelta(seconds=self.window_size)
-        ]
+        result = await self.backend.hit(self._client_key(scope))
+        headers = self._headers(result)
+        if not result.allowed:
+            headers["Retry-After"] = str(math.ceil(result.reset_after))
+            response = JSONResponse(
+                {"detail": "Too many requests. Please try again later."},
+                status_code=429,
+                headers=headers
+            )
+            await response(scope, receive, send)
+            return
 
-        # Check rate limit
-        if len(self.rate_limits[client_ip]) >= self.max_requests:
-            oldest_allowed_time = now - timedelta(seconds=self.window_size)
-            if self.rate_limits[client_ip][0] > oldest_allowed_time:
-                raise HTTPException(
-                    status_code=429,
-                    detail="Too many requests. Please try again later."
-                )
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
 
-        # Add current request
-        self.rate_limits[client_ip].append(now)
+        await self.app(scope, receive, send_with_headers)
 
-        # Add rate limit headers to response
-        response = await call_next(request)
-        remaining = self.max_requests - len(self.rate_limits[client_ip])
-        response.headers["X-RateLimit-Limit"] = str(self.max_requests)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(int((now + timedelta(seconds=self.window_size)).timestamp()))
+    def _headers(self, result: RateLimitResult) -> dict:
+        return {
+            "X-RateLimit-Limit": str(result.limit),
+            "X-RateLimit-Remaining": str(result.remaining),
+            "X-RateLimit-Reset": str(int(time.time() + result.reset_after)),
+        }
 
-        return response
+    def _client_key(self, scope: Scope) -> str:
+        """Identify the client a request counts against.
 
-    async def _cleanup_task(self):
-        while True:
-            await asyncio.sleep(self.cleanup_interval)
-            now = datetime.now()
-            cutoff = now - timedelta(seconds=self.window_size)
-            
-            # Clean up old entries
-            for ip in list(self.rate_limits.keys()):
-                self.rate_limits[ip] = [
-                    ts for ts in self.rate_limits[ip]
-                    if ts > cutoff
-                ]
-                if not self.rate_limits[ip]:
-                    del self.rate_limits[ip]
+        Falls back to the client IP when the request has no valid token
+        subject or API key.
+        """
+        if self.key_by == "sub":
+            try:
+                user = authenticate(scope)
+            except AuthenticationError:
+                user = {}
+            if user.get("sub"):
+                return f"sub:{user['sub']}"
+        elif self.key_by == "api_key":
+            for name, value in scope["headers"]:
+                if name == b"x-api-key":
+                    # Never keep raw keys in the limiter's state
+                    return f"api_key:{hashlib.sha256(value).hexdigest()}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
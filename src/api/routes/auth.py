@@ -5,6 +5,9 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from ..schemas.base import Token, TokenData, User, UserCreate
+from ...executors import ExecutorSaturatedError
+from ...security import password_executor, throttle_login
+from ...token_cache import token_cache
 import os
 
 router = APIRouter()
@@ -31,11 +34,13 @@ def get_user(username: str) -> Optional[User]:
         return User(**user_dict)
     return None
 
-def authenticate_user(username: str, password: str) -> Optional[User]:
+async def authenticate_user(username: str, password: str) -> Optional[User]:
     user = get_user(username)
     if not user:
         return None
-    if not verify_password(password, fake_users_db[username]["hashed_password"]):
+    # bcrypt runs in the password hashing pool, off the event loop
+    hashed_password = fake_users_db[username]["hashed_password"]
+    if not await password_executor.run(verify_password, password, hashed_password):
         return None
     return user
 
@@ -51,7 +56,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    await throttle_login(form_data.username)
+    try:
+        user = await authenticate_user(form_data.username, form_data.password)
+    except ExecutorSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress. Please retry shortly."
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -77,7 +89,13 @@ async def register_user(user: UserCreate):
             detail="Username already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await password_executor.run(get_password_hash, user.password)
+    except ExecutorSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many registrations in progress. Please retry shortly."
+        )
     user_dict = {
         "username": user.username,
         "email": user.email,
@@ -93,7 +111,7 @@ async def register_user(user: UserCreate):
 @router.get("/users/me", response_model=User)
 async def read_users_me(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = token_cache.verify(token, SECRET_KEY, ALGORITHM)
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Could not validate credentials")
@@ -104,3 +122,9 @@ async def read_users_me(token: str = Depends(oauth2_scheme)):
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
+
+@router.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme)):
+    # Already authenticated by the middleware
+    token_cache.revoke(token)
+    return {"message": "Logged out"}
@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
 from typing import List, Optional
 from datetime import datetime
-import yfinance as yf
+from ..batching import check_batch_size, stream_batch
 from ..schemas.base import FinancialQuery, ChatResponse
+from ...admission import (
+    DEADLINE_HEADER,
+    DeadlineExceededError,
+    OverloadedError,
+    deadline_from_header,
+    retry_after_header,
+)
 from ...chatbot import Chatbot
 from ...context_manager import ContextManager
+from ...executors import ExecutorSaturatedError
+from ...market_data import create_market_data_client
 
 router = APIRouter()
-chatbot = Chatbot()
-context_manager = ContextManager()
+# Conversations continue through context_id; their cached attention state
+# expires together with the context
+context_manager = ContextManager(name="financial")
+chatbot = Chatbot(kv_cache_ttl=context_manager.context_ttl, context_manager=context_manager)
+context_manager.add_expiry_listener(chatbot.kv_cache.evict)
+context_manager.add_sweep_listener(chatbot.kv_cache.cleanup_expired)
+market_data_client = create_market_data_client()
 
 @router.post("/analyze", response_model=ChatResponse)
-async def analyze_financial_query(query: FinancialQuery):
+async def analyze_financial_query(
+    query: FinancialQuery,
+    deadline_ms: Optional[str] = Header(None, alias=DEADLINE_HEADER)
+):
     """
     Analyze a financial query using the custom-trained LLM
     """
@@ -21,51 +38,81 @@ async def analyze_financial_query(query: FinancialQuery):
         if query.include_market_data:
             # Extract stock symbols from query and add market data
             symbols = extract_stock_symbols(query.query)
-            market_data = get_market_data(symbols)
+            market_data = await get_market_data(symbols)
             context.update({"market_data": market_data})
 
+        # Continue the conversation only if its context is still stored
+        stored_context = await context_manager.get_context_async(query.context_id)
+
         # Get response from chatbot
-        response, confidence = chatbot.generate_response(
+        response, confidence = await chatbot.generate_response(
             query.query,
             context=context,
-            domain="financial"
+            domain="financial",
+            context_id=query.context_id if stored_context else None,
+            deadline=deadline_from_header(deadline_ms)
         )
 
-        # Store context for future reference
-        context_manager.update_context(
+        # Record the turn in the query's conversation
+        context_id = await context_manager.update_context_async(
+            query.context_id,
             query.query,
-            response,
-            context
+            response
         )
 
         return ChatResponse(
             response=response,
             confidence=confidence,
             context=context,
+            context_id=context_id,
             timestamp=datetime.utcnow()
         )
+    except OverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is overloaded. Please retry shortly.",
+            headers=retry_after_header(e.retry_after)
+        )
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ExecutorSaturatedError:
+        raise HTTPException(status_code=503, detail="Inference queue is full. Please retry shortly.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/analyze/batch")
+async def analyze_financial_query_batch(
+    queries: List[FinancialQuery],
+    deadline_ms: Optional[str] = Header(None, alias=DEADLINE_HEADER)
+):
+    """
+    Analyze many financial queries in one request, streamed back as NDJSON
+    in query order with one result or error per line
+    """
+    deadline = deadline_from_header(deadline_ms)
+    check_batch_size(len(queries))
+
+    async def prepared_queries():
+        for query in queries:
+            context = query.context or {}
+            if query.include_market_data:
+                # Fetched while earlier queries are being generated
+                symbols = extract_stock_symbols(query.query)
+                market_data = await get_market_data(symbols)
+                context.update({"market_data": market_data})
+            yield query.query, context, None
+
+    return stream_batch(chatbot, prepared_queries(), "financial", deadline=deadline)
+
 @router.get("/market-data/{symbol}")
 async def get_stock_data(symbol: str):
     """
     Get real-time market data for a specific stock symbol
     """
-    try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
-        return {
-            "symbol": symbol,
-            "price": info.get("regularMarketPrice"),
-            "change": info.get("regularMarketChange"),
-            "change_percent": info.get("regularMarketChangePercent"),
-            "volume": info.get("regularMarketVolume"),
-            "market_cap": info.get("marketCap"),
-            "timestamp": datetime.utcnow()
-        }
-    except Exception as e:
+    quote = (await market_data_client.get([symbol])).get(symbol.upper())
+    if quote is None:
         raise HTTPException(status_code=404, detail=f"Stock data not found for symbol: {symbol}")
+    return {"symbol": symbol, **quote}
 
 def extract_stock_symbols(query: str) -> List[str]:
     """
@@ -81,19 +128,17 @@ def extract_stock_symbols(query: str) -> List[str]:
     ]
     return symbols
 
-def get_market_data(symbols: List[str]) -> dict:
+async def get_market_data(symbols: List[str]) -> dict:
     """
-    Get market data for multiple symbols
+    Get market data for multiple symbols, fetched concurrently; symbols
+    that fail or miss the deadline are left out
     """
-    data = {}
-    for symbol in symbols:
-        try:
-            stock = yf.Ticker(symbol)
-            data[symbol] = {
-                "price": stock.info.get("regularMarketPrice"),
-                "change": stock.info.get("regularMarketChange"),
-                "timestamp": datetime.utcnow()
-            }
-        except:
-            continue
-    return data
+    quotes = await market_data_client.get(symbols)
+    return {
+        symbol: {
+            "price": quote["price"],
+            "change": quote["change"],
+            "timestamp": quote["timestamp"]
+        }
+        for symbol, quote in quotes.items()
+    }
@@ -1,18 +1,39 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header
 from typing import Optional, List
 from datetime import datetime
+from ..batching import check_batch_size, stream_batch
 from ..schemas.base import SupportQuery, ChatResponse
+from ...admission import (
+    DEADLINE_HEADER,
+    DeadlineExceededError,
+    OverloadedError,
+    deadline_from_header,
+    retry_after_header,
+)
 from ...chatbot import Chatbot
 from ...context_manager import ContextManager
+from ...executors import ExecutorSaturatedError
+from ...response_cache import ResponseCache
 
 router = APIRouter()
-chatbot = Chatbot()
-context_manager = ContextManager()
+# Support traffic is dominated by repeated questions: decode greedily so
+# answers can be served from the response cache. Conversations continue
+# through context_id; their cached attention state expires with the context
+context_manager = ContextManager(name="support")
+chatbot = Chatbot(
+    do_sample=False,
+    response_cache=ResponseCache(),
+    kv_cache_ttl=context_manager.context_ttl,
+    context_manager=context_manager
+)
+context_manager.add_expiry_listener(chatbot.kv_cache.evict)
+context_manager.add_sweep_listener(chatbot.kv_cache.cleanup_expired)
 
 @router.post("/query", response_model=ChatResponse)
 async def handle_support_query(
     query: SupportQuery,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    deadline_ms: Optional[str] = Header(None, alias=DEADLINE_HEADER)
 ):
     """
     Handle a customer support query using the custom-trained LLM
@@ -25,18 +46,24 @@ async def handle_support_query(
             "priority": query.priority
         })
 
+        # Continue the conversation only if its context is still stored
+        stored_context = await context_manager.get_context_async(query.context_id)
+
         # Get response from chatbot
-        response, confidence = chatbot.generate_response(
+        response, confidence = await chatbot.generate_response(
             query.query,
             context=context,
-            domain="support"
+            domain="support",
+            context_id=query.context_id if stored_context else None,
+            priority=query.priority,
+            deadline=deadline_from_header(deadline_ms)
         )
 
-        # Store context for future reference
-        context_manager.update_context(
+        # Record the turn in the query's conversation
+        context_id = await context_manager.update_context_async(
+            query.context_id,
             query.query,
-            response,
-            context
+            response
         )
 
         # If confidence is low, schedule for human review
@@ -52,11 +79,62 @@ async def handle_support_query(
             response=response,
             confidence=confidence,
             context=context,
+            context_id=context_id,
             timestamp=datetime.utcnow()
         )
+    except OverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is overloaded. Please retry shortly.",
+            headers=retry_after_header(e.retry_after)
+        )
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ExecutorSaturatedError:
+        raise HTTPException(status_code=503, detail="Inference queue is full. Please retry shortly.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/query/batch")
+async def handle_support_query_batch(
+    queries: List[SupportQuery],
+    background_tasks: BackgroundTasks,
+    deadline_ms: Optional[str] = Header(None, alias=DEADLINE_HEADER)
+):
+    """
+    Answer many support queries in one request, streamed back as NDJSON
+    in query order with one result or error per line
+    """
+    deadline = deadline_from_header(deadline_ms)
+    check_batch_size(len(queries))
+
+    async def prepared_queries():
+        for query in queries:
+            context = query.context or {}
+            context.update({
+                "category": query.category,
+                "priority": query.priority
+            })
+            yield query.query, context, query.priority
+
+    def review_if_unsure(text: str, response: str, confidence: float):
+        # Same threshold as single queries
+        if confidence < 0.8:
+            background_tasks.add_task(
+                schedule_human_review,
+                query=text,
+                response=response,
+                confidence=confidence
+            )
+
+    return stream_batch(
+        chatbot,
+        prepared_queries(),
+        "support",
+        on_result=review_if_unsure,
+        deadline=deadline
+    )
+
 @router.post("/feedback")
 async def submit_feedback(
     query_id: str,
@@ -29,17 +29,20 @@ class FinancialQuery(BaseModel):
     query: str = Field(..., description="The financial analysis query")
     context: Optional[Dict[str, Any]] = Field(default=None, description="Additional context for the query")
     include_market_data: bool = Field(default=True, description="Whether to include real-time market data")
+    context_id: Optional[str] = Field(default=None, description="Conversation to continue")
 
 class SupportQuery(BaseModel):
     query: str = Field(..., description="The support query")
     category: Optional[str] = Field(default=None, description="Optional category for the query")
     priority: Optional[str] = Field(default="normal", description="Query priority (low, normal, high)")
     context: Optional[Dict[str, Any]] = Field(default=None, description="Additional context for the query")
+    context_id: Optional[str] = Field(default=None, description="Conversation to continue")
 
 class ChatResponse(BaseModel):
     response: str
     confidence: float = Field(..., ge=0.0, le=1.0)
     context: Optional[Dict[str, Any]] = None
+    context_id: Optional[str] = None
     sources: Optional[List[str]] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
@@ -47,3 +50,13 @@ class ErrorResponse(BaseModel):
     detail: str
     code: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class BatchItemError(BaseModel):
+    status: int
+    detail: str
+
+class BatchItemResult(BaseModel):
+    """One line of a batch response: the result or error of the query at ``index``."""
+    index: int
+    result: Optional[ChatResponse] = None
+    error: Optional[BatchItemError] = None
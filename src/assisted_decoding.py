@@ -0,0 +1,64 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# Forward passes are only counted on threads inside count_forward_passes(),
+# so concurrent users of the same shared model do not skew the counts
+_active = threading.local()
+
+def install_pass_counter(model, role: str):
+    """Count forward passes of ``model`` under ``role`` ("main" or "draft")."""
+    if getattr(model, "_pass_counter_role", None) is not None:
+        return
+
+    def hook(module, inputs, outputs):
+        counts = getattr(_active, "counts", None)
+        if counts is not None:
+            counts[role] += 1
+
+    model.register_forward_hook(hook)
+    model._pass_counter_role = role
+
+@contextmanager
+def count_forward_passes() -> Iterator[Dict[str, int]]:
+    """Count main and draft model forward passes made by this thread."""
+    counts = {"main": 0, "draft": 0}
+    _active.counts = counts
+    try:
+        yield counts
+    finally:
+        _active.counts = None
+
+class AcceptanceStats:
+    """Running draft-token acceptance rate of assisted decoding.
+
+    Each verification pass of the main model emits one token of its own plus
+    the draft tokens it accepted, and every draft forward pass proposes one
+    token, so ``accepted = new_tokens - main_passes`` and
+    ``proposed = draft_passes``.
+    """
+
+    def __init__(self):
+        self.proposed = 0
+        self.accepted = 0
+        self.verification_passes = 0
+        self._lock = threading.Lock()
+
+    def record(self, new_tokens: int, counts: Dict[str, int]):
+        accepted = max(new_tokens - counts["main"], 0)
+        with self._lock:
+            self.verification_passes += counts["main"]
+            self.proposed += counts["draft"]
+            self.accepted += min(accepted, counts["draft"])
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.proposed if self.proposed else 0.0
+
+    def get_metrics(self) -> Dict[str, float]:
+        return {
+            "proposed_tokens": self.proposed,
+            "accepted_tokens": self.accepted,
+            "verification_passes": self.verification_passes,
+            "acceptance_rate": self.acceptance_rate,
+        }
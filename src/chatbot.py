@@ -1,91 +1,273 @@
-from transformers import (
-    AutoModelForCausalLM,
-    AutoTokenizer,
-    Trainer,
-    TrainingArguments,
-    DataCollatorForLanguageModeling
-)
-from datasets import load_dataset
-from typing import Dict, Tuple, Optional, List
+from transformers import StoppingCriteriaList
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Tuple, Optional, List, Sequence, Union
 import torch
-import numpy as np
+import asyncio
+import concurrent.futures
+from collections import OrderedDict, deque
 import logging
 import json
 import os
+import threading
+import time
 from datetime import datetime
 
+from .admission import AdmissionController, AdmissionTicket
+from .assisted_decoding import AcceptanceStats, count_forward_passes, install_pass_counter
+from .coalescing import RequestCoalescer, request_fingerprint
+from .confidence import ConfidenceScorer
+from .executors import BoundedExecutor
+from .inference_backends import load_causal_lm, resolve_backend
+from .inference_scheduler import InferenceScheduler
+from .kv_cache import ConversationKVCache, crop_past_key_values
+from .model_registry import ModelRegistry, get_model_registry
+from .response_cache import ResponseCache
+from .stopping import StopOnSequences, StopSequenceMatcher, kept_token_count
+from .streaming import AsyncTextStreamer, StopOnEvent
+
+if TYPE_CHECKING:
+    from .context_manager import ContextManager
+
 logger = logging.getLogger(__name__)
 
 class Chatbot:
+    # Context fields folded into the model input
+    PROMPT_CONTEXT_KEYS = ("previous_message", "topic", "user_intent", "domain")
+    # Generated text is cut where the model starts inventing the next turn
+    DEFAULT_STOP_SEQUENCES = ("\nMessage:", "\n\n")
+
     def __init__(
         self,
         model_name: str = "gpt2",
+        draft_model_name: Optional[str] = None,
         device: str = "cuda" if torch.cuda.is_available() else "cpu",
         max_length: int = 100,
+        max_new_tokens: int = 64,
+        max_input_tokens: Optional[int] = None,
+        history_eviction_block: int = 4,
+        stop_sequences: Sequence[str] = DEFAULT_STOP_SEQUENCES,
+        stop_at_sentence_end: bool = False,
         temperature: float = 0.7,
         top_p: float = 0.9,
+        max_batch_size: int = 8,
+        max_batch_wait_ms: float = 5.0,
+        inference_workers: int = 1,
+        inference_queue_size: int = 64,
+        max_concurrent_requests: Optional[int] = None,
+        queue_slo_ms: Optional[float] = None,
+        coalesce_window_ms: Optional[float] = None,
+        confidence_strategy: str = "last_token_max",
+        kv_cache_max_mb: int = 512,
+        kv_cache_ttl: int = 3600,
+        lazy_load: bool = False,
+        registry: Optional[ModelRegistry] = None,
+        backend: Optional[str] = None,
+        do_sample: bool = True,
+        response_cache: Optional[ResponseCache] = None,
+        context_manager: Optional["ContextManager"] = None,
     ):
-        """Initialize the chatbot with a pre-trained model."""
+        """Initialize the chatbot with a pre-trained model.
+        
+        Generation decodes at most ``max_new_tokens`` after a prompt of at
+        most ``max_input_tokens`` (default: whatever the model's context
+        leaves), and ends early at any of ``stop_sequences`` or, with
+        ``stop_at_sentence_end``, once a sentence is complete. ``max_length``
+        is the sequence length used for fine-tuning.
+        
+        Weights come from the process-wide model registry, so chatbots using
+        the same model share one copy; with ``lazy_load`` the model is only
+        loaded on first use. ``backend`` selects eager fp32, dynamic int8 or
+        ONNX Runtime inference (default: INFERENCE_BACKEND, else
+        ``inference.backend`` in config/model_config.yaml).
+        With ``do_sample=False`` decoding is greedy, which lets a
+        ``response_cache`` serve repeated prompts.
+        
+        ``draft_model_name`` enables assisted decoding: a small model sharing
+        the main model's tokenizer proposes tokens that the main model
+        verifies in one forward pass. Greedy output is unchanged.
+        
+        With a ``context_manager``, turns of a conversation (``context_id``)
+        include its past turns as far as they fit in ``max_input_tokens``,
+        tokenized once and cached with the context. Old turns are dropped
+        ``history_eviction_block`` at a time, so the start of the prompt (and
+        its cached attention state) stays the same for several turns.
+        
+        Requests are admitted to inference by priority, at most
+        ``max_concurrent_requests`` at a time (default: one micro-batch per
+        inference worker); they are shed once the estimated queue wait
+        exceeds ``queue_slo_ms`` (default: the ADMISSION_QUEUE_SLO_MS env var).
+        
+        Concurrent requests outside a conversation with the same prompt
+        tokens share one generation, joinable until
+        ``coalesce_window_ms`` after it finishes (default: the
+        COALESCE_WINDOW_MS env var).
+        """
+        self.model_name = model_name
+        self.draft_model_name = draft_model_name
         self.device = device
+        self.backend = backend or resolve_backend()
+        if draft_model_name and self.backend == "onnx":
+            raise ValueError("Assisted decoding requires a PyTorch backend")
+        self.registry = registry or get_model_registry()
+        # Other chatbots may serve the same registry entries
+        self.registry.retain(self._registry_key(model_name))
+        if draft_model_name:
+            self.registry.retain(self._registry_key(draft_model_name))
         self.max_length = max_length
+        self.max_new_tokens = max_new_tokens
+        self._max_input_tokens = max_input_tokens
+        self.stop_matcher = StopSequenceMatcher(stop_sequences, stop_at_sentence_end)
         self.temperature = temperature
         self.top_p = top_p
+        self.do_sample = do_sample
+        self.response_cache = response_cache
+        self.context_manager = context_manager
+        self._header_tokens: Dict[str, List[int]] = {}
+        self.history_eviction_block = max(history_eviction_block, 1)
+        # First packed past turn per conversation (its timestamp)
+        self._history_starts: "OrderedDict[str, str]" = OrderedDict()
+        if response_cache is not None and response_cache.require_deterministic and do_sample:
+            logger.warning("Response cache requires greedy decoding (do_sample=False); it will not be used")
+        self.confidence_scorer = ConfidenceScorer(confidence_strategy)
         
         # Load model and tokenizer
-        try:
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(model_name).to(device)
-            logger.info(f"Loaded model {model_name} successfully")
-        except Exception as e:
-            logger.error(f"Error loading model: {str(e)}")
-            raise
+        if not lazy_load:
+            self._loaded_model()
+            if draft_model_name:
+                self._loaded_model(draft_model_name)
+
+        # Model calls run in a dedicated thread pool so a long generation
+        # never blocks the event loop; torch releases the GIL while decoding
+        self.executor = BoundedExecutor(
+            kind="thread",
+            max_workers=inference_workers,
+            max_queue_size=inference_queue_size,
+            name="inference"
+        )
+
+        # Concurrent requests are decoded together in micro-batches
+        self.scheduler = InferenceScheduler(
+            self._run_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_batch_wait_ms
+        )
+
+        # Requests wait here, by priority, for a place in the micro-batches
+        self.admission = AdmissionController(
+            max_concurrent=max_concurrent_requests or max_batch_size * inference_workers,
+            queue_slo_ms=queue_slo_ms if queue_slo_ms is not None else float(os.getenv("ADMISSION_QUEUE_SLO_MS", "2000")),
+            name="inference"
+        )
+
+        # Identical requests arriving together share one generation
+        self.coalescer = RequestCoalescer(
+            window_ms=coalesce_window_ms if coalesce_window_ms is not None else float(os.getenv("COALESCE_WINDOW_MS", "500"))
+        )
+
+        # Attention state of active conversations, reused across turns
+        self.kv_cache = ConversationKVCache(
+            max_bytes=kv_cache_max_mb * 1024 * 1024,
+            ttl=kv_cache_ttl
+        )
+
+        self.acceptance_stats = AcceptanceStats()
+        self._metrics_lock = threading.Lock()
 
         # Initialize metrics tracking
         self.metrics = {
             "total_requests": 0,
             "successful_responses": 0,
             "average_confidence": 0.0,
+            "batches": 0,
+            "average_batch_size": 0.0,
+            "streamed_responses": 0,
+            "average_time_to_first_token_ms": 0.0,
+            "average_inter_token_latency_ms": 0.0,
+            "decoded_sequences": 0,
+            "decoded_tokens": 0,
+            "average_decoded_tokens": 0.0,
+            "prompts": 0,
+            "average_prompt_tokens": 0.0,
+            "average_history_turns": 0.0,
             "last_updated": datetime.now().isoformat()
         }
 
+    @property
+    def model(self):
+        return self._loaded_model().model
+
+    @property
+    def tokenizer(self):
+        return self._loaded_model().tokenizer
+
+    def _loaded_model(self, model_name: Optional[str] = None):
+        """Fetch a model from the registry, loading it if needed.
+        
+        Defaults to this chatbot's main model.
+        """
+        model_name = model_name or self.model_name
+        return self.registry.get(
+            self._registry_key(model_name),
+            lambda: self._load_model_and_tokenizer(model_name)
+        )
+
+    def _registry_key(self, model_name: str) -> str:
+        return f"causal-lm:{model_name}:{self.backend}:{self.device}"
+
+    def _load_model_and_tokenizer(self, model_name: str):
+        """Load a causal LM and its tokenizer on this chatbot's backend."""
+        try:
+            model, tokenizer = load_causal_lm(model_name, self.device, self.backend)
+            self._configure_tokenizer(tokenizer)
+            if self.backend != "onnx":
+                install_pass_counter(model, "draft" if model_name == self.draft_model_name else "main")
+            logger.info(f"Loaded model {model_name} ({self.backend}) successfully")
+            return model, tokenizer
+        except Exception as e:
+            logger.error(f"Error loading model: {str(e)}")
+            raise
+
     async def generate_response(
         self,
         text: str,
         context: Optional[Dict] = None,
-        language: str = "en"
+        language: str = "en",
+        domain: Optional[str] = None,
+        context_id: Optional[str] = None,
+        priority: str = "normal",
+        deadline: Optional[float] = None
     ) -> Tuple[str, float]:
-        """Generate a response to the input text."""
+        """Generate a response to the input text.
+        
+        Turns of an existing conversation (``context_id``) reuse the cached
+        attention state of the previous turns; other requests are batched.
+        Model calls wait for admission at ``priority`` and are dropped if
+        ``deadline`` (a ``time.monotonic`` timestamp) passes first.
+        """
         try:
             # Update metrics
             self.metrics["total_requests"] += 1
             
-            # Prepare input text with context if available
-            input_text = self._prepare_input(text, context)
-            
-            # Tokenize input
-            inputs = self.tokenizer(
-                input_text,
-                return_tensors="pt",
-                padding=True,
-                truncation=True,
-                max_length=self.max_length
-            ).to(self.device)
-            
-            # Generate response
-            outputs = self.model.generate(
-                **inputs,
-                max_length=self.max_length,
-                temperature=self.temperature,
-                top_p=self.top_p,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-            
-            # Decode response
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            # Prepare input tokens with context and history if available
+            if domain:
+                context = {**(context or {}), "domain": domain}
+            history = await self._history_tokens(context_id)
+            prompt = self._prepare_input(text, context, history, context_id)
             
-            # Calculate confidence score
-            confidence = self._calculate_confidence(outputs)
+            if context_id and self.kv_cache.enabled and self.backend != "onnx":
+                async with self.admission.admit(priority, deadline):
+                    response, confidence = await self.executor.run(
+                        self._generate_with_kv_cache, context_id, prompt
+                    )
+            elif not history:
+                cache_key = self._response_cache_key(text, context) if self._response_cache_enabled else None
+                response, confidence = await self.coalescer.run(
+                    request_fingerprint(prompt, self._generation_settings()),
+                    lambda ticket: self._generate_once(prompt, cache_key, ticket, deadline),
+                    priority,
+                    deadline
+                )
+            else:
+                response, confidence = await self._generate(prompt, priority, deadline)
             
             # Update metrics
             self.metrics["successful_responses"] += 1
@@ -101,95 +283,616 @@ class Chatbot:
             logger.error(f"Error generating response: {str(e)}")
             raise
 
-    async def train(
+    async def _generate_once(
         self,
-        dataset_path: str,
-        model_type: str = "gpt2",
-        epochs: int = 3,
-        batch_size: int = 8
-    ) -> str:
-        """Fine-tune the model on a custom dataset."""
-        try:
-            # Load dataset
-            dataset = load_dataset("text", data_files=dataset_path)
+        prompt: List[int],
+        cache_key: Optional[str],
+        priority: Union[str, AdmissionTicket],
+        deadline: Optional[float]
+    ) -> Tuple[str, float]:
+        """Generate outside a conversation, through the response cache under ``cache_key`` if given."""
+        if cache_key is not None:
+            return await self._generate_cached(prompt, cache_key, priority, deadline)
+        return await self._generate(prompt, priority, deadline)
+
+    @property
+    def _response_cache_enabled(self) -> bool:
+        cache = self.response_cache
+        return cache is not None and not (cache.require_deterministic and self.do_sample)
+
+    def _response_cache_key(self, text: str, context: Optional[Dict]) -> str:
+        """Response cache key of a query and the context fields in its prompt."""
+        prompt_context = {
+            k: v for k, v in (context or {}).items()
+            if k in self.PROMPT_CONTEXT_KEYS
+        }
+        return self.response_cache.make_key(text, prompt_context, self._generation_settings())
+
+    async def _generate_cached(
+        self,
+        prompt: List[int],
+        key: str,
+        priority: Union[str, AdmissionTicket] = "normal",
+        deadline: Optional[float] = None
+    ) -> Tuple[str, float]:
+        """Serve a repeated query from the response cache, or generate and cache it."""
+        cached = await self.response_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        started = time.perf_counter()
+        response, confidence = await self._generate(prompt, priority, deadline)
+        await self.response_cache.set(key, response, confidence, time.perf_counter() - started)
+        return response, confidence
+
+    async def _generate(
+        self,
+        prompt: List[int],
+        priority: Union[str, AdmissionTicket] = "normal",
+        deadline: Optional[float] = None
+    ) -> Tuple[str, float]:
+        """Generate a response for a prepared prompt outside the KV cache."""
+        async with self.admission.admit(priority, deadline):
+            if self.draft_model_name:
+                # Assisted decoding verifies one sequence at a time
+                return await self.executor.run(self._generate_assisted, prompt)
             
-            # Tokenize dataset
-            def tokenize_function(examples):
-                return self.tokenizer(
-                    examples["text"],
-                    padding="max_length",
-                    truncation=True,
-                    max_length=self.max_length
+            # Wait for a slot in the next micro-batch
+            return await self.scheduler.submit(prompt)
+
+    def _generate_assisted(self, prompt: List[int]) -> Tuple[str, float]:
+        """Generate with the draft model proposing tokens for the main model."""
+        inputs = self._prompt_inputs([prompt])
+        prompt_length = inputs["input_ids"].shape[1]
+        draft_model = self._loaded_model(self.draft_model_name).model
+        
+        with torch.no_grad(), count_forward_passes() as passes:
+            outputs = self.model.generate(
+                **inputs,
+                assistant_model=draft_model,
+                max_new_tokens=self.max_new_tokens,
+                **self._sampling_kwargs(),
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=self._stopping_criteria(prompt_length),
+                output_logits=True,
+                return_dict_in_generate=True
+            )
+        
+        generated_tokens = outputs.sequences[:, prompt_length:]
+        self.acceptance_stats.record(generated_tokens.shape[1], passes)
+        self._record_decoded_tokens(generated_tokens)
+        
+        response = self._decode_responses(generated_tokens)[0]
+        confidence = self._calculate_confidence(outputs.logits, generated_tokens)[0]
+        return response, confidence
+
+    def _generation_settings(self) -> Dict:
+        """Settings that change what the model generates for a prompt."""
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "max_new_tokens": self.max_new_tokens,
+            "max_input_tokens": self._max_input_tokens,
+            "stop_sequences": list(self.stop_matcher.stop_sequences),
+            "stop_at_sentence_end": self.stop_matcher.stop_at_sentence_end,
+            "confidence": self.confidence_scorer.strategy,
+            **self._sampling_kwargs(),
+        }
+
+    def _sampling_kwargs(self) -> Dict:
+        """Decoding strategy arguments for generate."""
+        if not self.do_sample:
+            return {"do_sample": False}
+        return {
+            "do_sample": True,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+        }
+
+    async def generate_responses(
+        self,
+        queries: AsyncIterator[Tuple[str, Optional[Dict], Optional[str]]],
+        domain: Optional[str] = None,
+        window: Optional[int] = None,
+        priority: str = "low",
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[Tuple[int, object]]:
+        """Generate responses for many ``(text, context, priority)`` queries.
+
+        Yields ``(index, (response, confidence))`` in query order, or
+        ``(index, exception)`` for a query that failed. At most ``window``
+        queries (default and maximum: the admission limit) are in flight at
+        once, so they are decoded in padded batches while results stream
+        back and neither the queries nor the results of a huge batch are
+        held all at once. Capping the window at the admission limit keeps a
+        batch from queueing behind, and being shed because of, its own
+        queries. Each query is admitted at its own priority, or at
+        ``priority`` when it has none, so by default bulk work yields to
+        interactive requests; queries still waiting when ``deadline`` passes
+        fail with ``DeadlineExceededError``.
+        """
+        window = min(window or self.admission.max_concurrent, self.admission.max_concurrent)
+        in_flight = deque()
+        index = 0
+
+        async def next_result():
+            task_index, task = in_flight.popleft()
+            try:
+                return task_index, await task
+            except Exception as e:
+                return task_index, e
+
+        try:
+            async for text, context, query_priority in queries:
+                in_flight.append((index, asyncio.ensure_future(
+                    self.generate_response(
+                        text,
+                        context=context,
+                        domain=domain,
+                        priority=query_priority or priority,
+                        deadline=deadline
+                    )
+                )))
+                index += 1
+                if len(in_flight) >= window:
+                    yield await next_result()
+            while in_flight:
+                yield await next_result()
+        finally:
+            # The client went away: stop generating for it
+            for _, task in in_flight:
+                task.cancel()
+
+    async def generate_stream(
+        self,
+        text: str,
+        context: Optional[Dict] = None,
+        language: str = "en",
+        domain: Optional[str] = None,
+        context_id: Optional[str] = None,
+        priority: str = "normal",
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Generate a response to the input text, yielding text as it is decoded.
+        
+        Holds an admission slot at ``priority`` until decoding ends. Streamed
+        turns do not extend the conversation's cached attention state, so it
+        is dropped and the next turn re-encodes the full prompt.
+        """
+        self.metrics["total_requests"] += 1
+        started_at = time.perf_counter()
+        
+        if domain:
+            context = {**(context or {}), "domain": domain}
+        history = await self._history_tokens(context_id)
+        prompt = self._prepare_input(text, context, history, context_id)
+        
+        async with self.admission.admit(priority, deadline):
+            loop = asyncio.get_running_loop()
+            streamer = AsyncTextStreamer(self.tokenizer, loop, skip_special_tokens=True)
+            cancelled = threading.Event()
+            generation = asyncio.ensure_future(
+                self.executor.run(self._generate_streaming, prompt, streamer, cancelled)
+            )
+            # Unblock the consumer if generation fails before the stream ends
+            generation.add_done_callback(lambda _: streamer.queue.put_nowait(None))
+        
+            try:
+                # Hold back text that may turn out to be the start of a stop
+                # sequence, and end the stream where the response is trimmed
+                decoded, sent = "", 0
+                while True:
+                    chunk = await streamer.queue.get()
+                    if chunk is None:
+                        break
+                    decoded += chunk
+                    cut = self.stop_matcher.find(decoded) if self.stop_matcher.enabled else None
+                    if cut is not None:
+                        if cut > sent:
+                            yield decoded[sent:cut]
+                        sent = len(decoded)
+                        cancelled.set()
+                        break
+                    safe = self.stop_matcher.holdback(decoded)
+                    if safe > sent:
+                        yield decoded[sent:safe]
+                        sent = safe
+                if sent < len(decoded):
+                    yield decoded[sent:]
+                await generation
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}")
+                raise
+            finally:
+                # Stop decoding if the consumer went away early
+                cancelled.set()
+                if context_id:
+                    self.kv_cache.evict(context_id)
+        
+        self._record_stream_latency(streamer, started_at)
+
+    def _generate_streaming(self, prompt: List[int], streamer: AsyncTextStreamer, cancelled: threading.Event):
+        """Run generate for a single prompt, pushing tokens to the streamer."""
+        inputs = self._prompt_inputs([prompt])
+        
+        with torch.no_grad():
+            self.model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                **self._sampling_kwargs(),
+                pad_token_id=self.tokenizer.pad_token_id,
+                streamer=streamer,
+                stopping_criteria=self._stopping_criteria(
+                    inputs["input_ids"].shape[1],
+                    StopOnEvent(cancelled)
                 )
-            
-            tokenized_dataset = dataset.map(
-                tokenize_function,
-                batched=True,
-                num_proc=4,
-                remove_columns=dataset["train"].column_names
             )
-            
-            # Set up training arguments
-            training_args = TrainingArguments(
-                output_dir="./results",
-                num_train_epochs=epochs,
-                per_device_train_batch_size=batch_size,
-                save_steps=500,
-                save_total_limit=2,
+        self._record_decoded_tokens(count=len(streamer.token_times))
+
+    def _record_stream_latency(self, streamer: AsyncTextStreamer, started_at: float):
+        """Fold a finished stream's token timings into the metrics."""
+        self.metrics["streamed_responses"] += 1
+        count = self.metrics["streamed_responses"]
+        
+        ttft = streamer.time_to_first_token(started_at)
+        if ttft is not None:
+            self.metrics["average_time_to_first_token_ms"] += (
+                (ttft * 1000 - self.metrics["average_time_to_first_token_ms"]) / count
             )
-            
-            # Initialize trainer
-            data_collator = DataCollatorForLanguageModeling(
-                tokenizer=self.tokenizer,
-                mlm=False
+        
+        itl = streamer.inter_token_latency()
+        if itl is not None:
+            self.metrics["average_inter_token_latency_ms"] += (
+                (itl * 1000 - self.metrics["average_inter_token_latency_ms"]) / count
             )
-            
-            trainer = Trainer(
-                model=self.model,
-                args=training_args,
-                train_dataset=tokenized_dataset["train"],
-                data_collator=data_collator,
+        self.metrics["last_updated"] = datetime.now().isoformat()
+
+    async def _run_batch(self, prompts: List[List[int]]) -> List[Tuple[str, float]]:
+        """Generate responses for one micro-batch of prepared prompts."""
+        results = await self.executor.run(self._generate_batch, prompts)
+        self.metrics["batches"] = self.scheduler.metrics["batches"]
+        self.metrics["average_batch_size"] = self.scheduler.metrics["average_batch_size"]
+        return results
+
+    def _generate_batch(self, prompts: List[List[int]]) -> List[Tuple[str, float]]:
+        """Run a single left-padded generate call over several prompts."""
+        # Left padding keeps every prompt flush with the first generated
+        # position
+        inputs = self._prompt_inputs(prompts)
+        prompt_length = inputs["input_ids"].shape[1]
+        
+        # Generate responses; each row stops on its own stop conditions
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                **self._sampling_kwargs(),
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=self._stopping_criteria(prompt_length),
+                output_logits=True,
+                return_dict_in_generate=True
             )
-            
-            # Start training
-            trainer.train()
-            
-            # Save the fine-tuned model
-            model_path = f"models/fine_tuned_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            trainer.save_model(model_path)
-            
-            return model_path
-            
-        except Exception as e:
-            logger.error(f"Error during training: {str(e)}")
+        
+        # Decode only the generated continuation of each prompt
+        generated_tokens = outputs.sequences[:, prompt_length:]
+        self._record_decoded_tokens(generated_tokens)
+        responses = self._decode_responses(generated_tokens)
+        
+        # Calculate confidence scores from the decode-step scores
+        confidences = self._calculate_confidence(outputs.logits, generated_tokens)
+        
+        return list(zip(responses, confidences))
+
+    def _generate_with_kv_cache(self, context_id: str, prompt: List[int]) -> Tuple[str, float]:
+        """Generate a conversation turn, encoding only the new message when
+        the conversation's previous turns are still cached.
+        
+        The cached state is reused for the longest prefix it shares with
+        ``prompt``, so a hit and a miss show the model the same prompt. The
+        past turns, which lead the prompt, usually match; only the context
+        header, the last exchange and the new message are encoded again.
+        The state is only stored back if the serving model did not change
+        while generating.
+        """
+        # Read the generation before the model, so a swap in between makes
+        # the put below a no-op rather than caching the old model's state
+        generation = self.kv_cache.generation
+        model = self.model
+        entry = self.kv_cache.take(context_id, prompt)
+        past_key_values = entry.past_key_values if entry is not None else None
+        input_ids = torch.tensor([prompt], device=self.device)
+        prompt_length = input_ids.shape[1]
+        
+        try:
+            with torch.no_grad():
+                outputs = model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=past_key_values,
+                    max_new_tokens=self.max_new_tokens,
+                    **self._sampling_kwargs(),
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    stopping_criteria=self._stopping_criteria(prompt_length),
+                    output_logits=True,
+                    return_dict_in_generate=True
+                )
+        except Exception:
+            # The taken state may be partially extended; never reuse it
+            self.kv_cache.evict(context_id)
             raise
+        
+        generated_tokens = outputs.sequences[:, prompt_length:]
+        self._record_decoded_tokens(generated_tokens)
+        response = self._decode_responses(generated_tokens)[0]
+        confidence = self._calculate_confidence(outputs.logits, generated_tokens)[0]
+        
+        # Cache only the tokens that made it into the response, so the next
+        # turn continues from the trimmed answer
+        kept = prompt_length + kept_token_count(
+            self.tokenizer, generated_tokens[0].tolist(), len(response)
+        )
+        self.kv_cache.put(
+            context_id,
+            outputs.sequences[0, :kept],
+            crop_past_key_values(outputs.past_key_values, kept),
+            generation=generation
+        )
+        return response, confidence
 
-    def _prepare_input(self, text: str, context: Optional[Dict] = None) -> str:
-        """Prepare input text with context for the model."""
-        if not context:
-            return text
-            
+    @property
+    def max_input_tokens(self) -> int:
+        """Longest prompt, leaving room for ``max_new_tokens`` in the model's context."""
+        if self._max_input_tokens:
+            return self._max_input_tokens
+        return max(self._max_positions() - self.max_new_tokens, 1)
+
+    def _stopping_criteria(self, prompt_length: int, *extra) -> StoppingCriteriaList:
+        """Stopping criteria for a generate call over prompts of ``prompt_length``."""
+        criteria = list(extra)
+        if self.stop_matcher.enabled:
+            criteria.append(StopOnSequences(self.tokenizer, self.stop_matcher, prompt_length))
+        return StoppingCriteriaList(criteria)
+
+    def _decode_responses(self, generated_tokens) -> List[str]:
+        """Decode generated tokens, trimming each response at its stop condition."""
+        responses = self.tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
+        if not self.stop_matcher.enabled:
+            return responses
+        return [self.stop_matcher.trim(response) for response in responses]
+
+    def _record_decoded_tokens(self, generated_tokens=None, count: Optional[int] = None):
+        """Track how many tokens were decoded per response."""
+        sequences = 1
+        if generated_tokens is not None:
+            valid = ConfidenceScorer.valid_steps(generated_tokens, self.tokenizer.eos_token_id)
+            count = int(valid.sum())
+            sequences = generated_tokens.shape[0]
+        
+        with self._metrics_lock:
+            self.metrics["decoded_sequences"] += sequences
+            self.metrics["decoded_tokens"] += count or 0
+            self.metrics["average_decoded_tokens"] = (
+                self.metrics["decoded_tokens"] / self.metrics["decoded_sequences"]
+            )
+
+    def _max_positions(self) -> int:
+        """Longest sequence the model can attend over."""
+        config = self.model.config
+        return getattr(config, "n_positions", None) or getattr(config, "max_position_embeddings", 1024)
+
+    def swap_model(self, model_name: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Serve ``model_name`` (e.g. a fine-tuned checkpoint) from now on.
+        
+        The new model is loaded into the registry on the calling thread
+        before switching, so requests keep being served by the current one
+        until it is ready. With ``loop``, the switch itself runs on that
+        event loop, between requests, and this call waits for it; pass the
+        serving loop when calling from another thread. Requests already
+        running keep their reference to the previous model until they
+        finish.
+        """
+        self._loaded_model(model_name)
+        if loop is None:
+            self._switch_model(model_name)
+            return
+        
+        switched = concurrent.futures.Future()
+        
+        def switch():
+            try:
+                self._switch_model(model_name)
+                switched.set_result(None)
+            except Exception as e:
+                switched.set_exception(e)
+        
+        loop.call_soon_threadsafe(switch)
+        switched.result()
+
+    def _switch_model(self, model_name: str):
+        """Point the chatbot at an already loaded model.
+        
+        The previous model is released, and unloaded once no other consumer
+        of the registry serves it.
+        """
+        previous = self.model_name
+        self.registry.retain(self._registry_key(model_name))
+        self.model_name = model_name
+        # Cached prompt pieces and attention state belong to the old model;
+        # history tokens and cached responses are keyed by model name
+        self._header_tokens = {}
+        self.kv_cache.advance_generation()
+        self.registry.release(self._registry_key(previous))
+        logger.info(f"Swapped serving model from {previous} to {model_name}")
+
+    def _prepare_input(
+        self,
+        text: str,
+        context: Optional[Dict] = None,
+        history: Sequence[Tuple[str, List[int]]] = (),
+        context_id: Optional[str] = None
+    ) -> List[int]:
+        """Assemble the prompt tokens within ``max_input_tokens``.
+        
+        The prompt is the packed past turns, then the context header, then
+        the current message. Past turns only ever grow at the end until a
+        block of old ones is dropped, and the header (which changes with the
+        detected topic and intent) comes after them, so consecutive turns of
+        a conversation share a long prompt prefix. Only the header and the
+        current message are tokenized here; past turns come pre-tokenized.
+        """
+        budget = self.max_input_tokens
+        if not context and not history:
+            prompt = self._tokenize(text)[-budget:]
+            self._record_prompt(prompt, 0)
+            return prompt
+        
         # Add relevant context to the input
         context_str = " ".join([
-            f"{k}: {v}" for k, v in context.items()
-            if k in ["previous_message", "topic", "user_intent"]
+            f"{k}: {v}" for k, v in (context or {}).items()
+            if k in self.PROMPT_CONTEXT_KEYS
         ])
+        if context_str and history:
+            context_str = f"\n{context_str}"
+        header = self._header_tokens.get(context_str)
+        if header is None:
+            if len(self._header_tokens) >= 1024:
+                self._header_tokens.clear()
+            header = self._header_tokens[context_str] = self._tokenize(context_str)
+        
+        # Over-long messages lose their oldest text, never the newest
+        turn = self._tokenize(self._format_turn(text))[-budget:]
+        if len(header) + len(turn) > budget:
+            header = []
         
-        return f"{context_str}\nCurrent message: {text}"
+        start = self._history_start(history, budget - len(header) - len(turn), context_id)
+        prompt = []
+        for _, turn_ids in history[start:]:
+            prompt.extend(turn_ids)
+        prompt.extend(header)
+        prompt.extend(turn)
+        self._record_prompt(prompt, len(history) - start)
+        return prompt
 
-    def _calculate_confidence(self, outputs) -> float:
-        """Calculate confidence score for the generated response."""
-        # Simple confidence calculation based on output probabilities
-        with torch.no_grad():
-            logits = self.model(outputs).logits
-            probs = torch.softmax(logits[:, -1], dim=-1)
-            confidence = float(torch.max(probs).cpu().numpy())
-        return confidence
+    def _history_start(
+        self,
+        history: Sequence[Tuple[str, List[int]]],
+        remaining: int,
+        context_id: Optional[str]
+    ) -> int:
+        """Index of the oldest past turn to include in the prompt.
+        
+        A conversation keeps starting at the same turn while that turn is
+        still in its context and everything after it fits in ``remaining``
+        tokens. Otherwise the start moves past the first turn that fits by
+        ``history_eviction_block - 1`` more turns, so the new start also
+        holds for the next few turns instead of shifting on every one.
+        """
+        keys = [key for key, _ in history]
+        fits_from = len(history)
+        total = 0
+        for index in range(len(history) - 1, -1, -1):
+            total += len(history[index][1])
+            if total > remaining:
+                break
+            fits_from = index
+        
+        remembered = self._history_starts.get(context_id) if context_id else None
+        if remembered is not None and remembered in keys and keys.index(remembered) >= fits_from:
+            start = keys.index(remembered)
+        elif remembered is None and fits_from == 0:
+            start = 0
+        else:
+            if remembered is not None:
+                # Turns up to the old start are gone or no longer wanted
+                fits_from = max(fits_from, sum(1 for key in keys if key <= remembered))
+            start = min(fits_from + self.history_eviction_block - 1, len(history))
+        
+        if context_id:
+            if start < len(history):
+                self._history_starts[context_id] = keys[start]
+                self._history_starts.move_to_end(context_id)
+                while len(self._history_starts) > 10000:
+                    self._history_starts.popitem(last=False)
+            else:
+                self._history_starts.pop(context_id, None)
+        return start
+
+    def _format_turn(self, text: str) -> str:
+        """Format a user message as it appears in the model input."""
+        return f"\nMessage: {text}\nResponse:"
+
+    def _format_history_turn(self, message: Dict) -> str:
+        """Format a past turn of the conversation as it appears in the model input.
+        
+        A past turn is exactly its prompt turn followed by the response, so a
+        conversation's prompt only ever grows at the end and cached attention
+        state for it stays reusable.
+        """
+        return self._format_turn(message["user_message"]) + message["bot_response"]
+
+    def _tokenize(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    async def _history_tokens(self, context_id: Optional[str]) -> List[Tuple[str, List[int]]]:
+        """Tokenized past turns of a conversation, oldest first, keyed by timestamp."""
+        if not context_id or self.context_manager is None:
+            return []
+        return await self.context_manager.get_tokenized_turns_async(
+            context_id,
+            lambda message: self._tokenize(self._format_history_turn(message)),
+            namespace=self.model_name
+        )
+
+    def _prompt_inputs(self, prompts: List[List[int]]) -> Dict[str, torch.Tensor]:
+        """Left-pad prompt token ids into model inputs."""
+        return self.tokenizer.pad(
+            {"input_ids": prompts},
+            padding=True,
+            return_tensors="pt"
+        ).to(self.device)
+
+    def _record_prompt(self, prompt: List[int], history_turns: int):
+        self.metrics["prompts"] += 1
+        count = self.metrics["prompts"]
+        self.metrics["average_prompt_tokens"] += (len(prompt) - self.metrics["average_prompt_tokens"]) / count
+        self.metrics["average_history_turns"] += (history_turns - self.metrics["average_history_turns"]) / count
+
+    def _calculate_confidence(self, scores, generated_tokens) -> List[float]:
+        """Calculate confidence scores for a batch of generated responses."""
+        return self.confidence_scorer.score(
+            scores,
+            generated_tokens,
+            eos_token_id=self.tokenizer.eos_token_id
+        )
+
+    @staticmethod
+    def _configure_tokenizer(tokenizer):
+        """Set up padding so prompts can be batched for generation."""
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+        # Over-long prompts lose their oldest text, never the current message
+        tokenizer.truncation_side = "left"
 
     async def get_metrics(self) -> Dict:
         """Return current metrics."""
+        self.metrics["inference_queue_depth"] = self.executor.queue_depth
+        self.metrics["inference_in_flight"] = self.executor.in_flight
+        self.metrics["inference_rejected"] = self.executor.metrics["rejected"]
+        self.metrics["kv_cache"] = self.kv_cache.get_metrics()
+        self.metrics["admission"] = self.admission.get_metrics()
+        self.metrics["coalescing"] = self.coalescer.get_metrics()
+        self.metrics["model_memory_bytes"] = self.registry.memory_report()
+        if self.response_cache is not None:
+            self.metrics["response_cache"] = self.response_cache.get_metrics()
+        if self.draft_model_name:
+            self.metrics["assisted_decoding"] = self.acceptance_stats.get_metrics()
         return self.metrics
 
+    async def close(self):
+        """Let running batches finish and stop the batching task."""
+        await self.scheduler.close()
+
     def save_model(self, path: str):
         """Save the current model state."""
         try:
@@ -209,14 +912,15 @@ class Chatbot:
     def load_model(self, path: str):
         """Load a saved model state."""
         try:
-            self.model = AutoModelForCausalLM.from_pretrained(path).to(self.device)
-            self.tokenizer = AutoTokenizer.from_pretrained(path)
+            self.swap_model(path)
             
-            # Load metrics if available
+            # Load metrics if available; files saved by older versions lack
+            # newer counters, which keep their current values
             metrics_path = os.path.join(path, "metrics.json")
             if os.path.exists(metrics_path):
                 with open(metrics_path, "r") as f:
-                    self.metrics = json.load(f)
+                    saved = json.load(f)
+                self.metrics.update({k: v for k, v in saved.items() if k in self.metrics})
                     
             logger.info(f"Model loaded successfully from {path}")
             
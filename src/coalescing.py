@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+from .admission import AdmissionTicket, DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+def request_fingerprint(prompt: Sequence[int], settings: Dict[str, Any]) -> str:
+    """Fingerprint of a request's assembled prompt tokens and generation settings.
+
+    Only what reaches the model counts, so context fields left out of the
+    prompt (e.g. live market prices) never split otherwise identical requests.
+    """
+    payload = json.dumps({"prompt": list(prompt), "settings": settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class RequestCoalescer:
+    """Share one in-flight computation between concurrent identical requests.
+
+    The first request for a key starts the work; requests with the same key
+    arriving while it runs, or up to ``window_ms`` after it finished, get
+    its result instead of starting their own. Only successes are shared: when
+    the work fails (e.g. it was shed, or passed the deadline of the request
+    that started it), each waiting request tries again on its own terms.
+    """
+
+    def __init__(self, window_ms: float = 500):
+        self.window = window_ms / 1000
+        self._flights: Dict[str, Tuple[asyncio.Future, AdmissionTicket]] = {}
+        self.metrics = {
+            "generations": 0,
+            "saved_generations": 0,
+            "saved_generations_ratio": 0.0,
+            "failed_flights_retried": 0,
+        }
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable[[AdmissionTicket], Awaitable[Any]],
+        priority: str = "normal",
+        deadline: Optional[float] = None
+    ) -> Any:
+        """Return the result of ``fn(ticket)``, or of the identical call already in flight.
+
+        ``fn`` should wait for admission with ``ticket``; a request joining
+        at a higher ``priority`` raises it. A joining request stops waiting
+        at its own ``deadline`` (a ``time.monotonic`` timestamp) with
+        ``DeadlineExceededError``.
+        """
+        while True:
+            entry = self._flights.get(key)
+            if entry is None:
+                return await self._lead(key, fn, priority)
+
+            flight, ticket = entry
+            ticket.raise_priority(priority)
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            # Waiters that go away must not cancel the work others share
+            done, _ = await asyncio.wait({flight}, timeout=timeout)
+            if not done:
+                raise DeadlineExceededError("Request deadline passed while waiting for a shared generation")
+            if not flight.cancelled() and flight.exception() is None:
+                self.metrics["saved_generations"] += 1
+                self._update_ratio()
+                return flight.result()
+            self.metrics["failed_flights_retried"] += 1
+            self._forget(key, flight)
+
+    async def _lead(self, key: str, fn: Callable[[AdmissionTicket], Awaitable[Any]], priority: str) -> Any:
+        self.metrics["generations"] += 1
+        self._update_ratio()
+        ticket = AdmissionTicket(priority)
+        flight = asyncio.ensure_future(fn(ticket))
+        self._flights[key] = (flight, ticket)
+        flight.add_done_callback(lambda done: self._landed(key, done))
+        return await asyncio.shield(flight)
+
+    def _landed(self, key: str, flight: asyncio.Future):
+        if flight.cancelled() or flight.exception() is not None or not self.window:
+            self._forget(key, flight)
+        else:
+            asyncio.get_running_loop().call_later(self.window, self._forget, key, flight)
+
+    def _forget(self, key: str, flight: asyncio.Future):
+        entry = self._flights.get(key)
+        if entry is not None and entry[0] is flight:
+            del self._flights[key]
+
+    def _update_ratio(self):
+        requests = self.metrics["generations"] + self.metrics["saved_generations"]
+        self.metrics["saved_generations_ratio"] = self.metrics["saved_generations"] / requests if requests else 0.0
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, "tracked_flights": len(self._flights)}
@@ -0,0 +1,83 @@
+import torch
+from typing import List, Optional, Sequence
+
+CONFIDENCE_STRATEGIES = ("mean_logprob", "min_prob", "last_token_max")
+
+class ConfidenceScorer:
+    """Turn the per-step logits returned by ``generate`` into confidences.
+
+    Strategies:
+        mean_logprob: geometric mean probability of the generated tokens
+            (``exp`` of their mean log-probability).
+        min_prob: probability of the least likely generated token.
+        last_token_max: highest probability in the distribution of the last
+            generated position.
+
+    All strategies return values in [0, 1] and never run the model again.
+    """
+
+    def __init__(self, strategy: str = "last_token_max"):
+        if strategy not in CONFIDENCE_STRATEGIES:
+            raise ValueError(
+                f"Unknown confidence strategy: {strategy}. "
+                f"Expected one of {', '.join(CONFIDENCE_STRATEGIES)}"
+            )
+        self.strategy = strategy
+
+    def score(
+        self,
+        scores: Sequence[torch.Tensor],
+        generated_tokens: torch.Tensor,
+        eos_token_id: Optional[int] = None
+    ) -> List[float]:
+        """Score each generated sequence in a batch.
+
+        Args:
+            scores: one ``(batch, vocab)`` logits tensor per decode step, as
+                returned by ``generate(output_logits=True)``. These are the
+                raw model logits; ``output_scores`` would give them after
+                temperature and top-p, which inflates confidences.
+            generated_tokens: ``(batch, steps)`` tokens chosen at each step.
+            eos_token_id: steps after a sequence emitted this token are
+                padding and are ignored.
+        """
+        batch_size, steps = generated_tokens.shape
+        if steps == 0 or not scores:
+            return [0.0] * batch_size
+
+        with torch.no_grad():
+            valid = self.valid_steps(generated_tokens, eos_token_id)
+
+            token_logprobs = []
+            last_max_probs = torch.zeros(batch_size, device=generated_tokens.device)
+            for step, step_scores in enumerate(scores[:steps]):
+                logprobs = torch.log_softmax(step_scores.float(), dim=-1)
+                token_logprobs.append(
+                    logprobs.gather(-1, generated_tokens[:, step:step + 1]).squeeze(-1)
+                )
+                if self.strategy == "last_token_max":
+                    step_max = logprobs.max(dim=-1).values.exp()
+                    last_max_probs = torch.where(valid[:, step], step_max, last_max_probs)
+
+            if self.strategy == "last_token_max":
+                confidences = last_max_probs
+            else:
+                token_logprobs = torch.stack(token_logprobs, dim=-1)
+                if self.strategy == "mean_logprob":
+                    total = torch.where(valid, token_logprobs, torch.zeros_like(token_logprobs)).sum(-1)
+                    confidences = (total / valid.sum(-1).clamp(min=1)).exp()
+                else:
+                    masked = torch.where(valid, token_logprobs, torch.zeros_like(token_logprobs))
+                    confidences = masked.min(dim=-1).values.exp()
+
+            confidences = confidences.clamp(0.0, 1.0).cpu().numpy()
+        return [float(confidence) for confidence in confidences]
+
+    @staticmethod
+    def valid_steps(generated_tokens: torch.Tensor, eos_token_id: Optional[int]) -> torch.Tensor:
+        """Mask of steps up to and including each sequence's first EOS."""
+        if eos_token_id is None:
+            return torch.ones_like(generated_tokens, dtype=torch.bool)
+        is_eos = (generated_tokens == eos_token_id).long()
+        finished_before = (is_eos.cumsum(-1) - is_eos) > 0
+        return ~finished_before
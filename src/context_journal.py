@@ -0,0 +1,290 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.jsonl"
+SEGMENT_PATTERN = "journal.*.jsonl"
+LOCK_FILE = "journal.lock"
+
+class JournalLockedError(RuntimeError):
+    """Raised when another process already journals to the same directory."""
+
+class ContextJournal:
+    """Append-only journal of context changes with snapshot compaction.
+
+    Turns and removals are queued by the caller and written as JSON lines by
+    a background thread, so recording never waits on disk. Once a journal
+    segment grows past ``segment_bytes`` a new one is started, and another
+    thread folds the closed segments into ``snapshot.jsonl``, which holds one
+    line per context still alive. The snapshot's first line names the last
+    segment it covers, so segments left behind by a crash mid-compaction are
+    never applied twice.
+
+    ``replay`` streams the snapshot and then the remaining segments record
+    by record; restart cost is proportional to the live contexts plus the
+    journal written since the last compaction.
+
+    Only one process may use a directory: ``lock`` takes an exclusive
+    ``flock`` on it, held until ``close``.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: int = 3600,
+        max_turns: int = 10,
+        segment_bytes: int = 64 * 1024 * 1024,
+        flush_interval: float = 0.5
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._compactor: Optional[threading.Thread] = None
+        self._compaction_lock = threading.Lock()
+        self._segment = None
+        self._segment_seq = 0
+        self._lock_file = None
+        self.metrics = {
+            "records_written": 0,
+            "records_dropped": 0,
+            "segments": 0,
+            "compactions": 0,
+            "last_compaction_seconds": 0.0,
+            "snapshot_contexts": 0,
+        }
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"journal.{seq:08d}.jsonl")
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(os.path.basename(path).split(".")[1])
+            for path in glob.glob(os.path.join(self.directory, SEGMENT_PATTERN))
+        )
+
+    def lock(self):
+        """Take the directory's exclusive lock, or raise ``JournalLockedError``."""
+        if self._lock_file is not None:
+            return
+        lock_file = open(os.path.join(self.directory, LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise JournalLockedError(f"Context journal {self.directory} is in use by another process")
+        self._lock_file = lock_file
+
+    def start(self):
+        """Start writing to a fresh segment in the background."""
+        if self._writer is not None:
+            return
+        self.lock()
+        segments = self._segments()
+        self._segment_seq = (segments[-1] if segments else 0) + 1
+        self._segment = open(self._segment_path(self._segment_seq), "a")
+        self._writer = threading.Thread(target=self._run, name="context-journal", daemon=True)
+        self._writer.start()
+        if segments:
+            # Fold what the previous run wrote so the next restart is quick
+            self._start_compaction(segments[-1])
+
+    def close(self):
+        """Write out everything queued and stop the background threads."""
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+        if self._compactor is not None:
+            self._compactor.join()
+        # Closing the file releases the lock
+        self._lock_file.close()
+        self._lock_file = None
+
+    def record_turn(
+        self,
+        context_id: str,
+        user_message: str,
+        bot_response: str,
+        timestamp: float,
+        topic: Optional[str],
+        user_intent: Optional[str]
+    ):
+        self._queue.put({
+            "op": "turn",
+            "id": context_id,
+            "user_message": user_message,
+            "bot_response": bot_response,
+            "timestamp": timestamp,
+            "topic": topic,
+            "user_intent": user_intent
+        })
+
+    def record_removal(self, context_id: str):
+        self._queue.put({"op": "remove", "id": context_id})
+
+    def _run(self):
+        closing = False
+        while not closing:
+            try:
+                records = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Write whatever else piled up in the same batch
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in records:
+                closing = True
+                records = [record for record in records if record is not None]
+
+            # A record that cannot be serialized is dropped on its own
+            lines = []
+            for record in records:
+                try:
+                    lines.append(json.dumps(record) + "\n")
+                except (TypeError, ValueError) as e:
+                    self.metrics["records_dropped"] += 1
+                    logger.error(f"Skipping unserializable journal record for context {record.get('id')}: {str(e)}")
+
+            try:
+                self._segment.write("".join(lines))
+                self._segment.flush()
+                self.metrics["records_written"] += len(lines)
+                if self._segment.tell() >= self.segment_bytes:
+                    self._rotate()
+            except Exception as e:
+                logger.error(f"Error writing context journal: {str(e)}")
+        self._segment.close()
+
+    def _rotate(self):
+        """Start a new segment and compact the closed ones."""
+        self._segment.close()
+        self._segment_seq += 1
+        self._segment = open(self._segment_path(self._segment_seq), "a")
+        self.metrics["segments"] += 1
+        self._start_compaction(self._segment_seq - 1)
+
+    def _start_compaction(self, up_to_segment: int):
+        # A running compaction leaves newer segments for the next rotation
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(
+            target=self.compact,
+            args=(up_to_segment,),
+            name="context-journal-compaction",
+            daemon=True
+        )
+        self._compactor.start()
+
+    def compact(self, up_to_segment: int):
+        """Fold the snapshot and segments up to ``up_to_segment`` into a new
+        snapshot, dropping contexts that have expired."""
+        try:
+            with self._compaction_lock:
+                self._compact(up_to_segment)
+        except Exception as e:
+            logger.error(f"Error compacting context journal: {str(e)}")
+
+    def _compact(self, up_to_segment: int):
+        started = time.perf_counter()
+        contexts: Dict[str, Dict] = {}
+        for record in self._records(up_to_segment):
+            apply_record(contexts, record, self.max_turns)
+
+        cutoff = time.time() - self.ttl
+        live = sorted(
+            (context for context in contexts.values() if context["last_updated"] > cutoff),
+            key=lambda context: context["last_updated"]
+        )
+        tmp_path = os.path.join(self.directory, SNAPSHOT_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"op": "header", "segment": up_to_segment}) + "\n")
+            for context in live:
+                f.write(json.dumps(context) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, SNAPSHOT_FILE))
+
+        for seq in self._segments():
+            if seq <= up_to_segment:
+                os.remove(self._segment_path(seq))
+
+        self.metrics["compactions"] += 1
+        self.metrics["snapshot_contexts"] = len(live)
+        self.metrics["last_compaction_seconds"] = time.perf_counter() - started
+        logger.info(f"Compacted context journal into {len(live)} contexts")
+
+    def replay(self) -> Iterator[Dict]:
+        """Stream every record needed to rebuild the current state."""
+        return self._records(None)
+
+    def _records(self, up_to_segment: Optional[int]) -> Iterator[Dict]:
+        covered = 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            for record in _read_lines(snapshot_path):
+                if record.get("op") == "header":
+                    covered = record["segment"]
+                else:
+                    yield record
+
+        for seq in self._segments():
+            if seq <= covered or (up_to_segment is not None and seq > up_to_segment):
+                continue
+            yield from _read_lines(self._segment_path(seq))
+
+    def get_metrics(self) -> Dict:
+        return {**self.metrics, "queue_depth": self._queue.qsize()}
+
+def apply_record(contexts: Dict[str, Dict], record: Dict, max_turns: int):
+    """Apply one journal or snapshot record to plain-dict context state."""
+    op = record.get("op")
+    if op == "context":
+        contexts[record["id"]] = record
+    elif op == "turn":
+        context = contexts.get(record["id"])
+        if context is None:
+            context = contexts[record["id"]] = {
+                "op": "context",
+                "id": record["id"],
+                "created_at": record["timestamp"],
+                "last_updated": record["timestamp"],
+                "topic": None,
+                "user_intent": None,
+                "turns": []
+            }
+        context["turns"].append([record["user_message"], record["bot_response"], record["timestamp"]])
+        del context["turns"][:-max_turns]
+        context["last_updated"] = record["timestamp"]
+        if record.get("topic") is not None:
+            context["topic"] = record["topic"]
+        if record.get("user_intent") is not None:
+            context["user_intent"] = record["user_intent"]
+    elif op == "remove":
+        contexts.pop(record["id"], None)
+
+def _read_lines(path: str) -> Iterator[Dict]:
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A torn last line from a crash; everything before it is intact
+                logger.warning(f"Skipping unreadable record in {path}")
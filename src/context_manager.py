@@ -1,31 +1,81 @@
 import uuid
-from typing import Dict, Optional
-from datetime import datetime, timedelta
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
-import json
+
+from .context_store import ContextStore, create_context_store
+from .executors import BoundedExecutor
+from .keyword_matcher import KeywordMatcher, load_keyword_tables
 
 logger = logging.getLogger(__name__)
 
 class ContextManager:
-    def __init__(self, context_ttl: int = 3600):
-        """Initialize the context manager with a TTL for contexts."""
-        self.contexts = {}
+    def __init__(
+        self,
+        context_ttl: int = 3600,
+        max_contexts: Optional[int] = None,
+        store: Optional[ContextStore] = None,
+        name: str = "default"
+    ):
+        """Initialize the context manager with a TTL for contexts.
+        
+        Contexts live in ``store``; by default the backend selected by
+        ``CONTEXT_STORE``, so several workers can share conversations
+        through Redis. ``max_contexts`` caps the in-memory store and ``name``
+        separates its journal from those of other managers.
+        
+        Calls to a blocking store (one that makes network round trips) run
+        in a thread pool when made through the ``*_async`` methods.
+        """
         self.context_ttl = context_ttl  # Time to live in seconds
         self.max_context_length = 10  # Maximum number of messages to keep in context
+        self.store = store or create_context_store(
+            context_ttl,
+            self.max_context_length,
+            max_contexts,
+            name=name
+        )
+        self.store.on_remove = self._cleanup_context
+        self.store_executor: Optional[BoundedExecutor] = None
+        if self.store.blocking:
+            self.store_executor = BoundedExecutor(
+                kind="thread",
+                max_workers=8,
+                max_queue_size=1024,
+                name=f"context-store-{name}"
+            )
+        self.keyword_matcher = KeywordMatcher(load_keyword_tables())
+        self.expiry_listeners: List[Callable[[str], None]] = []
+        self.sweep_listeners: List[Callable[[], object]] = []
+        # Tokenized turns per context: (namespace, {turn timestamp: token ids})
+        self._turn_tokens: "OrderedDict[str, Tuple[str, Dict[str, List[int]]]]" = OrderedDict()
+        self.max_tokenized_contexts = 10000
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def add_expiry_listener(self, listener: Callable[[str], None]):
+        """Register a callback invoked with the id of every removed context."""
+        self.expiry_listeners.append(listener)
+
+    def add_sweep_listener(self, listener: Callable[[], object]):
+        """Register a callback run on every tick of the expiry sweeper.
+        
+        Stores with native expiry never report expired contexts, so state
+        kept alongside contexts (e.g. attention caches) expires itself here.
+        """
+        self.sweep_listeners.append(listener)
 
     def get_context(self, context_id: Optional[str] = None) -> Dict:
         """Retrieve context for a given context_id."""
-        if not context_id or context_id not in self.contexts:
+        if not context_id:
             return {}
+        return self.store.get(context_id) or {}
 
-        context = self.contexts[context_id]
-        
-        # Check if context has expired
-        if self._is_context_expired(context):
-            self._cleanup_context(context_id)
+    async def get_context_async(self, context_id: Optional[str] = None) -> Dict:
+        """``get_context`` without blocking the event loop on the store."""
+        if not context_id:
             return {}
-            
-        return context["data"]
+        return await self._run_store(self.get_context, context_id)
 
     def update_context(
         self,
@@ -36,37 +86,20 @@ class ContextManager:
         """Update context with new message and response."""
         try:
             # Create new context if none exists
-            if not context_id or context_id not in self.contexts:
+            if not context_id or not self.store.exists(context_id):
                 context_id = str(uuid.uuid4())
-                self.contexts[context_id] = {
-                    "created_at": datetime.now(),
-                    "last_updated": datetime.now(),
-                    "data": {
-                        "messages": [],
-                        "topic": None,
-                        "user_intent": None
-                    }
-                }
-            
-            context = self.contexts[context_id]
-            
-            # Update context data
-            messages = context["data"]["messages"]
-            messages.append({
-                "user_message": user_message,
-                "bot_response": bot_response,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            # Keep only the last N messages
-            if len(messages) > self.max_context_length:
-                messages.pop(0)
-            
-            # Update context metadata
-            context["last_updated"] = datetime.now()
             
             # Attempt to identify topic and user intent
-            self._update_topic_and_intent(context["data"], user_message)
+            detected = {"topic": None, "user_intent": None}
+            self._update_topic_and_intent(detected, user_message)
+            
+            self.store.append_turn(
+                context_id,
+                user_message,
+                bot_response,
+                topic=detected["topic"],
+                user_intent=detected["user_intent"]
+            )
             
             return context_id
             
@@ -74,65 +107,90 @@ class ContextManager:
             logger.error(f"Error updating context: {str(e)}")
             raise
 
-    def _is_context_expired(self, context: Dict) -> bool:
-        """Check if context has expired based on TTL."""
-        last_updated = context["last_updated"]
-        time_elapsed = (datetime.now() - last_updated).total_seconds()
-        return time_elapsed > self.context_ttl
-
-    def _cleanup_context(self, context_id: str):
-        """Remove expired context."""
-        try:
-            del self.contexts[context_id]
-        except KeyError:
-            pass
+    async def update_context_async(
+        self,
+        context_id: Optional[str],
+        user_message: str,
+        bot_response: str
+    ) -> str:
+        """``update_context`` without blocking the event loop on the store."""
+        return await self._run_store(self.update_context, context_id, user_message, bot_response)
 
-    def _update_topic_and_intent(self, context_data: Dict, user_message: str):
-        """Update topic and user intent based on the message content."""
-        # This is a simple implementation that could be enhanced with
-        # more sophisticated NLP techniques
-        
-        # Example topic detection based on keywords
-        topics = {
-            "financial": ["stock", "price", "market", "invest", "trading"],
-            "support": ["help", "issue", "problem", "error", "how to"]
-        }
-        
-        message_lower = user_message.lower()
+    def get_tokenized_turns(
+        self,
+        context_id: str,
+        tokenize: Callable[[Dict], List[int]],
+        namespace: str = ""
+    ) -> List[Tuple[str, List[int]]]:
+        """``(timestamp, token ids)`` of each turn of a context, oldest first.
         
-        # Simple topic detection
-        for topic, keywords in topics.items():
-            if any(keyword in message_lower for keyword in keywords):
-                context_data["topic"] = topic
-                break
+        ``tokenize`` turns a message dict into token ids and is only called
+        for turns not seen before; results are cached per context under
+        ``namespace`` (e.g. the tokenizer's model).
+        """
+        messages = self.get_context(context_id).get("messages", [])
+        return self._tokenize_turns(context_id, messages, tokenize, namespace)
+
+    async def get_tokenized_turns_async(
+        self,
+        context_id: str,
+        tokenize: Callable[[Dict], List[int]],
+        namespace: str = ""
+    ) -> List[Tuple[str, List[int]]]:
+        """``get_tokenized_turns`` without blocking the event loop on the store."""
+        messages = (await self.get_context_async(context_id)).get("messages", [])
+        return self._tokenize_turns(context_id, messages, tokenize, namespace)
+
+    def _tokenize_turns(
+        self,
+        context_id: str,
+        messages: List[Dict],
+        tokenize: Callable[[Dict], List[int]],
+        namespace: str
+    ) -> List[Tuple[str, List[int]]]:
+        cached_namespace, cached = self._turn_tokens.get(context_id, (namespace, {}))
+        if cached_namespace != namespace:
+            cached = {}
         
-        # Simple intent detection
-        intents = {
-            "question": ["what", "how", "why", "when", "where", "?"],
-            "request": ["can you", "please", "could you"],
-            "complaint": ["not working", "broken", "error", "issue"]
+        # Rebuilding the mapping drops turns that fell out of the context
+        tokens = {
+            message["timestamp"]: cached.get(message["timestamp"]) or tokenize(message)
+            for message in messages
         }
         
-        for intent, patterns in intents.items():
-            if any(pattern in message_lower for pattern in patterns):
-                context_data["user_intent"] = intent
-                break
+        self._turn_tokens[context_id] = (namespace, tokens)
+        self._turn_tokens.move_to_end(context_id)
+        while len(self._turn_tokens) > self.max_tokenized_contexts:
+            self._turn_tokens.popitem(last=False)
+        return list(tokens.items())
+
+    async def _run_store(self, fn: Callable, *args):
+        """Run a store call in the store's thread pool if it blocks."""
+        if self.store_executor is None:
+            return fn(*args)
+        return await self.store_executor.run(fn, *args)
+
+    def _cleanup_context(self, context_id: str):
+        """Notify listeners that a context was removed."""
+        self._turn_tokens.pop(context_id, None)
+        for listener in self.expiry_listeners:
+            try:
+                listener(context_id)
+            except Exception as e:
+                logger.error(f"Error notifying context expiry: {str(e)}")
+
+    def _update_topic_and_intent(self, context_data: Dict, user_message: str):
+        """Update topic and user intent based on the message content."""
+        # Keyword matching; the tables could be replaced with more
+        # sophisticated NLP techniques
+        for field, label in self.keyword_matcher.match(user_message).items():
+            if label is not None:
+                context_data[field] = label
 
     def save_contexts(self, file_path: str):
         """Save all contexts to a file."""
         try:
-            # Convert datetime objects to ISO format strings
-            serializable_contexts = {}
-            for context_id, context in self.contexts.items():
-                serializable_contexts[context_id] = {
-                    "created_at": context["created_at"].isoformat(),
-                    "last_updated": context["last_updated"].isoformat(),
-                    "data": context["data"]
-                }
-            
-            with open(file_path, 'w') as f:
-                json.dump(serializable_contexts, f)
-                
+            self.store.save(file_path)
             logger.info(f"Contexts saved to {file_path}")
             
         except Exception as e:
@@ -142,32 +200,59 @@ class ContextManager:
     def load_contexts(self, file_path: str):
         """Load contexts from a file."""
         try:
-            with open(file_path, 'r') as f:
-                saved_contexts = json.load(f)
-            
-            # Convert ISO format strings back to datetime objects
-            for context_id, context in saved_contexts.items():
-                self.contexts[context_id] = {
-                    "created_at": datetime.fromisoformat(context["created_at"]),
-                    "last_updated": datetime.fromisoformat(context["last_updated"]),
-                    "data": context["data"]
-                }
-                
+            self.store.load(file_path)
             logger.info(f"Contexts loaded from {file_path}")
             
         except Exception as e:
             logger.error(f"Error loading contexts: {str(e)}")
             raise
 
-    def cleanup_expired_contexts(self):
-        """Remove all expired contexts."""
-        expired_contexts = [
-            context_id
-            for context_id, context in self.contexts.items()
-            if self._is_context_expired(context)
-        ]
-        
-        for context_id in expired_contexts:
-            self._cleanup_context(context_id)
-            
-        return len(expired_contexts)
+    def cleanup_expired_contexts(self, budget_seconds: Optional[float] = None) -> int:
+        """Remove expired contexts, stopping early once ``budget_seconds``
+        have been spent. Returns the number of contexts removed."""
+        return self.store.cleanup_expired(budget_seconds)
+
+    async def _sweep_expired(self, interval: float, budget_seconds: float):
+        while True:
+            try:
+                self.cleanup_expired_contexts(budget_seconds)
+            except Exception as e:
+                logger.error(f"Error sweeping expired contexts: {str(e)}")
+            for listener in self.sweep_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    logger.error(f"Error running expiry sweep listener: {str(e)}")
+            # Keep going right away while a backlog remains, yielding to
+            # request handlers between ticks
+            await asyncio.sleep(0 if self.store.has_expired() else interval)
+
+    def start_expiry_sweeper(self, interval: float = 1.0, budget_ms: float = 5.0):
+        """Remove expired contexts in the background, spending at most
+        ``budget_ms`` per tick on the event loop."""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(
+                self._sweep_expired(interval, budget_ms / 1000)
+            )
+
+    async def stop_expiry_sweeper(self):
+        if self._sweeper is None:
+            return
+        self._sweeper.cancel()
+        try:
+            await self._sweeper
+        except asyncio.CancelledError:
+            pass
+        self._sweeper = None
+
+    def close(self):
+        """Flush pending journal writes."""
+        self.store.close()
+        if self.store_executor is not None:
+            self.store_executor.shutdown()
+
+    def get_metrics(self) -> Dict:
+        metrics = {"store": type(self.store).__name__, **self.store.get_metrics()}
+        if self.store_executor is not None:
+            metrics["executor"] = self.store_executor.get_metrics()
+        return metrics
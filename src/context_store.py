@@ -0,0 +1,608 @@
+import heapq
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from .context_journal import ContextJournal, JournalLockedError
+
+if TYPE_CHECKING:
+    from .cache.redis_handler import RedisHandler
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_STORES = ("memory", "redis")
+
+class ContextStore:
+    """Storage backend for conversation contexts.
+
+    A context is the ``{"messages", "topic", "user_intent"}`` dict returned by
+    ``ContextManager.get_context``. Stores keep at most ``max_turns`` messages
+    per context and drop contexts ``ttl`` seconds after their last turn.
+    ``on_remove`` is called with the id of every context the store removes.
+    Stores with ``blocking`` set make network round trips on every call and
+    may be called from several threads at once.
+    """
+
+    blocking = False
+
+    def __init__(self, ttl: int = 3600, max_turns: int = 10):
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.on_remove: Optional[Callable[[str], None]] = None
+
+    def get(self, context_id: str) -> Optional[Dict]:
+        """Return the context data, or None if unknown or expired."""
+        raise NotImplementedError
+
+    def exists(self, context_id: str) -> bool:
+        raise NotImplementedError
+
+    def append_turn(
+        self,
+        context_id: str,
+        user_message: str,
+        bot_response: str,
+        topic: Optional[str] = None,
+        user_intent: Optional[str] = None
+    ):
+        """Append a turn, creating the context if needed, and refresh its TTL.
+
+        ``topic`` and ``user_intent`` replace the stored values when set.
+        """
+        raise NotImplementedError
+
+    def delete(self, context_id: str):
+        raise NotImplementedError
+
+    def cleanup_expired(self, budget_seconds: Optional[float] = None) -> int:
+        """Remove expired contexts; stores with native expiry do nothing."""
+        return 0
+
+    def has_expired(self) -> bool:
+        return False
+
+    def save(self, file_path: str):
+        raise NotImplementedError(f"{type(self).__name__} does not support saving to a file")
+
+    def load(self, file_path: str):
+        raise NotImplementedError(f"{type(self).__name__} does not support loading from a file")
+
+    def close(self):
+        """Release background resources held by the store."""
+
+    def get_metrics(self) -> Dict:
+        return {}
+
+    def _notify_removed(self, context_id: str):
+        if self.on_remove is None:
+            return
+        try:
+            self.on_remove(context_id)
+        except Exception as e:
+            logger.error(f"Error notifying context expiry: {str(e)}")
+
+class Turn:
+    """One user message and the bot's response."""
+
+    __slots__ = ("user_message", "bot_response", "timestamp")
+
+    def __init__(self, user_message: str, bot_response: str, timestamp: float):
+        self.user_message = user_message
+        self.bot_response = bot_response
+        self.timestamp = timestamp  # seconds since the epoch
+
+    def to_dict(self) -> Dict:
+        return {
+            "user_message": self.user_message,
+            "bot_response": self.bot_response,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat()
+        }
+
+class ContextRecord:
+    """Compact state of one conversation held by the in-memory store.
+
+    Turns are kept in a fixed-size ring buffer, so adding a turn to a full
+    history overwrites the oldest one in place. Wall-clock times are float
+    timestamps that are only formatted when the context is read; expiry
+    uses the monotonic clock.
+    """
+
+    __slots__ = (
+        "turns", "oldest", "max_turns", "topic", "user_intent",
+        "created_at", "last_updated", "expires_at"
+    )
+
+    def __init__(self, max_turns: int, created_at: float):
+        self.turns: List[Turn] = []
+        self.oldest = 0
+        self.max_turns = max_turns
+        self.topic: Optional[str] = None
+        self.user_intent: Optional[str] = None
+        self.created_at = created_at
+        self.last_updated = created_at
+        self.expires_at = 0.0
+
+    def add_turn(self, turn: Turn):
+        if len(self.turns) < self.max_turns:
+            self.turns.append(turn)
+            return
+        self.turns[self.oldest] = turn
+        self.oldest = (self.oldest + 1) % self.max_turns
+
+    def ordered_turns(self) -> List[Turn]:
+        """Turns from oldest to newest."""
+        return self.turns[self.oldest:] + self.turns[:self.oldest]
+
+    def to_dict(self) -> Dict:
+        return {
+            "messages": [turn.to_dict() for turn in self.ordered_turns()],
+            "topic": self.topic,
+            "user_intent": self.user_intent
+        }
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # Topics and intents come from small fixed vocabularies; share one
+    # string object per value across all contexts
+    return None if value is None else sys.intern(value)
+
+class InMemoryContextStore(ContextStore):
+    """Process-local context store.
+
+    Expiry deadlines are kept in a min-heap so sweeps only touch expired
+    contexts. Entries are invalidated lazily: every update pushes a new
+    deadline and outdated ones are skipped when popped. At most
+    ``max_contexts`` contexts are kept (0 for no limit); the least recently
+    used are evicted first.
+
+    With a ``ContextJournal`` attached, every turn and removal is also
+    journaled in the background and the store is rebuilt from the journal
+    on startup.
+    """
+
+    def __init__(self, ttl: int = 3600, max_turns: int = 10, max_contexts: int = 100000):
+        super().__init__(ttl, max_turns)
+        self.max_contexts = max_contexts
+        self.contexts: "OrderedDict[str, ContextRecord]" = OrderedDict()
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self.journal: Optional[ContextJournal] = None
+        self.metrics = {
+            "expired": 0,
+            "evicted": 0,
+            "sweeps": 0,
+        }
+
+    def get(self, context_id: str) -> Optional[Dict]:
+        record = self.contexts.get(context_id)
+        if record is None:
+            return None
+
+        if record.expires_at < time.monotonic():
+            self.delete(context_id)
+            self.metrics["expired"] += 1
+            return None
+
+        self.contexts.move_to_end(context_id)
+        return record.to_dict()
+
+    def exists(self, context_id: str) -> bool:
+        return context_id in self.contexts
+
+    def append_turn(
+        self,
+        context_id: str,
+        user_message: str,
+        bot_response: str,
+        topic: Optional[str] = None,
+        user_intent: Optional[str] = None
+    ):
+        now = time.time()
+        if context_id not in self.contexts:
+            self._enforce_capacity()
+        record = self._apply_turn(context_id, user_message, bot_response, now, topic, user_intent)
+        self._schedule_expiry(context_id, record, time.monotonic() + self.ttl)
+        if self.journal is not None:
+            self.journal.record_turn(context_id, user_message, bot_response, now, topic, user_intent)
+
+    def _apply_turn(
+        self,
+        context_id: str,
+        user_message: str,
+        bot_response: str,
+        timestamp: float,
+        topic: Optional[str],
+        user_intent: Optional[str]
+    ) -> ContextRecord:
+        record = self.contexts.get(context_id)
+        if record is None:
+            record = self.contexts[context_id] = ContextRecord(self.max_turns, timestamp)
+
+        record.add_turn(Turn(user_message, bot_response, timestamp))
+        if topic is not None:
+            record.topic = _intern(topic)
+        if user_intent is not None:
+            record.user_intent = _intern(user_intent)
+
+        record.last_updated = timestamp
+        self.contexts.move_to_end(context_id)
+        return record
+
+    def delete(self, context_id: str):
+        try:
+            del self.contexts[context_id]
+        except KeyError:
+            return
+        if self.journal is not None:
+            self.journal.record_removal(context_id)
+        self._notify_removed(context_id)
+
+    def attach_journal(self, journal: ContextJournal):
+        """Rebuild the store from ``journal`` and journal changes from now on.
+
+        Records are applied one at a time as they are read, so loading never
+        holds more than the live contexts in memory. Raises
+        ``JournalLockedError`` if another process holds the journal.
+        """
+        journal.lock()
+        started = time.perf_counter()
+        for record in journal.replay():
+            op = record.get("op")
+            if op == "turn":
+                self._apply_turn(
+                    record["id"],
+                    record["user_message"],
+                    record["bot_response"],
+                    record["timestamp"],
+                    record.get("topic"),
+                    record.get("user_intent")
+                )
+            elif op == "context":
+                context = ContextRecord(self.max_turns, record["created_at"])
+                for user_message, bot_response, timestamp in record["turns"]:
+                    context.add_turn(Turn(user_message, bot_response, timestamp))
+                context.topic = _intern(record.get("topic"))
+                context.user_intent = _intern(record.get("user_intent"))
+                context.last_updated = record["last_updated"]
+                self.contexts[record["id"]] = context
+                self.contexts.move_to_end(record["id"])
+            elif op == "remove":
+                self.contexts.pop(record["id"], None)
+
+        # Drop what expired while the process was down and index the rest
+        now = time.time()
+        for context_id, context in list(self.contexts.items()):
+            remaining = self.ttl - (now - context.last_updated)
+            if remaining <= 0:
+                del self.contexts[context_id]
+            else:
+                self._schedule_expiry(context_id, context, time.monotonic() + remaining)
+
+        self.journal = journal
+        journal.start()
+        while self.max_contexts > 0 and len(self.contexts) > self.max_contexts:
+            self.delete(next(iter(self.contexts)))
+        logger.info(
+            f"Restored {len(self.contexts)} contexts from {journal.directory} "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def cleanup_expired(self, budget_seconds: Optional[float] = None) -> int:
+        """Remove expired contexts, stopping early once ``budget_seconds``
+        have been spent. Returns the number of contexts removed."""
+        deadline = None if budget_seconds is None else time.perf_counter() + budget_seconds
+        now = time.monotonic()
+        removed = 0
+
+        while self._expiry_heap and self._expiry_heap[0][0] < now:
+            expires_at, context_id = heapq.heappop(self._expiry_heap)
+            record = self.contexts.get(context_id)
+            # Skip deadlines superseded by a later update or removal
+            if record is not None and record.expires_at == expires_at:
+                self.delete(context_id)
+                removed += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+        self.metrics["expired"] += removed
+        self.metrics["sweeps"] += 1
+        return removed
+
+    def has_expired(self) -> bool:
+        """Whether the expiry index has deadlines that already passed."""
+        return bool(self._expiry_heap) and self._expiry_heap[0][0] < time.monotonic()
+
+    def _schedule_expiry(self, context_id: str, record: ContextRecord, expires_at: float):
+        """Record a context's new deadline in the expiry index."""
+        record.expires_at = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, context_id))
+
+        # Outdated deadlines pile up for busy conversations; rebuild the
+        # heap from live contexts once they dominate it
+        if len(self._expiry_heap) > 2 * len(self.contexts) + 1024:
+            self._expiry_heap = [
+                (record.expires_at, context_id)
+                for context_id, record in self.contexts.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+
+    def _enforce_capacity(self):
+        """Evict least recently used contexts to make room for a new one."""
+        if self.max_contexts <= 0:
+            return
+        while len(self.contexts) >= self.max_contexts:
+            self.delete(next(iter(self.contexts)))
+            self.metrics["evicted"] += 1
+
+    def save(self, file_path: str):
+        # Convert timestamps to ISO format strings
+        serializable_contexts = {}
+        for context_id, record in self.contexts.items():
+            serializable_contexts[context_id] = {
+                "created_at": datetime.fromtimestamp(record.created_at).isoformat(),
+                "last_updated": datetime.fromtimestamp(record.last_updated).isoformat(),
+                "data": record.to_dict()
+            }
+
+        with open(file_path, 'w') as f:
+            json.dump(serializable_contexts, f)
+
+    def load(self, file_path: str):
+        with open(file_path, 'r') as f:
+            saved_contexts = json.load(f)
+
+        # Oldest first so the LRU order survives the round trip
+        now = time.time()
+        for context_id, context in sorted(
+            saved_contexts.items(),
+            key=lambda item: item[1]["last_updated"]
+        ):
+            last_updated = datetime.fromisoformat(context["last_updated"]).timestamp()
+            remaining = self.ttl - (now - last_updated)
+            if remaining <= 0:
+                continue
+            if context_id not in self.contexts:
+                self._enforce_capacity()
+
+            record = ContextRecord(
+                self.max_turns,
+                datetime.fromisoformat(context["created_at"]).timestamp()
+            )
+            data = context["data"]
+            for message in data["messages"]:
+                record.add_turn(Turn(
+                    message["user_message"],
+                    message["bot_response"],
+                    datetime.fromisoformat(message["timestamp"]).timestamp()
+                ))
+            record.topic = _intern(data.get("topic"))
+            record.user_intent = _intern(data.get("user_intent"))
+            record.last_updated = last_updated
+
+            self.contexts[context_id] = record
+            self.contexts.move_to_end(context_id)
+            self._schedule_expiry(context_id, record, time.monotonic() + remaining)
+
+    def get_metrics(self) -> Dict:
+        metrics = {
+            **self.metrics,
+            "contexts": len(self.contexts),
+            "expiry_index_size": len(self._expiry_heap),
+        }
+        if self.journal is not None:
+            metrics["journal"] = self.journal.get_metrics()
+        return metrics
+
+class RedisContextStore(ContextStore):
+    """Context store shared by all workers through Redis.
+
+    Each context is a list of JSON turns (``<namespace>:<id>:messages``) and
+    a hash with its metadata (``<namespace>:<id>:meta``). A turn is written
+    with one pipelined RPUSH/LTRIM/HSET/EXPIRE round trip, and a read with
+    one LRANGE/HGETALL round trip. Expiry is left to Redis, so removals are
+    only reported for explicit deletes. Every call is a blocking round trip,
+    so ``ContextManager`` runs them in a thread pool.
+
+    With ``near_cache_ttl`` > 0 (opt-in), contexts read or written by this
+    worker are also kept locally for that many seconds. A turn written by
+    another worker may then be missed for up to ``near_cache_ttl`` seconds.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        redis: "RedisHandler",
+        ttl: int = 3600,
+        max_turns: int = 10,
+        namespace: str = "context",
+        near_cache_ttl: float = 0.0,
+        near_cache_size: int = 10000
+    ):
+        super().__init__(ttl, max_turns)
+        self.client = redis.redis_client
+        self.namespace = namespace
+        self.near_cache_ttl = near_cache_ttl
+        self.near_cache_size = near_cache_size
+        self._near_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._near_cache_lock = threading.RLock()
+        self.metrics = {
+            "near_cache_hits": 0,
+            "near_cache_misses": 0,
+            "round_trips": 0,
+        }
+
+    def _keys(self, context_id: str) -> Tuple[str, str]:
+        prefix = f"{self.namespace}:{context_id}"
+        return f"{prefix}:messages", f"{prefix}:meta"
+
+    def get(self, context_id: str) -> Optional[Dict]:
+        data = self._near_cache_get(context_id)
+        if data is not None:
+            return _copy_context(data)
+
+        messages_key, meta_key = self._keys(context_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lrange(messages_key, 0, -1)
+        pipe.hgetall(meta_key)
+        messages, meta = pipe.execute()
+        self.metrics["round_trips"] += 1
+        if not meta:
+            return None
+
+        meta = {_decode(key): _decode(value) for key, value in meta.items()}
+        data = {
+            "messages": [json.loads(message) for message in messages],
+            "topic": meta.get("topic"),
+            "user_intent": meta.get("user_intent")
+        }
+        self._near_cache_put(context_id, data)
+        return _copy_context(data)
+
+    def exists(self, context_id: str) -> bool:
+        if self._near_cache_get(context_id) is not None:
+            return True
+        self.metrics["round_trips"] += 1
+        return bool(self.client.exists(self._keys(context_id)[1]))
+
+    def append_turn(
+        self,
+        context_id: str,
+        user_message: str,
+        bot_response: str,
+        topic: Optional[str] = None,
+        user_intent: Optional[str] = None
+    ):
+        turn = {
+            "user_message": user_message,
+            "bot_response": bot_response,
+            "timestamp": datetime.now().isoformat()
+        }
+        messages_key, meta_key = self._keys(context_id)
+        meta = {"last_updated": turn["timestamp"]}
+        if topic is not None:
+            meta["topic"] = topic
+        if user_intent is not None:
+            meta["user_intent"] = user_intent
+
+        # MULTI/EXEC so concurrent readers never see a half-applied turn
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(messages_key, json.dumps(turn))
+        pipe.ltrim(messages_key, -self.max_turns, -1)
+        pipe.hsetnx(meta_key, "created_at", turn["timestamp"])
+        pipe.hset(meta_key, mapping=meta)
+        pipe.expire(messages_key, self.ttl)
+        pipe.expire(meta_key, self.ttl)
+        pipe.execute()
+        self.metrics["round_trips"] += 1
+
+        # Keep this worker's near-cached copy in step with its own writes
+        with self._near_cache_lock:
+            data = self._near_cache_get(context_id, count=False)
+            if data is not None:
+                data["messages"] = (data["messages"] + [turn])[-self.max_turns:]
+                if topic is not None:
+                    data["topic"] = topic
+                if user_intent is not None:
+                    data["user_intent"] = user_intent
+                self._near_cache_put(context_id, data)
+
+    def delete(self, context_id: str):
+        with self._near_cache_lock:
+            self._near_cache.pop(context_id, None)
+        deleted = self.client.delete(*self._keys(context_id))
+        self.metrics["round_trips"] += 1
+        if deleted:
+            self._notify_removed(context_id)
+
+    def _near_cache_get(self, context_id: str, count: bool = True) -> Optional[Dict]:
+        if self.near_cache_ttl <= 0:
+            return None
+        with self._near_cache_lock:
+            cached = self._near_cache.get(context_id)
+            if cached is not None and cached[0] < time.monotonic():
+                del self._near_cache[context_id]
+                cached = None
+            if count:
+                self.metrics["near_cache_hits" if cached else "near_cache_misses"] += 1
+        return None if cached is None else cached[1]
+
+    def _near_cache_put(self, context_id: str, data: Dict):
+        if self.near_cache_ttl <= 0:
+            return
+        with self._near_cache_lock:
+            self._near_cache[context_id] = (time.monotonic() + self.near_cache_ttl, data)
+            self._near_cache.move_to_end(context_id)
+            while len(self._near_cache) > self.near_cache_size:
+                self._near_cache.popitem(last=False)
+
+    def get_metrics(self) -> Dict:
+        return {**self.metrics, "near_cache_entries": len(self._near_cache)}
+
+def _copy_context(data: Dict) -> Dict:
+    """Copy of a near-cached context, so callers never mutate the cache."""
+    return {**data, "messages": [dict(message) for message in data["messages"]]}
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+def redis_config_from_url(url: str) -> Dict:
+    """Turn a ``redis://[:password@]host:port/db`` URL into a RedisHandler config."""
+    parsed = urlparse(url)
+    return {
+        "host": parsed.hostname or "localhost",
+        "port": parsed.port or 6379,
+        "db": int(parsed.path.lstrip("/") or 0),
+        "password": parsed.password
+    }
+
+def create_context_store(
+    ttl: int = 3600,
+    max_turns: int = 10,
+    max_contexts: Optional[int] = None,
+    kind: Optional[str] = None,
+    name: str = "default"
+) -> ContextStore:
+    """Build the context store selected by ``CONTEXT_STORE`` (memory or redis).
+
+    The in-memory store is journaled under ``CONTEXT_JOURNAL_DIR/<name>``
+    when that variable is set. Only one process can journal a directory;
+    other workers sharing it log an error and keep their contexts in memory
+    only.
+    """
+    kind = kind or os.getenv("CONTEXT_STORE", "memory")
+    if kind not in CONTEXT_STORES:
+        raise ValueError(
+            f"Unknown context store: {kind}. "
+            f"Expected one of {', '.join(CONTEXT_STORES)}"
+        )
+
+    if kind == "redis":
+        from .cache.redis_handler import RedisHandler
+        redis = RedisHandler(redis_config_from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+        return RedisContextStore(
+            redis,
+            ttl=ttl,
+            max_turns=max_turns,
+            near_cache_ttl=float(os.getenv("CONTEXT_NEAR_CACHE_TTL", "0"))
+        )
+
+    if max_contexts is None:
+        max_contexts = int(os.getenv("CONTEXT_MAX_CONTEXTS", "100000"))
+    store = InMemoryContextStore(ttl=ttl, max_turns=max_turns, max_contexts=max_contexts)
+    journal_dir = os.getenv("CONTEXT_JOURNAL_DIR")
+    if journal_dir:
+        try:
+            store.attach_journal(ContextJournal(os.path.join(journal_dir, name), ttl, max_turns))
+        except JournalLockedError as e:
+            logger.error(f"{str(e)}; contexts of this worker will not survive restarts")
+    return store
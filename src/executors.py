@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when a bounded executor has no room left in its queue."""
+
+class BoundedExecutor:
+    """Run blocking work off the event loop with a bounded backlog.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue_size``
+    more may wait for a worker; further submissions are rejected with
+    ``ExecutorSaturatedError`` instead of piling up behind slow jobs.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: int = 1,
+        max_queue_size: int = 64,
+        name: str = "executor",
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queue_size < 0:
+            raise ValueError("max_queue_size cannot be negative")
+
+        self.kind = kind
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._executor = self._create_executor(kind, max_workers, name)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "peak_queue_depth": 0,
+        }
+
+    @staticmethod
+    def _create_executor(kind: str, max_workers: int, name: str) -> Executor:
+        """Create the underlying thread or process pool."""
+        if kind == "thread":
+            return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        if kind == "process":
+            return ProcessPoolExecutor(max_workers=max_workers)
+        raise ValueError(f"Unknown executor kind: {kind}")
+
+    @property
+    def in_flight(self) -> int:
+        """Number of jobs running or waiting for a worker."""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of jobs waiting for a free worker."""
+        return max(0, self._in_flight - self.max_workers)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a new submission would be rejected."""
+        return self._in_flight >= self.max_workers + self.max_queue_size
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run ``fn`` in the pool and await its result."""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue_size:
+                self.metrics["rejected"] += 1
+                raise ExecutorSaturatedError(
+                    f"{self.name} queue is full ({self.max_queue_size} waiting)"
+                )
+            self._in_flight += 1
+            self.metrics["submitted"] += 1
+            self.metrics["peak_queue_depth"] = max(
+                self.metrics["peak_queue_depth"], self.queue_depth
+            )
+
+        # Release the slot when the job itself finishes, even if the awaiting
+        # caller was cancelled in the meantime
+        future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+            self.metrics["completed"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return executor counters together with the current load."""
+        return {
+            **self.metrics,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the worker pool."""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,189 @@
+import logging
+import os
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+import torch
+import yaml
+from torch import nn
+from transformers import (
+    AutoModelForCausalLM,
+    AutoModelForSequenceClassification,
+    AutoTokenizer
+)
+
+from .confidence import ConfidenceScorer
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ("eager", "int8", "onnx")
+
+def resolve_backend(config_path: str = "config/model_config.yaml") -> str:
+    """The inference backend every model in this process is served with.
+
+    ``INFERENCE_BACKEND`` wins when set; otherwise ``inference.backend`` in
+    the model config, falling back to ``eager``. Resolving it in one place
+    keeps the chatbot and the response generator on the same backend, and
+    so on the same model registry entries.
+    """
+    backend = os.getenv("INFERENCE_BACKEND")
+    if backend:
+        return backend
+    if os.path.exists(config_path):
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f) or {}
+        backend = (config.get("inference") or {}).get("backend")
+    return backend or "eager"
+
+def load_causal_lm(model_name: str, device: str, backend: str = "eager") -> Tuple[Any, Any]:
+    """Load a causal LM and its tokenizer on the requested backend."""
+    _check_backend(backend, device)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForCausalLM
+        model = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True)
+        return model, tokenizer
+
+    model = AutoModelForCausalLM.from_pretrained(model_name).to(device)
+    model.eval()
+    if backend == "int8":
+        model = quantize_dynamic_int8(model)
+    return model, tokenizer
+
+def load_sequence_classifier(model_path: str, device: str, backend: str = "eager") -> Tuple[Any, Any]:
+    """Load a sequence classifier and its tokenizer on the requested backend."""
+    _check_backend(backend, device)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        model = ORTModelForSequenceClassification.from_pretrained(model_path, export=True)
+        return model, tokenizer
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_path).to(device)
+    model.eval()
+    if backend == "int8":
+        model = quantize_dynamic_int8(model)
+    return model, tokenizer
+
+def quantize_dynamic_int8(model: nn.Module) -> nn.Module:
+    """Apply PyTorch dynamic int8 quantization to a model's linear layers.
+
+    GPT-2 style models implement their projections as ``Conv1D``, which
+    dynamic quantization skips, so those are converted to ``nn.Linear`` first.
+    """
+    _replace_conv1d(model)
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def _replace_conv1d(module: nn.Module):
+    """Swap transformers ``Conv1D`` layers for equivalent ``nn.Linear`` layers."""
+    from transformers.pytorch_utils import Conv1D
+
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = nn.Linear(in_features, out_features)
+            linear.weight = nn.Parameter(child.weight.detach().t().contiguous())
+            linear.bias = nn.Parameter(child.bias.detach().clone())
+            setattr(module, name, linear)
+        else:
+            _replace_conv1d(child)
+
+def _check_backend(backend: str, device: str):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(
+            f"Unknown inference backend: {backend}. "
+            f"Expected one of {', '.join(INFERENCE_BACKENDS)}"
+        )
+    if backend != "eager" and device != "cpu":
+        raise ValueError(f"The {backend} backend only runs on cpu, not {device}")
+
+def _greedy_generate(model, tokenizer, prompt: str, max_new_tokens: int, scorer: ConfidenceScorer):
+    """Greedy-decode a prompt, returning tokens, confidence and latency."""
+    inputs = tokenizer(prompt, return_tensors="pt")
+    started = time.perf_counter()
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.pad_token_id or tokenizer.eos_token_id,
+            output_logits=True,
+            return_dict_in_generate=True
+        )
+    elapsed = time.perf_counter() - started
+    generated = outputs.sequences[:, inputs["input_ids"].shape[1]:]
+    confidence = scorer.score(outputs.logits, generated, tokenizer.eos_token_id)[0]
+    return generated[0].tolist(), confidence, elapsed
+
+def check_parity(
+    reference: Any,
+    candidate: Any,
+    tokenizer: Any,
+    prompts: Sequence[str],
+    max_new_tokens: int = 32,
+    confidence_strategy: str = "mean_logprob"
+) -> Dict[str, float]:
+    """Compare greedy outputs of a candidate backend against the reference.
+
+    Returns the share of prompts with identical output, the mean share of
+    tokens generated before the first divergence, and the mean and maximum
+    absolute confidence drift.
+    """
+    scorer = ConfidenceScorer(confidence_strategy)
+    exact, prefix_agreement, drifts = 0, [], []
+
+    for prompt in prompts:
+        ref_tokens, ref_confidence, _ = _greedy_generate(reference, tokenizer, prompt, max_new_tokens, scorer)
+        cand_tokens, cand_confidence, _ = _greedy_generate(candidate, tokenizer, prompt, max_new_tokens, scorer)
+
+        exact += ref_tokens == cand_tokens
+        matching = 0
+        for ref_token, cand_token in zip(ref_tokens, cand_tokens):
+            if ref_token != cand_token:
+                break
+            matching += 1
+        prefix_agreement.append(matching / max(len(ref_tokens), 1))
+        drifts.append(abs(ref_confidence - cand_confidence))
+
+    count = max(len(prompts), 1)
+    return {
+        "exact_match_rate": exact / count,
+        "token_agreement": sum(prefix_agreement) / count,
+        "mean_confidence_drift": sum(drifts) / count,
+        "max_confidence_drift": max(drifts, default=0.0),
+    }
+
+def benchmark_backend(
+    model: Any,
+    tokenizer: Any,
+    prompts: Sequence[str],
+    max_new_tokens: int = 32,
+    warmup: int = 1
+) -> Dict[str, float]:
+    """Measure per-prompt latency and decode throughput of a backend."""
+    scorer = ConfidenceScorer()
+    for prompt in list(prompts)[:warmup]:
+        _greedy_generate(model, tokenizer, prompt, max_new_tokens, scorer)
+
+    latencies: List[float] = []
+    tokens = 0
+    for prompt in prompts:
+        generated, _, elapsed = _greedy_generate(model, tokenizer, prompt, max_new_tokens, scorer)
+        latencies.append(elapsed)
+        tokens += len(generated)
+
+    total = sum(latencies)
+    return {
+        "p50_latency_ms": percentile(latencies, 0.50) * 1000,
+        "p95_latency_ms": percentile(latencies, 0.95) * 1000,
+        "tokens_per_second": tokens / total if total else 0.0,
+        "prompts_per_second": len(latencies) / total if total else 0.0,
+    }
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` (0.0 for an empty sequence)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
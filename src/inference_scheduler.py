@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class InferenceScheduler:
+    """Group concurrent inference requests into dynamic micro-batches.
+
+    Requests submitted within ``max_wait_ms`` of the first queued request are
+    handed to ``batch_fn`` together (up to ``max_batch_size`` at a time), and
+    each caller receives the result at its own position in the batch.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms cannot be negative")
+
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._pending: Deque[Tuple[Any, asyncio.Future]] = deque()
+        self._item_ready: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        # The loop only keeps weak references to tasks; hold running batches
+        # here so they are not collected before resolving their callers
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.metrics = {
+            "batches": 0,
+            "batched_requests": 0,
+            "average_batch_size": 0.0,
+        }
+
+    @property
+    def pending(self) -> int:
+        """Number of requests waiting to be placed in a batch."""
+        return len(self._pending)
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item for the next batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        self._ensure_worker(loop)
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self._item_ready.set()
+        return await future
+
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop):
+        """Start the batching task on the running loop if it is not alive."""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._item_ready = asyncio.Event()
+        self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        """Form batches from pending requests and dispatch them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._item_ready.clear()
+                await self._item_ready.wait()
+                continue
+
+            # Give concurrent callers a short window to join the batch
+            deadline = loop.time() + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._item_ready.clear()
+                try:
+                    await asyncio.wait_for(self._item_ready.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                item, future = self._pending.popleft()
+                if not future.done():  # Skip callers that gave up while queued
+                    batch.append((item, future))
+
+            if batch:
+                task = loop.create_task(self._dispatch(batch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Stop forming batches, cancel queued requests and wait for the
+        batches already running to resolve their callers."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._pending:
+            _, future = self._pending.popleft()
+            future.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Run one batch and resolve every caller's future."""
+        self._record_batch(len(batch))
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Error running inference batch: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record_batch(self, batch_size: int):
+        """Update batching metrics."""
+        self.metrics["batches"] += 1
+        self.metrics["batched_requests"] += batch_size
+        self.metrics["average_batch_size"] = (
+            self.metrics["batched_requests"] / self.metrics["batches"]
+        )
@@ -0,0 +1,118 @@
+import logging
+import os
+from collections import deque
+from typing import Dict, List, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# Used when no keyword file is configured
+DEFAULT_KEYWORD_TABLES = {
+    "topic": {
+        "financial": ["stock", "price", "market", "invest", "trading"],
+        "support": ["help", "issue", "problem", "error", "how to"]
+    },
+    "user_intent": {
+        "question": ["what", "how", "why", "when", "where", "?"],
+        "request": ["can you", "please", "could you"],
+        "complaint": ["not working", "broken", "error", "issue"]
+    }
+}
+
+class KeywordMatcher:
+    """Find the first matching label of several keyword tables in one pass.
+
+    ``tables`` maps a field (e.g. ``"topic"``) to an ordered mapping of
+    label to keywords. A label matches when any of its keywords occurs in
+    the lowercased text; when several labels of a field match, the one
+    listed first wins, as with checking each label in turn.
+
+    All keywords are compiled into a single Aho-Corasick automaton, so
+    matching costs one walk over the text however many keywords there are.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, List[str]]]):
+        self.fields = list(tables)
+        self.labels: List[List[str]] = [list(tables[field]) for field in self.fields]
+
+        # Trie of all keywords; each node records, per field, the best
+        # (lowest) label index of the keywords ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._outputs: List[Dict[int, int]] = [{}]
+        for field_index, field in enumerate(self.fields):
+            for label_index, keywords in enumerate(tables[field].values()):
+                for keyword in keywords:
+                    self._add(keyword.lower(), field_index, label_index)
+        self._fail = self._link()
+
+    def _add(self, keyword: str, field_index: int, label_index: int):
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._outputs.append({})
+            node = next_node
+        outputs = self._outputs[node]
+        outputs[field_index] = min(label_index, outputs.get(field_index, label_index))
+
+    def _link(self) -> List[int]:
+        """Compute failure links breadth-first and fold each node's
+        outputs into those of the longest suffix it falls back to."""
+        fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                if node:
+                    state = fail[node]
+                    while state and char not in self._goto[state]:
+                        state = fail[state]
+                    fail[child] = self._goto[state].get(char, 0)
+                for field_index, label_index in self._outputs[fail[child]].items():
+                    outputs = self._outputs[child]
+                    outputs[field_index] = min(label_index, outputs.get(field_index, label_index))
+        return fail
+
+    def match(self, text: str) -> Dict[str, Optional[str]]:
+        """Return the winning label of every field, or None if none matched."""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        best: Dict[int, int] = {}
+        node = 0
+        for char in text.lower():
+            next_node = goto[node].get(char)
+            while next_node is None and node:
+                node = fail[node]
+                next_node = goto[node].get(char)
+            node = next_node or 0
+            output = outputs[node]
+            if output:
+                for field_index, label_index in output.items():
+                    if label_index < best.get(field_index, len(self.labels[field_index])):
+                        best[field_index] = label_index
+
+        return {
+            field: self.labels[field_index][best[field_index]] if field_index in best else None
+            for field_index, field in enumerate(self.fields)
+        }
+
+def load_keyword_tables(path: Optional[str] = None) -> Dict[str, Dict[str, List[str]]]:
+    """Load keyword tables from a YAML file.
+
+    Uses ``CONTEXT_KEYWORDS_PATH`` when no path is given and falls back to
+    the built-in tables if the file does not exist.
+    """
+    path = path or os.getenv("CONTEXT_KEYWORDS_PATH", "config/context_keywords.yaml")
+    if not os.path.exists(path):
+        return DEFAULT_KEYWORD_TABLES
+
+    with open(path, "r") as f:
+        tables = yaml.safe_load(f) or {}
+    logger.info(f"Loaded keyword tables from {path}")
+    return tables
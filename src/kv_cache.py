@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+def cache_nbytes(past_key_values: Any) -> int:
+    """Return the memory held by a model's ``past_key_values``."""
+    if past_key_values is None:
+        return 0
+    if hasattr(past_key_values, "to_legacy_cache"):
+        past_key_values = past_key_values.to_legacy_cache()
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for layer in past_key_values
+        for tensor in layer
+        if tensor is not None
+    )
+
+def crop_past_key_values(past_key_values: Any, length: int) -> Any:
+    """Drop cached positions beyond ``length`` tokens."""
+    if hasattr(past_key_values, "crop"):
+        past_key_values.crop(length)
+        return past_key_values
+    return tuple(
+        tuple(tensor[..., :length, :] for tensor in layer)
+        for layer in past_key_values
+    )
+
+class KVCacheEntry:
+    """Attention state for one conversation and the tokens it covers."""
+
+    __slots__ = ("token_ids", "past_key_values", "nbytes", "expires_at", "generation")
+
+    def __init__(self, token_ids, past_key_values, nbytes: int, expires_at: float, generation: int = 0):
+        self.token_ids = token_ids
+        self.past_key_values = past_key_values
+        self.nbytes = nbytes
+        self.expires_at = expires_at
+        self.generation = generation
+
+class ConversationKVCache:
+    """LRU/TTL store of ``past_key_values`` per conversation.
+
+    Entries expire ``ttl`` seconds after their last update, matching the
+    ``context_ttl`` of the ContextManager that owns the conversation, and the
+    least recently used entries are evicted once ``max_bytes`` is exceeded.
+    Entries belong to the model ``generation`` that produced them; moving
+    to a new generation drops them and refuses late puts from the old one.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, ttl: int = 3600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, KVCacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.generation = 0
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "reused_tokens": 0,
+            "prefix_mismatches": 0,
+            "stale_puts": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def take(self, context_id: str, prompt: Optional[Sequence[int]] = None) -> Optional[KVCacheEntry]:
+        """Remove and return the entry for a conversation, if still valid.
+
+        With ``prompt``, the entry is cut down to the longest prefix it
+        shares with ``prompt`` (leaving at least one prompt token to encode)
+        and only returned if that prefix is not empty. The caller owns the
+        entry until it is ``put`` back, so concurrent turns of the same
+        conversation never extend the same state.
+        """
+        with self._lock:
+            entry = self._entries.pop(context_id, None)
+            if entry is not None:
+                self.memory_bytes -= entry.nbytes
+                if entry.expires_at < time.monotonic() or entry.generation != self.generation:
+                    entry = None
+                elif prompt is not None:
+                    shared = self._shared_prefix(entry, prompt)
+                    if shared == 0:
+                        self.metrics["prefix_mismatches"] += 1
+                        entry = None
+                    elif shared < entry.token_ids.shape[-1]:
+                        entry.token_ids = entry.token_ids[:shared]
+                        entry.past_key_values = crop_past_key_values(entry.past_key_values, shared)
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            self.metrics["hits"] += 1
+            self.metrics["reused_tokens"] += int(entry.token_ids.shape[-1])
+            return entry
+
+    @staticmethod
+    def _shared_prefix(entry: KVCacheEntry, prompt: Sequence[int]) -> int:
+        cached = entry.token_ids.tolist()
+        limit = min(len(cached), len(prompt) - 1)
+        shared = 0
+        while shared < limit and cached[shared] == prompt[shared]:
+            shared += 1
+        return shared
+
+    def put(self, context_id: str, token_ids, past_key_values, generation: Optional[int] = None):
+        """Store the state covering ``token_ids`` for a conversation.
+
+        ``generation`` is the model generation the state was computed with
+        (defaulting to the current one); state from an older model is
+        dropped.
+        """
+        nbytes = cache_nbytes(past_key_values)
+        if not self.enabled or nbytes > self.max_bytes:
+            self.evict(context_id)
+            return
+
+        if generation is None:
+            generation = self.generation
+        entry = KVCacheEntry(token_ids, past_key_values, nbytes, time.monotonic() + self.ttl, generation)
+        with self._lock:
+            if generation != self.generation:
+                self.metrics["stale_puts"] += 1
+                return
+            previous = self._entries.pop(context_id, None)
+            if previous is not None:
+                self.memory_bytes -= previous.nbytes
+            self._entries[context_id] = entry
+            self.memory_bytes += nbytes
+            self._enforce_budget()
+
+    def evict(self, context_id: str):
+        """Drop the state of a conversation, e.g. when its context expires."""
+        with self._lock:
+            entry = self._entries.pop(context_id, None)
+            if entry is not None:
+                self.memory_bytes -= entry.nbytes
+
+    def cleanup_expired(self) -> int:
+        """Remove all expired entries."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                context_id
+                for context_id, entry in self._entries.items()
+                if entry.expires_at < now
+            ]
+            for context_id in expired:
+                self.memory_bytes -= self._entries.pop(context_id).nbytes
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+
+    def advance_generation(self) -> int:
+        """Drop all entries and start a new model generation, e.g. after
+        the serving model changed."""
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+            self.generation += 1
+            return self.generation
+
+    def _enforce_budget(self):
+        """Evict least recently used entries until within the memory budget."""
+        while self.memory_bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.memory_bytes -= entry.nbytes
+            self.metrics["evictions"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "memory_bytes": self.memory_bytes,
+        }
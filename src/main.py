@@ -1,20 +1,37 @@
-from fastapi import FastAPI, HTTPException, Depends, Security
+from fastapi import FastAPI, HTTPException, Depends, Header, Security
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 import uvicorn
+import asyncio
+import json
 import logging
+import os
 from datetime import datetime, timedelta
 
+from .admission import (
+    DEADLINE_HEADER,
+    DeadlineExceededError,
+    OverloadedError,
+    deadline_from_header,
+    retry_after_header,
+)
 from .chatbot import Chatbot
 from .context_manager import ContextManager
+from .executors import ExecutorSaturatedError
 from .security import (
     create_access_token,
     get_current_user,
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    password_executor,
+    revoke_token,
+    throttle_login,
+    verify_password_async,
 )
+from .token_cache import token_cache
+from .training_jobs import TrainingJobManager
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -38,9 +55,34 @@ app.add_middleware(
 # Initialize OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Initialize chatbot and context manager
-chatbot = Chatbot()
+# Initialize context manager and chatbot; cached conversation state
+# expires together with its context
 context_manager = ContextManager()
+chatbot = Chatbot(kv_cache_ttl=context_manager.context_ttl, context_manager=context_manager)
+context_manager.add_expiry_listener(chatbot.kv_cache.evict)
+context_manager.add_sweep_listener(chatbot.kv_cache.cleanup_expired)
+
+# Fine-tuning runs in separate, resource-limited processes; a successful
+# checkpoint replaces the serving model (see start_background_tasks)
+training_jobs = TrainingJobManager(
+    output_dir=os.getenv("MODEL_SAVE_PATH", "models"),
+    cpu_cores=int(os.getenv("TRAINING_CPU_CORES", "2")),
+    memory_mb=int(os.getenv("TRAINING_MEMORY_MB", "0"))
+)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    context_manager.start_expiry_sweeper()
+    # The monitor thread loads the checkpoint; the switch runs on this loop
+    loop = asyncio.get_running_loop()
+    training_jobs.on_success = lambda model_path: chatbot.swap_model(model_path, loop=loop)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await context_manager.stop_expiry_sweeper()
+    context_manager.close()
+    training_jobs.shutdown()
+    await chatbot.close()
 
 class Message(BaseModel):
     text: str
@@ -62,21 +104,24 @@ class TrainingConfig(BaseModel):
 @app.post("/chat", response_model=ChatResponse)
 async def chat(
     message: Message,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    deadline_ms: Optional[str] = Header(None, alias=DEADLINE_HEADER)
 ):
     try:
         # Get conversation context
-        context = context_manager.get_context(message.context_id) if message.context_id else {}
+        context = await context_manager.get_context_async(message.context_id)
         
         # Process message and generate response
         response, confidence = await chatbot.generate_response(
             message.text,
             context=context,
-            language=message.language
+            language=message.language,
+            context_id=message.context_id if context else None,
+            deadline=deadline_from_header(deadline_ms)
         )
         
         # Update context
-        context_id = context_manager.update_context(
+        context_id = await context_manager.update_context_async(
             message.context_id,
             message.text,
             response
@@ -89,34 +134,132 @@ async def chat(
             timestamp=datetime.now()
         )
     
+    except OverloadedError as e:
+        logger.warning(f"Shedding chat message: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="Server is overloaded. Please retry shortly.",
+            headers=retry_after_header(e.retry_after)
+        )
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ExecutorSaturatedError as e:
+        logger.warning(f"Rejecting chat message: {str(e)}")
+        raise HTTPException(status_code=503, detail="Inference queue is full. Please retry shortly.")
     except Exception as e:
         logger.error(f"Error processing chat message: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/train")
+@app.post("/chat/stream")
+async def chat_stream(
+    message: Message,
+    current_user: dict = Depends(get_current_user),
+    deadline_ms: Optional[str] = Header(None, alias=DEADLINE_HEADER)
+):
+    """Stream the response as Server-Sent Events while it is decoded."""
+    if chatbot.executor.saturated:
+        raise HTTPException(status_code=503, detail="Inference queue is full. Please retry shortly.")
+    # Shed before the stream starts, while a status code can still be sent
+    retry_after = chatbot.admission.retry_after()
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is overloaded. Please retry shortly.",
+            headers=retry_after_header(retry_after)
+        )
+    deadline = deadline_from_header(deadline_ms)
+    
+    context = await context_manager.get_context_async(message.context_id)
+    
+    async def event_stream():
+        chunks = []
+        try:
+            async for chunk in chatbot.generate_stream(
+                message.text,
+                context=context,
+                language=message.language,
+                context_id=message.context_id if context else None,
+                deadline=deadline
+            ):
+                chunks.append(chunk)
+                yield f"data: {json.dumps({'token': chunk})}\n\n"
+            
+            # Update context once the full response is known
+            response = "".join(chunks)
+            context_id = await context_manager.update_context_async(
+                message.context_id,
+                message.text,
+                response
+            )
+            done = {
+                "response": response,
+                "context_id": context_id,
+                "timestamp": datetime.now().isoformat()
+            }
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/train", status_code=202)
 async def train_model(
     config: TrainingConfig,
     current_user: dict = Security(get_current_user, scopes=["admin"])
 ):
     try:
-        # Start training process
-        training_job = await chatbot.train(
-            dataset_path=config.dataset_path,
-            model_type=config.model_type,
-            epochs=config.epochs,
-            batch_size=config.batch_size
-        )
-        return {"message": "Training started", "job_id": training_job}
+        # Queue a training job; it runs in its own process
+        job_id = training_jobs.submit({
+            "dataset_path": config.dataset_path,
+            "model_type": config.model_type,
+            "epochs": config.epochs,
+            "batch_size": config.batch_size,
+            "max_length": chatbot.max_length
+        })
+        return {"message": "Training started", "job_id": job_id}
     
     except Exception as e:
         logger.error(f"Error starting training: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/train")
+async def list_training_jobs(
+    current_user: dict = Security(get_current_user, scopes=["admin"])
+):
+    return [job.to_dict() for job in training_jobs.jobs()]
+
+@app.get("/train/{job_id}")
+async def get_training_job(
+    job_id: str,
+    current_user: dict = Security(get_current_user, scopes=["admin"])
+):
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job.to_dict()
+
+@app.post("/train/{job_id}/cancel")
+async def cancel_training_job(
+    job_id: str,
+    current_user: dict = Security(get_current_user, scopes=["admin"])
+):
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    if not training_jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Training job already {job.status}")
+    return job.to_dict()
+
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     try:
-        # Authenticate user and create access token
-        if not verify_password(form_data.password, get_password_hash(form_data.password)):
+        await throttle_login(form_data.username)
+        
+        # Authenticate user and create access token; bcrypt runs off the event loop
+        hashed_password = await get_password_hash_async(form_data.password)
+        if not await verify_password_async(form_data.password, hashed_password):
             raise HTTPException(
                 status_code=401,
                 detail="Incorrect username or password",
@@ -128,10 +271,23 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
         return {"access_token": access_token, "token_type": "bearer"}
     
+    except HTTPException:
+        raise
+    except ExecutorSaturatedError as e:
+        logger.warning(f"Rejecting login: {str(e)}")
+        raise HTTPException(status_code=503, detail="Too many logins in progress. Please retry shortly.")
     except Exception as e:
         logger.error(f"Error during login: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/logout")
+async def logout(
+    token: str = Depends(oauth2_scheme),
+    current_user: dict = Depends(get_current_user)
+):
+    revoke_token(token)
+    return {"message": "Logged out"}
+
 @app.get("/health")
 async def health_check():
     return {
@@ -146,6 +302,10 @@ async def get_metrics(
 ):
     try:
         metrics = await chatbot.get_metrics()
+        metrics["contexts"] = context_manager.get_metrics()
+        metrics["auth_tokens"] = token_cache.get_metrics()
+        metrics["password_hashing"] = password_executor.get_metrics()
+        metrics["training_jobs"] = training_jobs.get_metrics()
         return metrics
     except Exception as e:
         logger.error(f"Error fetching metrics: {str(e)}")
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .executors import BoundedExecutor
+
+logger = logging.getLogger(__name__)
+
+class MarketDataProvider:
+    """Source of market quotes for the market data client.
+
+    ``fetch_quotes`` is called with at most ``max_batch_size`` symbols and
+    returns a quote per symbol it found; symbols it leaves out count as
+    failed. Quotes hold ``price``, ``change``, ``change_percent``,
+    ``volume`` and ``market_cap`` (``None`` when unknown).
+    """
+
+    max_batch_size = 1
+
+    async def fetch_quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class YFinanceProvider(MarketDataProvider):
+    """Quotes from yfinance, one symbol per call.
+
+    yfinance blocks on the network, so calls run in a small thread pool;
+    each symbol's ``info`` is read once.
+    """
+
+    def __init__(self, max_workers: int = 8, max_queue_size: int = 64):
+        self.executor = BoundedExecutor(
+            kind="thread",
+            max_workers=max_workers,
+            max_queue_size=max_queue_size,
+            name="market_data"
+        )
+
+    async def fetch_quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        quotes = await asyncio.gather(*(self.executor.run(self._quote, symbol) for symbol in symbols))
+        return {symbol: quote for symbol, quote in zip(symbols, quotes) if quote is not None}
+
+    def _quote(self, symbol: str) -> Optional[Dict[str, Any]]:
+        import yfinance as yf
+        info = yf.Ticker(symbol).info
+        if info.get("regularMarketPrice") is None:
+            return None
+        return {
+            "price": info.get("regularMarketPrice"),
+            "change": info.get("regularMarketChange"),
+            "change_percent": info.get("regularMarketChangePercent"),
+            "volume": info.get("regularMarketVolume"),
+            "market_cap": info.get("marketCap"),
+        }
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+
+class HTTPQuoteProvider(MarketDataProvider):
+    """Quotes from an HTTP service, many symbols per call.
+
+    Sends ``GET {base_url}/quotes?symbols=A,B`` and expects a JSON object
+    mapping each symbol to its quote, so a local stub server can stand in
+    for a real feed.
+    """
+
+    max_batch_size = 50
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self._session = None
+
+    async def fetch_quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        params = {"symbols": ",".join(symbols)}
+        if self.api_key:
+            params["apikey"] = self.api_key
+        async with self._client().get(f"{self.base_url}/quotes", params=params) as response:
+            response.raise_for_status()
+            quotes = await response.json()
+        return {symbol: quotes[symbol] for symbol in symbols if quotes.get(symbol)}
+
+    def _client(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+class MarketDataClient:
+    """Fetch quotes for many symbols concurrently with bounded latency.
+
+    Symbols are split into provider-sized calls that all run at once. Each
+    call gets ``call_timeout`` seconds and the whole fetch ``deadline``
+    seconds; whatever arrived by then is returned, so a slow or failing
+    symbol only drops that symbol.
+    """
+
+    def __init__(self, provider: MarketDataProvider, call_timeout: float = 2.0, deadline: float = 3.0):
+        self.provider = provider
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self.metrics = {
+            "fetches": 0,
+            "symbols_requested": 0,
+            "symbols_failed": 0,
+            "call_timeouts": 0,
+            "deadline_hits": 0,
+            "average_fetch_ms": 0.0,
+        }
+
+    async def get(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return ``{symbol: quote}`` for every symbol fetched in time."""
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        if not symbols:
+            return {}
+
+        started = time.perf_counter()
+        size = max(self.provider.max_batch_size, 1)
+        calls = [
+            asyncio.ensure_future(self._call(symbols[start:start + size]))
+            for start in range(0, len(symbols), size)
+        ]
+        done, pending = await asyncio.wait(calls, timeout=self.deadline)
+        for call in pending:
+            call.cancel()
+        if pending:
+            self.metrics["deadline_hits"] += 1
+
+        quotes: Dict[str, Dict[str, Any]] = {}
+        fetched_at = datetime.utcnow()
+        for call in done:
+            for symbol, quote in call.result().items():
+                quotes[symbol] = {**quote, "timestamp": fetched_at}
+
+        self._record_fetch(len(symbols), len(symbols) - len(quotes), time.perf_counter() - started)
+        return quotes
+
+    async def _call(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.provider.fetch_quotes(symbols), self.call_timeout)
+        except asyncio.TimeoutError:
+            self.metrics["call_timeouts"] += 1
+            logger.warning(f"Market data call for {', '.join(symbols)} timed out")
+        except Exception as e:
+            logger.warning(f"Error fetching market data for {', '.join(symbols)}: {str(e)}")
+        return {}
+
+    def _record_fetch(self, requested: int, failed: int, seconds: float):
+        self.metrics["fetches"] += 1
+        self.metrics["symbols_requested"] += requested
+        self.metrics["symbols_failed"] += failed
+        self.metrics["average_fetch_ms"] += (
+            (seconds * 1000 - self.metrics["average_fetch_ms"]) / self.metrics["fetches"]
+        )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return dict(self.metrics)
+
+    async def close(self):
+        await self.provider.close()
+
+def create_market_data_client(kind: Optional[str] = None) -> MarketDataClient:
+    """Build the market data client configured by the MARKET_DATA_* env vars."""
+    kind = kind or os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+    if kind == "http":
+        provider = HTTPQuoteProvider(
+            os.getenv("MARKET_DATA_URL", "http://localhost:8081"),
+            api_key=os.getenv("MARKET_DATA_API_KEY")
+        )
+    elif kind == "yfinance":
+        provider = YFinanceProvider()
+    else:
+        raise ValueError(f"Unknown market data provider: {kind}. Expected yfinance or http")
+    return MarketDataClient(
+        provider,
+        call_timeout=float(os.getenv("MARKET_DATA_CALL_TIMEOUT", "2.0")),
+        deadline=float(os.getenv("MARKET_DATA_DEADLINE", "3.0"))
+    )
@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def model_nbytes(model: Any) -> int:
+    """Return the memory held by a model's weights.
+
+    Walks the state dict so quantized packed weights are counted and tied
+    weights are counted once; ONNX Runtime models report their graph size.
+    """
+    if hasattr(model, "state_dict"):
+        seen = set()
+        total = 0
+        pending = list(model.state_dict().values())
+        while pending:
+            value = pending.pop()
+            if isinstance(value, (tuple, list)):
+                pending.extend(value)
+            elif hasattr(value, "element_size") and hasattr(value, "numel"):
+                key = (value.data_ptr(), value.numel()) if value.numel() else id(value)
+                if key not in seen:
+                    seen.add(key)
+                    total += value.numel() * value.element_size()
+        return total
+
+    model_path = getattr(model, "model_path", None)
+    if model_path and os.path.exists(str(model_path)):
+        return os.path.getsize(str(model_path))
+    return 0
+
+class LoadedModel:
+    """A model and tokenizer held by the registry."""
+
+    __slots__ = ("name", "model", "tokenizer", "nbytes", "loaded_at")
+
+    def __init__(self, name: str, model: Any, tokenizer: Any, nbytes: int):
+        self.name = name
+        self.model = model
+        self.tokenizer = tokenizer
+        self.nbytes = nbytes
+        self.loaded_at = time.time()
+
+class ModelRegistry:
+    """Process-wide store of loaded models shared by all consumers.
+
+    Models are loaded lazily on first request and handed out by reference, so
+    every Chatbot or ResponseGenerator asking for the same key uses the same
+    weights. When ``max_memory_bytes`` is set, the least recently used models
+    are unloaded to make room for a new one. Consumers that switch models
+    ``retain`` the model they serve and ``release`` the one they stop
+    serving; a model is unloaded once its last consumer releases it.
+
+    Loads run outside the registry lock, so loading one model (e.g. a new
+    checkpoint) never blocks access to the others; concurrent requests for a
+    model being loaded wait for that one load.
+    """
+
+    def __init__(self, max_memory_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self._models: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}
+        self._refs: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.metrics = {
+            "loads": 0,
+            "hits": 0,
+            "evictions": 0,
+        }
+
+    def get(self, name: str, loader: Callable[[], Tuple[Any, Any]]) -> LoadedModel:
+        """Return the model registered under ``name``, loading it if needed.
+
+        Args:
+            name: registry key, unique per model, backend and device.
+            loader: returns ``(model, tokenizer)``; only called on a miss.
+        """
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                self.metrics["hits"] += 1
+                return entry
+            loading = self._loading.get(name)
+            if loading is None:
+                loading = self._loading[name] = Future()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            return loading.result()
+
+        try:
+            started = time.perf_counter()
+            model, tokenizer = loader()
+            entry = LoadedModel(name, model, tokenizer, model_nbytes(model))
+        except BaseException as e:
+            with self._lock:
+                del self._loading[name]
+            loading.set_exception(e)
+            raise
+
+        with self._lock:
+            self._models[name] = entry
+            del self._loading[name]
+            self.metrics["loads"] += 1
+            self._enforce_budget(keep=name)
+        loading.set_result(entry)
+        logger.info(
+            f"Loaded {name} into registry ({entry.nbytes / 1024 ** 2:.1f} MB "
+            f"in {time.perf_counter() - started:.1f}s)"
+        )
+        return entry
+
+    def retain(self, name: str):
+        """Record that one more consumer serves the model under ``name``."""
+        with self._lock:
+            self._refs[name] = self._refs.get(name, 0) + 1
+
+    def release(self, name: str) -> bool:
+        """Drop a consumer's reference to ``name``.
+
+        The model is unloaded once no consumer references it; returns
+        whether it was.
+        """
+        with self._lock:
+            refs = self._refs.get(name, 0) - 1
+            if refs > 0:
+                self._refs[name] = refs
+                return False
+            self._refs.pop(name, None)
+            unloaded = self._models.pop(name, None) is not None
+        if unloaded:
+            logger.info(f"Unloaded {name} from registry; no consumer references it")
+        return unloaded
+
+    def unload(self, name: str) -> bool:
+        """Drop a model from the registry."""
+        with self._lock:
+            return self._models.pop(name, None) is not None
+
+    def loaded(self, name: str) -> bool:
+        return name in self._models
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._models.values())
+
+    def memory_report(self) -> Dict[str, int]:
+        """Bytes held by each loaded model."""
+        with self._lock:
+            return {name: entry.nbytes for name, entry in self._models.items()}
+
+    def _enforce_budget(self, keep: str):
+        """Unload least recently used models until within the budget."""
+        if not self.max_memory_bytes:
+            return
+        for name in list(self._models):
+            if self.memory_bytes <= self.max_memory_bytes:
+                break
+            if name == keep:
+                continue
+            self._models.pop(name)
+            self.metrics["evictions"] += 1
+            logger.info(f"Evicted {name} from registry to stay within memory budget")
+
+        if self.memory_bytes > self.max_memory_bytes:
+            logger.warning(
+                f"Model {keep} alone exceeds the registry memory budget "
+                f"({self.max_memory_bytes / 1024 ** 2:.0f} MB)"
+            )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "models": self.memory_report(),
+            "references": dict(self._refs),
+            "memory_bytes": self.memory_bytes,
+        }
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    """Return the process-wide model registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            max_memory_mb = int(os.getenv("MODEL_REGISTRY_MAX_MEMORY_MB", "0"))
+            _registry = ModelRegistry(max_memory_bytes=max_memory_mb * 1024 * 1024)
+        return _registry
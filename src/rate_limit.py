@@ -0,0 +1,224 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ALGORITHMS = ("token_bucket", "sliding_window")
+
+class RateLimitResult:
+    """Outcome of counting one request against a client's limit."""
+
+    __slots__ = ("allowed", "limit", "remaining", "reset_after")
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, reset_after: float):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_after = reset_after  # seconds until a request is allowed again / the limit resets
+
+class RateLimitBackend:
+    """Constant-time rate limit state per client key.
+
+    ``token_bucket`` refills ``max_requests`` tokens evenly over
+    ``window_size`` seconds and allows bursts up to ``max_requests``.
+    ``sliding_window`` approximates a sliding window from the counts of the
+    current and previous fixed windows, weighting the previous one by how
+    much of it still overlaps the sliding window.
+    """
+
+    def __init__(self, algorithm: str, max_requests: int, window_size: int):
+        if algorithm not in RATE_LIMIT_ALGORITHMS:
+            raise ValueError(
+                f"Unknown rate limit algorithm: {algorithm}. "
+                f"Expected one of {', '.join(RATE_LIMIT_ALGORITHMS)}"
+            )
+        self.algorithm = algorithm
+        self.max_requests = max_requests
+        self.window_size = window_size
+
+    async def hit(self, key: str) -> RateLimitResult:
+        """Count a request for ``key`` if it is within the limit."""
+        raise NotImplementedError
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process rate limit state, keeping at most ``max_keys`` clients.
+
+    Each client holds three numbers whatever the request rate. Least
+    recently seen clients are forgotten first once ``max_keys`` is reached.
+    """
+
+    def __init__(self, algorithm: str, max_requests: int, window_size: int, max_keys: int = 100000):
+        super().__init__(algorithm, max_requests, window_size)
+        self.max_keys = max_keys
+        self._state: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def hit(self, key: str) -> RateLimitResult:
+        now = time.time()
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = self._initial_state(now)
+            while len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+
+        if self.algorithm == "token_bucket":
+            return self._token_bucket(state, now)
+        return self._sliding_window(state, now)
+
+    def _initial_state(self, now: float) -> List[float]:
+        if self.algorithm == "token_bucket":
+            return [float(self.max_requests), now, 0.0]  # tokens, last refill
+        return [math.floor(now / self.window_size), 0.0, 0.0]  # window index, current, previous
+
+    def _token_bucket(self, state: List[float], now: float) -> RateLimitResult:
+        rate = self.max_requests / self.window_size
+        tokens = min(self.max_requests, state[0] + (now - state[1]) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        state[0], state[1] = tokens, now
+        # Time until the next whole token is available
+        reset_after = 0.0 if tokens >= 1 else (1 - tokens) / rate
+        return RateLimitResult(allowed, self.max_requests, int(tokens), reset_after)
+
+    def _sliding_window(self, state: List[float], now: float) -> RateLimitResult:
+        window = math.floor(now / self.window_size)
+        if window != state[0]:
+            # Roll over; the previous count only carries over if adjacent
+            state[2] = state[1] if window == state[0] + 1 else 0.0
+            state[0], state[1] = window, 0.0
+
+        elapsed = now - window * self.window_size
+        weight = 1 - elapsed / self.window_size
+        estimate = state[2] * weight + state[1]
+        allowed = estimate + 1 <= self.max_requests
+        if allowed:
+            state[1] += 1
+            estimate += 1
+        return RateLimitResult(
+            allowed,
+            self.max_requests,
+            max(int(self.max_requests - estimate), 0),
+            self.window_size - elapsed
+        )
+
+# Both scripts read the clock from Redis so every worker agrees on time,
+# and return {allowed, remaining, reset_after_ms}
+TOKEN_BUCKET_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local rate = limit / window_ms
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or limit
+local ts = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + (now - ts) * rate)
+
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window_ms)
+
+local reset_ms = 0
+if tokens < 1 then
+    reset_ms = math.ceil((1 - tokens) / rate)
+end
+return {allowed, math.floor(tokens), reset_ms}
+"""
+
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local window = math.floor(now / window_ms)
+
+local state = redis.call('HMGET', KEYS[1], 'window', 'current', 'previous')
+local stored = tonumber(state[1]) or window
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if stored ~= window then
+    if stored == window - 1 then previous = current else previous = 0 end
+    current = 0
+end
+
+local elapsed = now - window * window_ms
+local estimate = previous * (1 - elapsed / window_ms) + current
+local allowed = 0
+if estimate + 1 <= limit then
+    current = current + 1
+    estimate = estimate + 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'window', window, 'current', current, 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], window_ms * 2)
+return {allowed, math.max(math.floor(limit - estimate), 0), window_ms - elapsed}
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Rate limit state shared by all workers through Redis.
+
+    Each request is a single atomic Lua script call on one hash per client,
+    so the limit holds across workers and idle keys expire on their own.
+    While Redis is unreachable the limiter fails open: requests are allowed
+    and the outage is logged once, not on every request.
+    """
+
+    def __init__(
+        self,
+        client,
+        algorithm: str,
+        max_requests: int,
+        window_size: int,
+        prefix: str = "rate_limit"
+    ):
+        super().__init__(algorithm, max_requests, window_size)
+        from redis.exceptions import RedisError
+
+        self.client = client
+        self.prefix = prefix
+        self._errors = (RedisError, OSError)
+        self._failing = False
+        script = TOKEN_BUCKET_SCRIPT if algorithm == "token_bucket" else SLIDING_WINDOW_SCRIPT
+        self._script = client.register_script(script)
+
+    async def hit(self, key: str) -> RateLimitResult:
+        try:
+            allowed, remaining, reset_ms = await self._script(
+                keys=[f"{self.prefix}:{self.algorithm}:{key}"],
+                args=[self.max_requests, self.window_size * 1000]
+            )
+        except self._errors as e:
+            if not self._failing:
+                self._failing = True
+                logger.error(f"Rate limit backend unavailable, allowing requests: {str(e)}")
+            return RateLimitResult(True, self.max_requests, self.max_requests, 0.0)
+        if self._failing:
+            self._failing = False
+            logger.info("Rate limit backend recovered")
+        return RateLimitResult(bool(allowed), self.max_requests, int(remaining), int(reset_ms) / 1000)
+
+def create_rate_limit_backend(
+    algorithm: str,
+    max_requests: int,
+    window_size: int,
+    kind: str = "memory",
+    redis_url: Optional[str] = None
+) -> RateLimitBackend:
+    """Build the in-memory or Redis rate limit backend."""
+    if kind == "redis":
+        import redis.asyncio as redis
+        client = redis.from_url(redis_url or "redis://localhost:6379/0")
+        return RedisRateLimitBackend(client, algorithm, max_requests, window_size)
+    if kind != "memory":
+        raise ValueError(f"Unknown rate limit backend: {kind}. Expected memory or redis")
+    return InMemoryRateLimitBackend(algorithm, max_requests, window_size)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .cache.cache_manager import CacheManager
+from .executors import BoundedExecutor
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Cache of generated responses for repeated queries.
+
+    Keys combine the normalized query (case-folded, whitespace collapsed),
+    the context fields that shape its prompt and the generation settings, so
+    queries differing only in case or spacing share an entry. The model
+    always sees the query as written. Entries live for ``ttl`` seconds; the
+    local store keeps at most ``max_entries`` and evicts least recently used
+    first. With a ``CacheManager`` backend the cache is shared between
+    workers and size eviction is left to the Redis ``maxmemory`` policy; its
+    blocking round trips run in a thread pool, off the event loop.
+
+    With ``require_deterministic`` (the default) the cache is only used for
+    greedy decoding, so a cached answer is what the model would generate
+    again for the same query.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl: int = 3600,
+        backend: Optional[CacheManager] = None,
+        namespace: str = "response_cache",
+        require_deterministic: bool = True
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.namespace = namespace
+        self.require_deterministic = require_deterministic
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.executor: Optional[BoundedExecutor] = None
+        if backend is not None:
+            self.executor = BoundedExecutor(
+                kind="thread",
+                max_workers=4,
+                max_queue_size=1024,
+                name="response-cache"
+            )
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "hit_ratio": 0.0,
+            "saved_generation_seconds": 0.0,
+        }
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Case- and whitespace-insensitive form of a query."""
+        return " ".join(text.split()).casefold()
+
+    def make_key(self, text: str, context: Dict[str, Any], settings: Dict[str, Any]) -> str:
+        """Build the cache key for a query, its prompt context fields and generation settings."""
+        payload = json.dumps(
+            {"query": self.normalize(text), "context": context, "settings": settings},
+            sort_keys=True,
+            default=str
+        )
+        return f"{self.namespace}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return the cached ``(response, confidence)`` for a key."""
+        entry = await self._get_entry(key)
+        if entry is None:
+            self.metrics["misses"] += 1
+            self._update_hit_ratio()
+            return None
+
+        self.metrics["hits"] += 1
+        self.metrics["saved_generation_seconds"] += entry.get("generation_seconds", 0.0)
+        self._update_hit_ratio()
+        return entry["response"], entry["confidence"]
+
+    async def set(self, key: str, response: str, confidence: float, generation_seconds: float):
+        """Cache a generated response."""
+        entry = {
+            "response": response,
+            "confidence": confidence,
+            "generation_seconds": generation_seconds,
+        }
+        if self.backend is not None:
+            try:
+                await self.executor.run(self.backend.set, key, entry, ttl=self.ttl)
+            except Exception as e:
+                logger.error(f"Error writing response cache: {str(e)}")
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.backend is not None:
+            try:
+                return await self.executor.run(self.backend.get, key)
+            except Exception as e:
+                logger.error(f"Error reading response cache: {str(e)}")
+                return None
+
+        cached = self._entries.get(key)
+        if cached is None:
+            return None
+        expires_at, entry = cached
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _update_hit_ratio(self):
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        self.metrics["hit_ratio"] = self.metrics["hits"] / lookups if lookups else 0.0
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        metrics = {**self.metrics, "entries": len(self._entries)}
+        if self.executor is not None:
+            metrics["executor"] = self.executor.get_metrics()
+        return metrics
@@ -1,39 +1,37 @@
+import os
 import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from typing import Dict, Any
+from .inference_backends import load_sequence_classifier, resolve_backend
+from .model_registry import get_model_registry
 from .nlp_utils import preprocess_text
 
 class ResponseGenerator:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        self.models = {}
-        self.tokenizers = {}
+        self.backend = resolve_backend()
+        self.registry = get_model_registry()
         
     def load_model(self, model_type: str):
-        """Load pre-trained model and tokenizer"""
+        """Get pre-trained model and tokenizer from the shared model registry"""
         model_path = os.path.join(
             self.config['model_paths'][model_type]
         )
         
-        self.models[model_type] = AutoModelForSequenceClassification.from_pretrained(
-            model_path
-        ).to(self.device)
-        
-        self.tokenizers[model_type] = AutoTokenizer.from_pretrained(
-            model_path
+        return self.registry.get(
+            f"sequence-classification:{model_path}:{self.backend}:{self.device}",
+            lambda: load_sequence_classifier(model_path, self.device, self.backend)
         )
 
     def generate_response(self, query: str, model_type: str) -> str:
         """Generate response for given query"""
-        if model_type not in self.models:
-            self.load_model(model_type)
+        loaded = self.load_model(model_type)
             
         # Preprocess query
         processed_query = preprocess_text(query)
         
         # Tokenize input
-        inputs = self.tokenizers[model_type](
+        inputs = loaded.tokenizer(
             processed_query,
             return_tensors="pt",
             padding=True,
@@ -42,7 +40,7 @@ class ResponseGenerator:
         
         # Get model predictions
         with torch.no_grad():
-            outputs = self.models[model_type](**inputs)
+            outputs = loaded.model(**inputs)
             logits = outputs.logits
             predicted_class = torch.argmax(logits, dim=-1).item()
             
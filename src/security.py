@@ -5,8 +5,13 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import os
+import math
 import logging
 
+from .executors import BoundedExecutor
+from .rate_limit import create_rate_limit_backend
+from .token_cache import token_cache
+
 logger = logging.getLogger(__name__)
 
 # Security configuration
@@ -20,6 +25,24 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Each bcrypt call burns ~100ms of CPU, so hashing runs in its own small pool
+# rather than on the event loop; the bcrypt backend releases the GIL
+password_executor = BoundedExecutor(
+    kind=os.getenv("PASSWORD_HASH_EXECUTOR", "thread"),
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    max_queue_size=int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32")),
+    name="password_hash"
+)
+
+# Login attempts allowed per username, checked before any hashing
+login_throttle = create_rate_limit_backend(
+    "token_bucket",
+    int(os.getenv("LOGIN_MAX_ATTEMPTS", "5")),
+    int(os.getenv("LOGIN_ATTEMPT_WINDOW", "60")),
+    kind=os.getenv("RATE_LIMIT_BACKEND", "memory"),
+    redis_url=os.getenv("REDIS_URL")
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     try:
@@ -32,6 +55,24 @@ def get_password_hash(password: str) -> str:
     """Generate password hash."""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the password hashing pool."""
+    return await password_executor.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the password hashing pool."""
+    return await password_executor.run(get_password_hash, password)
+
+async def throttle_login(username: str):
+    """Count a login attempt for a username, rejecting floods before they reach bcrypt."""
+    result = await login_throttle.hit(f"login:{username.lower()}")
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts. Please try again later.",
+            headers={"Retry-After": str(math.ceil(result.reset_after))},
+        )
+
 def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a new JWT token."""
     try:
@@ -60,8 +101,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict:
     )
     
     try:
-        # Decode JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Decode JWT token; verified payloads are cached until the token expires
+        payload = token_cache.verify(token, SECRET_KEY, ALGORITHM)
         username: str = payload.get("sub")
         
         if username is None:
@@ -78,6 +119,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict:
         logger.error(f"Error getting current user: {str(e)}")
         raise credentials_exception
 
+def revoke_token(token: str):
+    """Reject a token from now on, e.g. on logout.
+
+    Only this worker process learns of the revocation; see VerifiedTokenCache.
+    """
+    token_cache.revoke(token)
+
 def create_api_key() -> str:
     """Generate a new API key."""
     try:
@@ -0,0 +1,126 @@
+import re
+import torch
+from typing import List, Optional, Sequence
+from transformers import StoppingCriteria
+
+# End of a sentence: terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, so "3.5" or "e.g." mid-token do not match
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s)")
+TRAILING_SENTENCE_END = re.compile(r"[.!?][\"')\]]*$")
+WORD = re.compile(r"\w")
+
+class StopSequenceMatcher:
+    """Find where generated text should be cut off."""
+
+    def __init__(self, stop_sequences: Sequence[str] = (), stop_at_sentence_end: bool = False):
+        self.stop_sequences = tuple(sequence for sequence in stop_sequences if sequence)
+        self.stop_at_sentence_end = stop_at_sentence_end
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.stop_sequences) or self.stop_at_sentence_end
+
+    def find(self, text: str, has_content: bool = False) -> Optional[int]:
+        """Return the index text should be cut at, or None to keep going.
+
+        Stop sequences and sentence ends before the answer has any content
+        (e.g. the blank line GPT-2 often starts with) are ignored.
+        ``has_content`` tells that ``text`` is the tail of an answer whose
+        earlier text already had content, so a match at its very start
+        still counts.
+        """
+        cut = None
+        for sequence in self.stop_sequences:
+            index = text.find(sequence)
+            while index != -1 and not has_content and not WORD.search(text, 0, index):
+                index = text.find(sequence, index + 1)
+            if index != -1 and (cut is None or index < cut):
+                cut = index
+
+        if self.stop_at_sentence_end:
+            for match in SENTENCE_END.finditer(text):
+                # Ignore punctuation before the answer has any content
+                if has_content or WORD.search(text, 0, match.start()):
+                    if cut is None or match.end() < cut:
+                        cut = match.end()
+                    break
+        return cut
+
+    def trim(self, text: str) -> str:
+        """Cut text at the first stop sequence or sentence end."""
+        cut = self.find(text)
+        return text if cut is None else text[:cut]
+
+    def holdback(self, text: str) -> int:
+        """Length of the prefix of ``text`` that cannot start a stop sequence.
+
+        Used while streaming so a partially decoded stop sequence is never
+        sent to the client.
+        """
+        keep = len(text)
+        for sequence in self.stop_sequences:
+            for size in range(min(len(sequence) - 1, len(text)), 0, -1):
+                if text.endswith(sequence[:size]):
+                    keep = min(keep, len(text) - size)
+                    break
+        if self.stop_at_sentence_end:
+            # A sentence end is only confirmed by the whitespace after it
+            match = TRAILING_SENTENCE_END.search(text)
+            if match:
+                keep = min(keep, match.start())
+        return keep
+
+class StopOnSequences(StoppingCriteria):
+    """Stop each sequence once its generated text hits a stop condition.
+
+    Only the last few generated tokens of each row are decoded per step;
+    tokens leaving that window are decoded once to track whether the row
+    already has content.
+    """
+
+    def __init__(self, tokenizer, matcher: StopSequenceMatcher, prompt_length: int):
+        self.tokenizer = tokenizer
+        self.matcher = matcher
+        self.prompt_length = prompt_length
+        longest = max(
+            (len(tokenizer.encode(sequence, add_special_tokens=False)) for sequence in matcher.stop_sequences),
+            default=0
+        )
+        self.window = max(longest, 3) + 2
+        self._has_content: Optional[List[bool]] = None
+        self._scanned = 0  # generated tokens already checked for content
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.Tensor:
+        generated = input_ids[:, self.prompt_length:]
+        if self._has_content is None:
+            self._has_content = [False] * generated.shape[0]
+        # Assisted decoding may add several tokens per step
+        leaving = generated.shape[1] - self.window
+        if leaving > self._scanned:
+            dropped = self.tokenizer.batch_decode(generated[:, self._scanned:leaving], skip_special_tokens=True)
+            self._has_content = [
+                seen or bool(WORD.search(text)) for seen, text in zip(self._has_content, dropped)
+            ]
+            self._scanned = leaving
+
+        tails = self.tokenizer.batch_decode(generated[:, -self.window:], skip_special_tokens=True)
+        return torch.tensor(
+            [
+                self.matcher.find(tail, has_content=seen) is not None
+                for tail, seen in zip(tails, self._has_content)
+            ],
+            dtype=torch.bool,
+            device=input_ids.device
+        )
+
+def kept_token_count(tokenizer, tokens: Sequence[int], text_length: int) -> int:
+    """Smallest number of leading ``tokens`` whose decoded text reaches
+    ``text_length`` characters, i.e. the tokens that survive trimming."""
+    low, high = 0, len(tokens)
+    while low < high:
+        middle = (low + high) // 2
+        if len(tokenizer.decode(tokens[:middle], skip_special_tokens=True)) >= text_length:
+            high = middle
+        else:
+            low = middle + 1
+    return low
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+from typing import List, Optional
+from transformers import StoppingCriteria, TextStreamer
+
+class AsyncTextStreamer(TextStreamer):
+    """Hand decoded text from a generating thread to an asyncio consumer.
+
+    ``generate`` calls ``put`` from the inference thread; finalized text is
+    forwarded to ``queue`` on the event loop, followed by ``None`` once the
+    stream ends. Decode-step timestamps are kept for latency metrics.
+    """
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop, **decode_kwargs):
+        super().__init__(tokenizer, skip_prompt=True, **decode_kwargs)
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.token_times: List[float] = []
+
+    def put(self, value):
+        if not self.next_tokens_are_prompt:
+            self.token_times.append(time.perf_counter())
+        super().put(value)
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+    def time_to_first_token(self, started_at: float) -> Optional[float]:
+        """Seconds from ``started_at`` until the first token was decoded."""
+        if not self.token_times:
+            return None
+        return self.token_times[0] - started_at
+
+    def inter_token_latency(self) -> Optional[float]:
+        """Mean seconds between consecutive decoded tokens."""
+        if len(self.token_times) < 2:
+            return None
+        return (self.token_times[-1] - self.token_times[0]) / (len(self.token_times) - 1)
+
+class StopOnEvent(StoppingCriteria):
+    """Stop generation once ``event`` is set, e.g. when a client disconnects."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
@@ -0,0 +1,150 @@
+import hashlib
+import heapq
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from jose import JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+class TokenRevokedError(JWTError):
+    """The token was revoked before it expired."""
+
+class VerifiedTokenCache:
+    """Cache of verified JWT payloads keyed by a hash of the token.
+
+    Keys also cover the secret key and algorithm, so a token verified by one
+    verifier never passes another that uses a different key. Entries live
+    until the token's ``exp`` (or ``max_ttl`` seconds, whichever is sooner)
+    and at most ``max_entries`` are kept, evicting least recently used first.
+    ``max_entries=0`` disables caching.
+
+    ``revoke`` rejects a token until it expires, whether or not it is cached.
+    Revocations live in this process only: other workers keep accepting the
+    token until it expires.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_ttl: float = 3600):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._verifiers: Dict[str, Set[str]] = {}  # token hash -> verifiers it is cached for
+        self._revoked: Dict[str, float] = {}  # token hash -> when it can be forgotten
+        self._revoked_expiry: List[Tuple[float, str]] = []  # heap of (forget_at, token hash)
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "hit_ratio": 0.0,
+            "revocations": 0,
+            "verify_seconds": 0.0,
+            "saved_verify_seconds": 0.0,
+        }
+
+    def verify(self, token: str, secret_key: str, algorithm: str) -> Dict[str, Any]:
+        """Return the token payload, verifying the signature on a cache miss.
+
+        Raises ``JWTError`` (``TokenRevokedError`` for revoked tokens) when
+        the token is not valid.
+        """
+        now = time.time()
+        token_hash = self._token_hash(token)
+        if token_hash in self._revoked:
+            raise TokenRevokedError("Token has been revoked")
+
+        key = self._key(token_hash, secret_key, algorithm)
+        cached = self._entries.get(key)
+        if cached is not None:
+            expires_at, payload = cached
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.metrics["hits"] += 1
+                self.metrics["saved_verify_seconds"] += self._average_verify_seconds()
+                self._update_hit_ratio()
+                return payload
+            self._drop(key)
+
+        started = time.perf_counter()
+        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+        self.metrics["verify_seconds"] += time.perf_counter() - started
+        self.metrics["misses"] += 1
+        self._update_hit_ratio()
+
+        if self.max_entries > 0:
+            expires_at = now + self.max_ttl
+            if payload.get("exp") is not None:
+                expires_at = min(expires_at, float(payload["exp"]))
+            self._entries[key] = (expires_at, payload)
+            self._verifiers.setdefault(token_hash, set()).add(key[1])
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        return payload
+
+    def revoke(self, token: str, expires_at: Optional[float] = None):
+        """Reject ``token`` from now on.
+
+        The revocation is kept until ``expires_at`` (the token's ``exp`` when
+        not given), after which the token is rejected as expired anyway.
+        """
+        now = time.time()
+        if expires_at is None:
+            try:
+                expires_at = float(jwt.get_unverified_claims(token).get("exp") or now + self.max_ttl)
+            except JWTError:
+                expires_at = now + self.max_ttl
+
+        token_hash = self._token_hash(token)
+        self._revoked[token_hash] = expires_at
+        heapq.heappush(self._revoked_expiry, (expires_at, token_hash))
+        for verifier in list(self._verifiers.get(token_hash, ())):
+            self._drop((token_hash, verifier))
+        self.metrics["revocations"] += 1
+        # Forget revocations of tokens that have expired since
+        while self._revoked_expiry and self._revoked_expiry[0][0] < now:
+            forget_at, revoked_hash = heapq.heappop(self._revoked_expiry)
+            if self._revoked.get(revoked_hash) == forget_at:
+                del self._revoked[revoked_hash]
+        logger.info("Revoked access token")
+
+    def clear(self):
+        """Drop all cached payloads, e.g. after rotating the secret key."""
+        self._entries.clear()
+        self._verifiers.clear()
+
+    def _drop(self, key: Tuple[str, str]):
+        del self._entries[key]
+        token_hash, verifier = key
+        verifiers = self._verifiers[token_hash]
+        verifiers.discard(verifier)
+        if not verifiers:
+            del self._verifiers[token_hash]
+
+    def _token_hash(self, token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _key(self, token_hash: str, secret_key: str, algorithm: str) -> Tuple[str, str]:
+        verifier = hashlib.sha256(f"{algorithm}:{secret_key}".encode()).hexdigest()[:16]
+        return token_hash, verifier
+
+    def _average_verify_seconds(self) -> float:
+        misses = self.metrics["misses"]
+        return self.metrics["verify_seconds"] / misses if misses else 0.0
+
+    def _update_hit_ratio(self):
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        self.metrics["hit_ratio"] = self.metrics["hits"] / lookups if lookups else 0.0
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "revoked": len(self._revoked),
+        }
+
+# Shared by every path that verifies access tokens
+token_cache = VerifiedTokenCache(
+    max_entries=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")),  # 0 disables caching
+    max_ttl=float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", "3600"))
+)
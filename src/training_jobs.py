@@ -0,0 +1,295 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+class TrainingJob:
+    """State of one fine-tuning run, as reported by the job endpoints."""
+
+    def __init__(self, job_id: str, config: Dict[str, Any]):
+        self.job_id = job_id
+        self.config = config
+        self.status = "queued"
+        self.progress: Dict[str, Any] = {}
+        self.model_path: Optional[str] = None
+        self.deployed = False
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.process: Optional[multiprocessing.Process] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "config": self.config,
+            "progress": self.progress,
+            "model_path": self.model_path,
+            "deployed": self.deployed,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+def _limit_resources(cpu_cores: int, memory_mb: int):
+    """Confine the training process to ``cpu_cores`` cores and ``memory_mb`` of memory.
+
+    Takes the highest-numbered cores so serving keeps the low ones, and
+    lowers the process priority so the scheduler favors serving threads.
+    """
+    import torch
+
+    os.nice(10)
+    if cpu_cores > 0:
+        if hasattr(os, "sched_getaffinity"):
+            available = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, available[-cpu_cores:])
+        torch.set_num_threads(cpu_cores)
+    if memory_mb > 0:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def run_training_job(config: Dict[str, Any], output_dir: str, cpu_cores: int, memory_mb: int, events):
+    """Fine-tune a causal LM on a text dataset; the entry point of a job process.
+
+    Loads its own copy of the base model, so nothing is shared with the
+    serving process. Progress, then ``("succeeded", path)`` or
+    ``("failed", message)``, is reported on ``events``.
+    """
+    try:
+        _limit_resources(cpu_cores, memory_mb)
+
+        from datasets import load_dataset
+        from transformers import (
+            AutoModelForCausalLM,
+            AutoTokenizer,
+            DataCollatorForLanguageModeling,
+            Trainer,
+            TrainerCallback,
+            TrainingArguments
+        )
+
+        class ProgressCallback(TrainerCallback):
+            def on_step_end(self, args, state, control, **kwargs):
+                events.put(("progress", {
+                    "step": state.global_step,
+                    "max_steps": state.max_steps,
+                    "epoch": state.epoch,
+                }))
+
+            def on_log(self, args, state, control, logs=None, **kwargs):
+                if logs and "loss" in logs:
+                    events.put(("progress", {"loss": logs["loss"]}))
+
+        tokenizer = AutoTokenizer.from_pretrained(config["model_type"])
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        model = AutoModelForCausalLM.from_pretrained(config["model_type"])
+
+        # Load dataset
+        dataset = load_dataset("text", data_files=config["dataset_path"])
+
+        # Tokenize dataset
+        def tokenize_function(examples):
+            return tokenizer(
+                examples["text"],
+                padding="max_length",
+                truncation=True,
+                max_length=config["max_length"]
+            )
+
+        tokenized_dataset = dataset.map(
+            tokenize_function,
+            batched=True,
+            num_proc=max(cpu_cores, 1),
+            remove_columns=dataset["train"].column_names
+        )
+
+        training_args = TrainingArguments(
+            output_dir=os.path.join(output_dir, "checkpoints"),
+            num_train_epochs=config["epochs"],
+            per_device_train_batch_size=config["batch_size"],
+            save_steps=500,
+            save_total_limit=2,
+            dataloader_num_workers=0,
+        )
+
+        trainer = Trainer(
+            model=model,
+            args=training_args,
+            train_dataset=tokenized_dataset["train"],
+            data_collator=DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False),
+            callbacks=[ProgressCallback()],
+        )
+        trainer.train()
+
+        # Save model and tokenizer together so the directory can be served
+        trainer.save_model(output_dir)
+        tokenizer.save_pretrained(output_dir)
+        events.put(("succeeded", output_dir))
+
+    except Exception as e:
+        events.put(("failed", f"{type(e).__name__}: {str(e)}"))
+
+class TrainingJobManager:
+    """Run fine-tuning jobs in separate processes, one at a time by default.
+
+    Each job trains its own model copy in a child process limited to
+    ``cpu_cores`` cores and ``memory_mb`` of address space (0 for no limit),
+    so training never runs on the event loop or touches the serving model.
+    Jobs beyond ``max_concurrent_jobs`` wait in order. When a job succeeds,
+    ``on_success`` is called with its model path (from a monitor thread) to
+    swap the checkpoint into serving; failed or cancelled jobs change nothing.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "models",
+        cpu_cores: int = 2,
+        memory_mb: int = 0,
+        max_concurrent_jobs: int = 1,
+        on_success: Optional[Callable[[str], None]] = None,
+    ):
+        self.output_dir = output_dir
+        self.cpu_cores = cpu_cores
+        self.memory_mb = memory_mb
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.on_success = on_success
+        self._jobs: Dict[str, TrainingJob] = {}
+        self._pending: Deque[TrainingJob] = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+        # Spawn rather than fork: the serving process has torch and
+        # executor threads that must not be copied mid-flight
+        self._context = multiprocessing.get_context("spawn")
+
+    def submit(self, config: Dict[str, Any]) -> str:
+        """Queue a training job and return its ID."""
+        job = TrainingJob(uuid.uuid4().hex, config)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._pending.append(job)
+            self._start_pending()
+        logger.info(f"Queued training job {job.job_id}")
+        return job.job_id
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[TrainingJob]:
+        return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            if job.status == "queued":
+                self._pending.remove(job)
+                self._finish(job, "cancelled")
+                return True
+            job.status = "cancelled"
+        # The monitor thread records the exit and starts the next job
+        job.process.terminate()
+        logger.info(f"Cancelled training job {job_id}")
+        return True
+
+    def shutdown(self):
+        """Stop all jobs, e.g. when the server shuts down."""
+        for job in list(self._jobs.values()):
+            self.cancel(job.job_id)
+
+    def _start_pending(self):
+        # Called with the lock held
+        while self._pending and self._running < self.max_concurrent_jobs:
+            job = self._pending.popleft()
+            events = self._context.Queue()
+            output_dir = os.path.join(
+                self.output_dir,
+                f"fine_tuned_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job.job_id[:8]}"
+            )
+            job.process = self._context.Process(
+                target=run_training_job,
+                args=(job.config, output_dir, self.cpu_cores, self.memory_mb, events),
+                name=f"training-{job.job_id[:8]}",
+                daemon=True
+            )
+            job.process.start()
+            job.status = "running"
+            job.started_at = datetime.now()
+            self._running += 1
+            threading.Thread(
+                target=self._monitor,
+                args=(job, events),
+                name=f"training-monitor-{job.job_id[:8]}",
+                daemon=True
+            ).start()
+
+    def _monitor(self, job: TrainingJob, events):
+        """Follow a job process until it exits and record the outcome."""
+        outcome, detail = None, None
+        while outcome is None:
+            try:
+                kind, value = events.get(timeout=1.0)
+            except queue.Empty:
+                if not job.process.is_alive():
+                    break
+                continue
+            if kind == "progress":
+                job.progress = {**job.progress, **value, "updated_at": time.time()}
+            else:
+                outcome, detail = kind, value
+        job.process.join()
+
+        if job.status == "cancelled":
+            outcome, detail = "cancelled", None
+        elif outcome is None:
+            # Killed without reporting, e.g. by the memory limit
+            outcome, detail = "failed", f"Training process exited with code {job.process.exitcode}"
+
+        if outcome == "succeeded":
+            job.model_path = detail
+            if self.on_success is not None:
+                try:
+                    self.on_success(detail)
+                    job.deployed = True
+                except Exception as e:
+                    logger.error(f"Error deploying model from training job {job.job_id}: {str(e)}")
+                    job.error = f"Trained but not deployed: {str(e)}"
+        elif outcome == "failed":
+            job.error = detail
+            logger.error(f"Training job {job.job_id} failed: {detail}")
+
+        with self._lock:
+            self._running -= 1
+            self._finish(job, outcome)
+            self._start_pending()
+
+    def _finish(self, job: TrainingJob, status: str):
+        job.status = status
+        job.finished_at = datetime.now()
+        logger.info(f"Training job {job.job_id} {status}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        counts = {status: 0 for status in JOB_STATUSES}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from src.admission import AdmissionController, DeadlineExceededError, OverloadedError
+
+async def hold(controller, priority, order, release=None):
+    async with controller.admit(priority):
+        order.append(priority)
+        if release is not None:
+            await release.wait()
+
+def test_waiters_are_admitted_by_priority():
+    async def run():
+        controller = AdmissionController(max_concurrent=1, queue_slo_ms=60000)
+        order = []
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(controller, "first", order, release))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.ensure_future(hold(controller, priority, order))
+            for priority in ("low", "normal", "high", "normal")
+        ]
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 4
+
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        return order, controller
+
+    order, controller = asyncio.run(run())
+    assert order == ["first", "high", "normal", "normal", "low"]
+    assert controller.get_metrics()["active"] == 0
+    assert controller.metrics["queued"] == 4
+
+def test_sheds_when_estimated_wait_exceeds_slo():
+    async def run():
+        controller = AdmissionController(max_concurrent=1, queue_slo_ms=10)
+        # Teach the controller that a request holds a slot for ~50ms
+        async with controller.admit():
+            await asyncio.sleep(0.05)
+
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(controller, "normal", [], release))
+        await asyncio.sleep(0)
+        assert controller.retry_after() is not None
+        with pytest.raises(OverloadedError) as shed:
+            async with controller.admit("high"):
+                pass
+        release.set()
+        await holder
+        return shed.value, controller
+
+    error, controller = asyncio.run(run())
+    assert error.retry_after >= 0.04
+    assert controller.metrics["shed_overload"] == 1
+
+def test_waiter_is_dropped_when_its_deadline_passes():
+    async def run():
+        controller = AdmissionController(max_concurrent=1, queue_slo_ms=60000)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(controller, "normal", [], release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(DeadlineExceededError):
+            async with controller.admit("normal", deadline=time.monotonic() + 0.02):
+                pass
+        with pytest.raises(DeadlineExceededError):
+            async with controller.admit("normal", deadline=time.monotonic() - 1):
+                pass
+        assert controller.queue_depth == 0
+
+        # The dropped waiter must not take the slot when it frees up
+        release.set()
+        await holder
+        async with controller.admit():
+            pass
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.metrics["shed_deadline"] == 2
+    assert controller.get_metrics()["active"] == 0
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        controller = AdmissionController(max_concurrent=1, queue_slo_ms=60000)
+        order = []
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(controller, "first", order, release))
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(hold(controller, "high", order))
+        waiting = asyncio.ensure_future(hold(controller, "low", order))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        release.set()
+        await asyncio.gather(holder, waiting)
+        return order, controller
+
+    order, controller = asyncio.run(run())
+    assert order == ["first", "low"]
+    assert controller.queue_depth == 0
+    assert controller.get_metrics()["active"] == 0
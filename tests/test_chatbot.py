@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from src.chatbot import Chatbot
+from src.model_registry import ModelRegistry
+
+def make_chatbot(registry):
+    return Chatbot(model_name="base", device="cpu", backend="eager", lazy_load=True, registry=registry)
+
+def test_load_model_merges_old_metrics_file(tmp_path):
+    registry = ModelRegistry()
+    chatbot = make_chatbot(registry)
+    path = str(tmp_path)
+    registry.get(chatbot._registry_key(path), lambda: (object(), object()))
+    # Written before the prompt and streaming counters existed
+    with open(tmp_path / "metrics.json", "w") as f:
+        json.dump({"total_requests": 7, "successful_responses": 6, "average_confidence": 0.5, "retired": 1}, f)
+
+    chatbot.load_model(path)
+
+    assert chatbot.model_name == path
+    assert chatbot.metrics["total_requests"] == 7
+    assert chatbot.metrics["prompts"] == 0
+    assert chatbot.metrics["decoded_sequences"] == 0
+    assert "retired" not in chatbot.metrics
+    chatbot._record_prompt([1, 2, 3], 0)
+    assert chatbot.metrics["prompts"] == 1
+
+def test_generate_responses_admits_each_query_at_its_priority():
+    chatbot = make_chatbot(ModelRegistry())
+    calls = []
+
+    async def fake_generate(text, context=None, domain=None, priority="normal", deadline=None):
+        calls.append((text, priority, deadline))
+        return text.upper(), 1.0
+
+    chatbot.generate_response = fake_generate
+
+    async def queries():
+        yield "a", {}, "high"
+        yield "b", {}, None
+
+    async def run():
+        return [result async for result in chatbot.generate_responses(queries(), deadline=12.5)]
+
+    assert asyncio.run(run()) == [(0, ("A", 1.0)), (1, ("B", 1.0))]
+    assert calls == [("a", "high", 12.5), ("b", "low", 12.5)]
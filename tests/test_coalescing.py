@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from src.admission import AdmissionController, DeadlineExceededError
+from src.coalescing import RequestCoalescer, request_fingerprint
+
+def test_fingerprint_depends_on_prompt_and_settings():
+    key = request_fingerprint([1, 2, 3], {"do_sample": False})
+    assert request_fingerprint([1, 2, 3], {"do_sample": False}) == key
+    assert request_fingerprint([1, 2, 4], {"do_sample": False}) != key
+    assert request_fingerprint([1, 2, 3], {"do_sample": True}) != key
+
+def test_identical_requests_share_one_call():
+    calls = []
+
+    async def generate(ticket):
+        calls.append(ticket)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        coalescer = RequestCoalescer(window_ms=0)
+        results = await asyncio.gather(*(coalescer.run("key", generate) for _ in range(3)))
+        return results, coalescer
+
+    results, coalescer = asyncio.run(run())
+    assert results == ["answer"] * 3
+    assert len(calls) == 1
+    assert coalescer.metrics["saved_generations"] == 2
+    assert coalescer.get_metrics()["tracked_flights"] == 0
+
+def test_joiners_retry_when_the_leader_fails():
+    calls = []
+
+    async def generate(ticket):
+        calls.append(ticket)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise DeadlineExceededError("leader gave up")
+        return "answer"
+
+    async def run():
+        coalescer = RequestCoalescer(window_ms=0)
+        results = await asyncio.gather(
+            coalescer.run("key", generate),
+            coalescer.run("key", generate),
+            return_exceptions=True
+        )
+        return results, coalescer
+
+    results, coalescer = asyncio.run(run())
+    assert isinstance(results[0], DeadlineExceededError)
+    assert results[1] == "answer"
+    assert len(calls) == 2
+    assert coalescer.metrics["failed_flights_retried"] == 1
+
+def test_joiner_stops_waiting_at_its_deadline():
+    async def generate(ticket):
+        await asyncio.sleep(0.2)
+        return "answer"
+
+    async def run():
+        coalescer = RequestCoalescer(window_ms=0)
+        leader = asyncio.ensure_future(coalescer.run("key", generate))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceededError):
+            await coalescer.run("key", generate, deadline=time.monotonic() + 0.01)
+        return await leader
+
+    assert asyncio.run(run()) == "answer"
+
+def test_joiner_raises_the_shared_priority():
+    async def run():
+        admission = AdmissionController(max_concurrent=1, queue_slo_ms=60000)
+        coalescer = RequestCoalescer(window_ms=0)
+        order = []
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.admit("normal"):
+                await release.wait()
+
+        async def other():
+            async with admission.admit("normal"):
+                order.append("other")
+
+        async def generate(ticket):
+            async with admission.admit(ticket):
+                order.append("shared")
+                return "answer"
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        leader = asyncio.ensure_future(coalescer.run("key", generate, priority="low"))
+        waiter = asyncio.ensure_future(other())
+        await asyncio.sleep(0)
+        joiner = asyncio.ensure_future(coalescer.run("key", generate, priority="high"))
+        await asyncio.sleep(0)
+
+        release.set()
+        results = await asyncio.gather(leader, joiner)
+        await asyncio.gather(holder, waiter)
+        return order, results
+
+    order, results = asyncio.run(run())
+    # Without the joiner the low-priority flight would wait behind "other"
+    assert order == ["shared", "other"]
+    assert results == ["answer", "answer"]
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from src.context_journal import ContextJournal
+
+def test_unserializable_record_does_not_drop_its_batch(tmp_path):
+    journal = ContextJournal(str(tmp_path), flush_interval=0.01)
+    journal.start()
+    journal.record_turn("c1", "hello", "hi", 1.0, None, None)
+    journal.record_turn("c2", "quote?", {"timestamp": datetime(2024, 1, 2)}, 2.0, None, None)
+    journal.record_removal("c3")
+    journal.close()
+
+    records = list(ContextJournal(str(tmp_path)).replay())
+    assert [(record["op"], record["id"]) for record in records] == [("turn", "c1"), ("remove", "c3")]
+    assert journal.metrics["records_dropped"] == 1
+    assert journal.metrics["records_written"] == 2
@@ -0,0 +1,17 @@
+import asyncio
+
+from src.context_manager import ContextManager
+from src.context_store import InMemoryContextStore
+
+def test_sweeper_runs_sweep_listeners():
+    manager = ContextManager(store=InMemoryContextStore())
+    ticks = []
+    manager.add_sweep_listener(lambda: ticks.append(1))
+
+    async def run():
+        manager.start_expiry_sweeper(interval=0.01)
+        await asyncio.sleep(0.05)
+        await manager.stop_expiry_sweeper()
+
+    asyncio.run(run())
+    assert len(ticks) >= 2
@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from src.context_manager import ContextManager
+from src.context_store import RedisContextStore
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+@pytest.fixture
+def store(client):
+    return RedisContextStore(SimpleNamespace(redis_client=client), ttl=60, max_turns=3)
+
+def test_append_and_get(store):
+    store.append_turn("c1", "hello", "hi there", topic="account")
+    store.append_turn("c1", "and billing?", "sure", user_intent="question")
+
+    context = store.get("c1")
+    assert [m["user_message"] for m in context["messages"]] == ["hello", "and billing?"]
+    assert [m["bot_response"] for m in context["messages"]] == ["hi there", "sure"]
+    assert context["topic"] == "account"
+    assert context["user_intent"] == "question"
+    assert store.exists("c1")
+    assert store.get("missing") is None
+    assert not store.exists("missing")
+
+def test_append_refreshes_ttl(store, client):
+    store.append_turn("c1", "hello", "hi")
+    messages_key, meta_key = store._keys("c1")
+    client.expire(messages_key, 5)
+    client.expire(meta_key, 5)
+
+    store.append_turn("c1", "again", "hi again")
+    assert 55 < client.ttl(messages_key) <= 60
+    assert 55 < client.ttl(meta_key) <= 60
+
+def test_append_trims_to_max_turns(store):
+    for turn in range(5):
+        store.append_turn("c1", f"message {turn}", f"response {turn}")
+
+    messages = store.get("c1")["messages"]
+    assert [m["user_message"] for m in messages] == ["message 2", "message 3", "message 4"]
+
+def test_delete_notifies(store):
+    removed = []
+    store.on_remove = removed.append
+    store.append_turn("c1", "hello", "hi")
+
+    store.delete("c1")
+    assert store.get("c1") is None
+    assert removed == ["c1"]
+
+def test_manager_runs_blocking_store_in_executor(store):
+    manager = ContextManager(store=store)
+    assert manager.store_executor is not None
+
+    async def conversation():
+        context_id = await manager.update_context_async(None, "hello", "hi")
+        await manager.update_context_async(context_id, "again", "hi again")
+        return context_id, await manager.get_context_async(context_id)
+
+    try:
+        context_id, context = asyncio.run(conversation())
+    finally:
+        manager.close()
+    assert [m["user_message"] for m in context["messages"]] == ["hello", "again"]
+    assert manager.get_metrics()["executor"]["completed"] == 3
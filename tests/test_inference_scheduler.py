@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from src.inference_scheduler import InferenceScheduler
+
+def test_concurrent_requests_share_a_batch():
+    batches = []
+
+    async def batch_fn(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    async def run():
+        scheduler = InferenceScheduler(batch_fn, max_batch_size=8, max_wait_ms=20)
+        try:
+            return await asyncio.gather(*(scheduler.submit(i) for i in range(5)))
+        finally:
+            await scheduler.close()
+
+    assert asyncio.run(run()) == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+def test_batches_are_capped_at_max_batch_size():
+    batches = []
+
+    async def batch_fn(items):
+        batches.append(list(items))
+        return items
+
+    async def run():
+        scheduler = InferenceScheduler(batch_fn, max_batch_size=2, max_wait_ms=20)
+        try:
+            results = await asyncio.gather(*(scheduler.submit(i) for i in range(5)))
+        finally:
+            await scheduler.close()
+        return results, scheduler.metrics
+
+    results, metrics = asyncio.run(run())
+    assert results == [0, 1, 2, 3, 4]
+    assert batches == [[0, 1], [2, 3], [4]]
+    assert metrics["batches"] == 3
+    assert metrics["average_batch_size"] == 5 / 3
+
+def test_batch_failure_reaches_every_caller():
+    async def batch_fn(items):
+        raise RuntimeError("out of memory")
+
+    async def run():
+        scheduler = InferenceScheduler(batch_fn, max_batch_size=4, max_wait_ms=20)
+        try:
+            return await asyncio.gather(
+                *(scheduler.submit(i) for i in range(3)),
+                return_exceptions=True
+            )
+        finally:
+            await scheduler.close()
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_close_cancels_queued_requests():
+    async def batch_fn(items):
+        return items
+
+    async def run():
+        scheduler = InferenceScheduler(batch_fn, max_batch_size=4, max_wait_ms=1000)
+        waiting = asyncio.ensure_future(scheduler.submit(1))
+        await asyncio.sleep(0)
+        await scheduler.close()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(run())
@@ -0,0 +1,21 @@
+from src.model_registry import ModelRegistry
+
+def load():
+    return object(), object()
+
+def test_release_keeps_model_while_referenced():
+    registry = ModelRegistry()
+    registry.retain("gpt2")
+    registry.retain("gpt2")
+    registry.get("gpt2", load)
+
+    assert not registry.release("gpt2")
+    assert registry.loaded("gpt2")
+    assert registry.release("gpt2")
+    assert not registry.loaded("gpt2")
+
+def test_release_of_unloaded_model():
+    registry = ModelRegistry()
+    registry.retain("gpt2")
+    assert not registry.release("gpt2")
+    assert registry.get_metrics()["references"] == {}
@@ -0,0 +1,23 @@
+import asyncio
+
+from redis.exceptions import ConnectionError
+
+from src.rate_limit import RedisRateLimitBackend
+
+class DownClient:
+    """Redis client whose scripts fail as if the server were unreachable."""
+
+    def register_script(self, script):
+        async def call(keys, args):
+            raise ConnectionError("Connection refused")
+        return call
+
+def test_redis_backend_fails_open():
+    backend = RedisRateLimitBackend(DownClient(), "sliding_window", max_requests=5, window_size=60)
+
+    async def run():
+        return [await backend.hit("client") for _ in range(10)]
+
+    results = asyncio.run(run())
+    assert all(result.allowed for result in results)
+    assert results[0].limit == 5
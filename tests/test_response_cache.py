@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from src import response_cache
+from src.response_cache import ResponseCache
+
+class DictBackend:
+    """Stand-in for a CacheManager that records which thread calls it."""
+
+    def __init__(self):
+        self.values = {}
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.current_thread())
+        return self.values.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.threads.add(threading.current_thread())
+        self.values[key] = value
+        return True
+
+def test_normalize_ignores_case_and_whitespace():
+    assert ResponseCache.normalize("  How do I\treset   my PASSWORD? ") == "how do i reset my password?"
+
+def test_key_uses_normalized_query_context_and_settings():
+    cache = ResponseCache()
+    settings = {"do_sample": False}
+    key = cache.make_key("Reset my  password", {"domain": "support"}, settings)
+
+    assert cache.make_key("reset my password", {"domain": "support"}, settings) == key
+    assert cache.make_key("reset my password", {"domain": "financial"}, settings) != key
+    assert cache.make_key("reset my password", {"domain": "support"}, {"do_sample": True}) != key
+
+def test_entries_are_keyed_by_query():
+    cache = ResponseCache(ttl=60)
+    settings = {"do_sample": False}
+
+    async def run():
+        await cache.set(cache.make_key("ABC123 status?", {}, settings), "answer", 0.9, 1.5)
+        return (
+            await cache.get(cache.make_key("abc123  status?", {}, settings)),
+            await cache.get(cache.make_key("abc124 status?", {}, settings)),
+        )
+
+    assert asyncio.run(run()) == (("answer", 0.9), None)
+    assert cache.metrics["saved_generation_seconds"] == 1.5
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = ResponseCache(ttl=60)
+    now = time.monotonic()
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(monotonic=lambda: now))
+    asyncio.run(cache.set("key", "answer", 0.9, 1.0))
+
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(monotonic=lambda: now + 59))
+    assert asyncio.run(cache.get("key")) == ("answer", 0.9)
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(monotonic=lambda: now + 61))
+    assert asyncio.run(cache.get("key")) is None
+    assert cache.get_metrics()["entries"] == 0
+
+def test_backend_calls_run_off_the_event_loop():
+    backend = DictBackend()
+    cache = ResponseCache(backend=backend)
+
+    async def run():
+        await cache.set("key", "answer", 0.9, 1.0)
+        return await cache.get("key")
+
+    try:
+        assert asyncio.run(run()) == ("answer", 0.9)
+    finally:
+        cache.close()
+    assert backend.threads and threading.main_thread() not in backend.threads
@@ -0,0 +1,96 @@
+"""Benchmark assisted (speculative) decoding against plain greedy decoding.
+
+Decodes the prompt mix greedily with the main model alone and with a draft
+model proposing tokens, checks that both produce identical output, and
+reports latency, throughput and the draft-token acceptance rate.
+
+Usage:
+    python tools/benchmarks/assisted_decoding.py --model gpt2-medium --draft distilgpt2
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.assisted_decoding import (  # noqa: E402
+    AcceptanceStats,
+    count_forward_passes,
+    install_pass_counter,
+)
+from src.inference_backends import load_causal_lm, percentile  # noqa: E402
+from tools.benchmarks.prompt_mix import PROMPT_MIX  # noqa: E402
+
+def decode(model, tokenizer, prompt, max_new_tokens, assistant_model=None, stats=None):
+    inputs = tokenizer(prompt, return_tensors="pt")
+    started = time.perf_counter()
+    with torch.no_grad(), count_forward_passes() as passes:
+        sequences = model.generate(
+            **inputs,
+            assistant_model=assistant_model,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    elapsed = time.perf_counter() - started
+    generated = sequences[0, inputs["input_ids"].shape[1]:].tolist()
+    if stats is not None:
+        stats.record(len(generated), passes)
+    return generated, elapsed
+
+def summarize(latencies, tokens):
+    total = sum(latencies)
+    return {
+        "p50_latency_ms": percentile(latencies, 0.50) * 1000,
+        "p95_latency_ms": percentile(latencies, 0.95) * 1000,
+        "tokens_per_second": tokens / total if total else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="gpt2-medium")
+    parser.add_argument("--draft", default="distilgpt2")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--max-new-tokens", type=int, default=48)
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the prompt mix")
+    args = parser.parse_args()
+
+    model, tokenizer = load_causal_lm(args.model, args.device)
+    draft, _ = load_causal_lm(args.draft, args.device)
+    install_pass_counter(model, "main")
+    install_pass_counter(draft, "draft")
+
+    prompts = PROMPT_MIX * args.repeats
+    decode(model, tokenizer, prompts[0], args.max_new_tokens)  # warm up
+    decode(model, tokenizer, prompts[0], args.max_new_tokens, assistant_model=draft)
+
+    stats = AcceptanceStats()
+    plain_latencies, assisted_latencies = [], []
+    plain_tokens = assisted_tokens = mismatches = 0
+    for prompt in prompts:
+        plain, plain_elapsed = decode(model, tokenizer, prompt, args.max_new_tokens)
+        assisted, assisted_elapsed = decode(
+            model, tokenizer, prompt, args.max_new_tokens, assistant_model=draft, stats=stats
+        )
+        plain_latencies.append(plain_elapsed)
+        assisted_latencies.append(assisted_elapsed)
+        plain_tokens += len(plain)
+        assisted_tokens += len(assisted)
+        mismatches += plain != assisted
+
+    results = {
+        "greedy": summarize(plain_latencies, plain_tokens),
+        "assisted": {**summarize(assisted_latencies, assisted_tokens), **stats.get_metrics()},
+        "output_mismatches": mismatches,
+    }
+    print(json.dumps(results, indent=2))
+    if mismatches:
+        print(f"WARNING: {mismatches} prompts decoded differently with the draft model")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measure the memory held per conversation context.
+
+Fills a context store with synthetic sessions and reports traced bytes per
+session for the previous dict-based layout (datetimes, ISO timestamp
+strings, per-turn dicts, a plain list) and for the compact records of
+InMemoryContextStore. Message text is the same in both layouts.
+
+Usage:
+    python tools/benchmarks/context_memory.py --sessions 100000 1000000 --turns 3
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.context_store import InMemoryContextStore  # noqa: E402
+
+def message(session, turn):
+    return f"What is the price of stock {session % 5000} today? ({turn})"
+
+def response(session, turn):
+    return f"Stock {session % 5000} trades at {session % 997}.{turn:02d} USD."
+
+def fill_legacy(sessions, turns):
+    """Contexts as the original ContextManager stored them."""
+    contexts = {}
+    for session in range(sessions):
+        messages = []
+        for turn in range(turns):
+            messages.append({
+                "user_message": message(session, turn),
+                "bot_response": response(session, turn),
+                "timestamp": datetime.now().isoformat()
+            })
+        contexts[str(uuid.uuid4())] = {
+            "created_at": datetime.now(),
+            "last_updated": datetime.now(),
+            "data": {
+                "messages": messages,
+                "topic": "financial",
+                "user_intent": "question"
+            }
+        }
+    return contexts
+
+def fill_compact(sessions, turns):
+    store = InMemoryContextStore(max_contexts=0)
+    for session in range(sessions):
+        context_id = str(uuid.uuid4())
+        for turn in range(turns):
+            store.append_turn(
+                context_id,
+                message(session, turn),
+                response(session, turn),
+                topic="financial",
+                user_intent="question"
+            )
+    return store
+
+def measure(fill, sessions, turns):
+    gc.collect()
+    tracemalloc.start()
+    held = fill(sessions, turns)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    gc.collect()
+    return current / sessions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    args = parser.parse_args()
+
+    results = {}
+    for sessions in args.sessions:
+        before = measure(fill_legacy, sessions, args.turns)
+        after = measure(fill_compact, sessions, args.turns)
+        results[sessions] = {
+            "before_bytes_per_session": round(before),
+            "after_bytes_per_session": round(after),
+            "reduction": f"{1 - after / before:.1%}",
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Compare inference backends on the same prompts.
+
+Loads the model once per backend (eager fp32, dynamic int8, ONNX Runtime),
+checks greedy-output parity and confidence drift against eager, and reports
+latency and throughput.
+
+Usage:
+    python tools/benchmarks/inference_backends.py --model gpt2
+    python tools/benchmarks/inference_backends.py --backends eager int8 --check
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.inference_backends import (  # noqa: E402
+    INFERENCE_BACKENDS,
+    benchmark_backend,
+    check_parity,
+    load_causal_lm,
+)
+from tools.benchmarks.prompt_mix import PROMPT_MIX  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="gpt2")
+    parser.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS), choices=INFERENCE_BACKENDS)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the prompt mix")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if parity thresholds fail")
+    parser.add_argument("--min-token-agreement", type=float, default=0.9)
+    parser.add_argument("--max-confidence-drift", type=float, default=0.05)
+    args = parser.parse_args()
+
+    prompts = PROMPT_MIX * args.repeats
+    reference, tokenizer = load_causal_lm(args.model, "cpu", "eager")
+
+    results = {}
+    failed = False
+    for backend in args.backends:
+        model = reference if backend == "eager" else load_causal_lm(args.model, "cpu", backend)[0]
+        result = benchmark_backend(model, tokenizer, prompts, args.max_new_tokens)
+        if backend != "eager":
+            parity = check_parity(reference, model, tokenizer, PROMPT_MIX, args.max_new_tokens)
+            result["parity"] = parity
+            failed |= (
+                parity["token_agreement"] < args.min_token_agreement
+                or parity["max_confidence_drift"] > args.max_confidence_drift
+            )
+        results[backend] = result
+        print(f"{backend}: {json.dumps(result, indent=2)}")
+
+    if "eager" in results:
+        base = results["eager"]["tokens_per_second"]
+        for backend, result in results.items():
+            if base:
+                print(f"{backend}: {result['tokens_per_second'] / base:.2f}x eager throughput")
+
+    if args.check and failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare topic/intent keyword matching against the per-keyword loops.
+
+Builds keyword tables of increasing size and times the previous approach
+(``any(keyword in message)`` per label) against the compiled KeywordMatcher
+on a mix of chat messages, checking both agree on every message.
+
+Usage:
+    python tools/benchmarks/keyword_matching.py --sizes 10 100 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.keyword_matcher import DEFAULT_KEYWORD_TABLES, KeywordMatcher  # noqa: E402
+from tools.benchmarks.prompt_mix import PROMPT_MIX  # noqa: E402
+
+def build_tables(size, rng):
+    """Default tables padded with synthetic keywords to ``size`` in total."""
+    tables = {field: {label: list(keywords) for label, keywords in labels.items()}
+              for field, labels in DEFAULT_KEYWORD_TABLES.items()}
+    slots = [keywords for labels in tables.values() for keywords in labels.values()]
+    existing = sum(len(keywords) for keywords in slots)
+    for index in range(max(size - existing, 0)):
+        word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(5, 10)))
+        slots[index % len(slots)].append(f"{word}{index}")
+    if size < existing:
+        # Keep the first keywords of each label
+        per_slot = max(size // len(slots), 1)
+        for keywords in slots:
+            del keywords[per_slot:]
+    return tables
+
+def loop_match(tables, message):
+    """The previous matching code."""
+    message_lower = message.lower()
+    result = {}
+    for field, labels in tables.items():
+        result[field] = None
+        for label, keywords in labels.items():
+            if any(keyword in message_lower for keyword in keywords):
+                result[field] = label
+                break
+    return result
+
+def timed(fn, messages, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for message in messages:
+            fn(message)
+    return (time.perf_counter() - started) / (repeats * len(messages))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 5000])
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    messages = list(PROMPT_MIX)
+    results = {}
+    for size in args.sizes:
+        tables = build_tables(size, rng)
+        keywords = sum(len(keywords) for labels in tables.values() for keywords in labels.values())
+        matcher = KeywordMatcher(tables)
+        mismatches = sum(matcher.match(message) != loop_match(tables, message) for message in messages)
+
+        repeats = max(args.repeats * 100 // max(size, 100), 3)
+        loop_seconds = timed(lambda message: loop_match(tables, message), messages, repeats)
+        matcher_seconds = timed(matcher.match, messages, repeats)
+        results[size] = {
+            "keywords": keywords,
+            "loop_us_per_message": round(loop_seconds * 1e6, 2),
+            "matcher_us_per_message": round(matcher_seconds * 1e6, 2),
+            "speedup": round(loop_seconds / matcher_seconds, 2),
+            "mismatches": mismatches,
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Measure KV cache reuse over a long support conversation.
+
+Plays a scripted support conversation past the context's 10-turn limit
+through Chatbot.generate_response, storing a scripted answer after every
+turn. Generation is capped at one new token, so each turn's latency is
+dominated by prefilling the prompt. Reports, for the first 10 turns and
+the turns after them, the KV cache hit rate, reused prompt tokens and
+prefill latency for:
+
+- the KV cache disabled (every turn encodes its whole prompt);
+- old turns dropped one at a time (history_eviction_block=1);
+- old turns dropped in blocks (the default).
+
+Usage:
+    python tools/benchmarks/kv_cache_conversation.py --turns 30 --model gpt2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.chatbot import Chatbot  # noqa: E402
+from src.context_manager import ContextManager  # noqa: E402
+from src.context_store import InMemoryContextStore  # noqa: E402
+from src.inference_backends import percentile  # noqa: E402
+
+QUESTIONS = [
+    "I can't log in, the app says my account is locked.",
+    "I already tried resetting my password twice.",
+    "The reset email never arrives, I checked the spam folder.",
+    "My email address is the one on the account, yes.",
+    "Can you unlock it from your side?",
+    "It still says locked after I restarted the app.",
+    "Now it asks for a verification code I never got.",
+    "How long does the verification code take to arrive?",
+    "Can you send it by SMS instead?",
+    "My phone number changed last month.",
+    "How do I update my phone number without logging in?",
+    "I uploaded my ID as you asked.",
+    "Will my saved payment methods still be there?",
+    "I was charged while the account was locked, can I get a refund?",
+    "The charge is from the 3rd of this month.",
+]
+
+def answer(turn):
+    return (
+        f" Thanks for the details. I've checked your account and noted step {turn}; "
+        "please try again in a few minutes and let me know what you see."
+    )
+
+async def play(chatbot, context_manager, turns):
+    records = []
+    context_id = None
+    for turn in range(turns):
+        text = QUESTIONS[turn % len(QUESTIONS)]
+        context = context_manager.get_context(context_id) if context_id else {}
+        before = dict(chatbot.kv_cache.metrics)
+        started = time.perf_counter()
+        await chatbot.generate_response(text, context=context, context_id=context_id if context else None)
+        elapsed = time.perf_counter() - started
+        metrics = chatbot.kv_cache.metrics
+        records.append({
+            "turn": turn + 1,
+            "ms": elapsed * 1000,
+            "hit": metrics["hits"] > before["hits"],
+            "reused_tokens": metrics["reused_tokens"] - before["reused_tokens"],
+        })
+        context_id = context_manager.update_context(context_id, text, answer(turn + 1))
+    return records
+
+def summarize(records):
+    if not records:
+        return {}
+    latencies = [record["ms"] / 1000 for record in records]
+    return {
+        "turns": len(records),
+        "hit_rate": sum(record["hit"] for record in records) / len(records),
+        "average_reused_tokens": sum(record["reused_tokens"] for record in records) / len(records),
+        "p50_prefill_ms": percentile(latencies, 0.50) * 1000,
+        "average_prefill_ms": sum(latencies) / len(latencies) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="gpt2")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--max-input-tokens", type=int, default=None)
+    args = parser.parse_args()
+
+    setups = {
+        "kv cache disabled": {"kv_cache_max_mb": 0},
+        "evict one turn at a time": {"history_eviction_block": 1},
+        "evict in blocks": {},
+    }
+    results = {}
+    for name, options in setups.items():
+        context_manager = ContextManager(store=InMemoryContextStore(max_contexts=0))
+        chatbot = Chatbot(
+            model_name=args.model,
+            device=args.device,
+            max_new_tokens=1,
+            max_input_tokens=args.max_input_tokens,
+            do_sample=False,
+            coalesce_window_ms=0,
+            context_manager=context_manager,
+            **options
+        )
+        # Warm up the model outside the measured conversation
+        asyncio.run(chatbot.generate_response("Hello"))
+        records = asyncio.run(play(chatbot, context_manager, args.turns))
+        results[name] = {
+            "turns 1-10": summarize(records[:10]),
+            "turns 11+": summarize(records[10:]),
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
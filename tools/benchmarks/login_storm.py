@@ -0,0 +1,115 @@
+"""Measure chat latency while a storm of logins hits /token.
+
+Serves /token and a stub chat route in-process through httpx's ASGI
+transport. The chat route awaits a fixed delay standing in for inference,
+which runs off the event loop, so any extra latency comes from the event
+loop being blocked. Compares the previous login handler, which ran bcrypt
+inline, with the pooled and throttled one.
+
+Usage:
+    python tools/benchmarks/login_storm.py --duration 10 --login-clients 20 --usernames 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.executors import ExecutorSaturatedError  # noqa: E402
+from src.security import (  # noqa: E402
+    get_password_hash,
+    get_password_hash_async,
+    throttle_login,
+    verify_password,
+    verify_password_async,
+)
+
+def build_app(mode: str, chat_seconds: float):
+    app = FastAPI()
+
+    @app.post("/chat")
+    async def chat(message: dict):
+        await asyncio.sleep(chat_seconds)
+        return {"response": "ok"}
+
+    if mode == "before":
+        @app.post("/token")
+        async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+            # bcrypt on the event loop, as the handler used to
+            if not verify_password(form_data.password, get_password_hash(form_data.password)):
+                raise HTTPException(status_code=401)
+            return {"token_type": "bearer"}
+    else:
+        @app.post("/token")
+        async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+            await throttle_login(form_data.username)
+            try:
+                hashed_password = await get_password_hash_async(form_data.password)
+                if not await verify_password_async(form_data.password, hashed_password):
+                    raise HTTPException(status_code=401)
+            except ExecutorSaturatedError:
+                raise HTTPException(status_code=503)
+            return {"token_type": "bearer"}
+
+    return app
+
+async def run(app, args):
+    transport = httpx.ASGITransport(app=app)
+    deadline = time.perf_counter() + args.duration
+    latencies = []
+    login_statuses = Counter()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def chat_client():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.post("/chat", json={"text": "hello"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        async def login_client(index):
+            username = f"user{index % args.usernames}"
+            while time.perf_counter() < deadline:
+                response = await client.post("/token", data={"username": username, "password": "hunter2"})
+                login_statuses[response.status_code] += 1
+
+        await asyncio.gather(
+            *(chat_client() for _ in range(args.chat_clients)),
+            *(login_client(index) for index in range(args.login_clients))
+        )
+
+    latencies.sort()
+    return {
+        "chat_requests": len(latencies),
+        "chat_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "chat_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        "logins_by_status": dict(sorted(login_statuses.items())),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--chat-clients", type=int, default=10)
+    parser.add_argument("--chat-ms", type=float, default=20.0, help="simulated inference time")
+    parser.add_argument("--login-clients", type=int, default=20)
+    parser.add_argument("--usernames", type=int, default=5, help="distinct usernames in the storm")
+    args = parser.parse_args()
+
+    results = {"quiet": asyncio.run(run(build_app("after", args.chat_ms / 1000), argparse.Namespace(
+        **{**vars(args), "login_clients": 0}
+    )))}
+    for mode in ("before", "after"):
+        results[mode] = asyncio.run(run(build_app(mode, args.chat_ms / 1000), args))
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
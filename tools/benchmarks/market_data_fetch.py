@@ -0,0 +1,112 @@
+"""Compare sequential and concurrent market data fetching against a local stub.
+
+Starts an aiohttp stub quote server on localhost that answers
+``GET /quotes?symbols=...`` after a fixed latency per call, failing a
+share of symbols and stalling others. Then fetches the same symbols:
+
+- sequentially, one call per symbol, as the financial routes used to;
+- through MarketDataClient with one call per symbol, all concurrent;
+- through MarketDataClient with the multi-symbol HTTP provider.
+
+Usage:
+    python tools/benchmarks/market_data_fetch.py --symbols 10 --latency-ms 150
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.market_data import HTTPQuoteProvider, MarketDataClient  # noqa: E402
+
+def build_stub(latency: float, failing: set, stalled: set) -> web.Application:
+    async def quotes(request):
+        symbols = request.query["symbols"].split(",")
+        await asyncio.sleep(60 if stalled.intersection(symbols) and len(symbols) == 1 else latency)
+        return web.json_response({
+            symbol: {
+                "price": round(random.uniform(10, 500), 2),
+                "change": round(random.uniform(-5, 5), 2),
+                "change_percent": None,
+                "volume": None,
+                "market_cap": None,
+            }
+            for symbol in symbols if symbol not in failing and symbol not in stalled
+        })
+
+    app = web.Application()
+    app.router.add_get("/quotes", quotes)
+    return app
+
+class PerSymbolHTTPProvider(HTTPQuoteProvider):
+    max_batch_size = 1
+
+async def sequential(provider, symbols):
+    quotes = {}
+    for symbol in symbols:
+        try:
+            quotes.update(await provider.fetch_quotes([symbol]))
+        except Exception:
+            continue
+    return quotes
+
+async def run(args):
+    symbols = [f"SYM{index}" for index in range(args.symbols)]
+    failing = set(symbols[:args.failing])
+    stalled = set(symbols[args.failing:args.failing + args.stalled])
+
+    runner = web.AppRunner(build_stub(args.latency_ms / 1000, failing, stalled))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    results = {}
+    try:
+        # Stalled symbols are skipped here: with no timeouts they would hang
+        provider = PerSymbolHTTPProvider(base_url)
+        started = time.perf_counter()
+        quotes = await sequential(provider, [symbol for symbol in symbols if symbol not in stalled])
+        results["sequential (no stalled symbols)"] = {
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "symbols_returned": len(quotes),
+        }
+        await provider.close()
+
+        for name, provider in (
+            ("concurrent per-symbol", PerSymbolHTTPProvider(base_url)),
+            ("multi-symbol call", HTTPQuoteProvider(base_url)),
+        ):
+            client = MarketDataClient(provider, call_timeout=args.call_timeout, deadline=args.deadline)
+            started = time.perf_counter()
+            quotes = await client.get(symbols)
+            results[name] = {
+                "ms": round((time.perf_counter() - started) * 1000, 1),
+                "symbols_returned": len(quotes),
+                "metrics": client.get_metrics(),
+            }
+            await client.close()
+    finally:
+        await runner.cleanup()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="stub latency per call")
+    parser.add_argument("--failing", type=int, default=1, help="symbols the stub has no quote for")
+    parser.add_argument("--stalled", type=int, default=1, help="symbols whose single-symbol calls hang")
+    parser.add_argument("--call-timeout", type=float, default=1.0)
+    parser.add_argument("--deadline", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Measure requests/sec through the authentication and rate limit middleware.
+
+Serves /health and a stub chat route (no model) in-process through httpx's
+ASGI transport, once with the middleware wrapped in Starlette's
+BaseHTTPMiddleware as before and once as the pure ASGI middleware, running
+the same token check and rate limit backend in both.
+
+Usage:
+    python tools/benchmarks/middleware_throughput.py --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+from jose import jwt
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# Never reject during the benchmark
+os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", "1000000000")
+
+from src.api.middleware.authentication import (  # noqa: E402
+    AuthenticationError,
+    AuthenticationMiddleware,
+    authenticate,
+)
+from src.api.middleware.rate_limiter import RateLimitMiddleware  # noqa: E402
+
+class LegacyAuthenticationMiddleware(BaseHTTPMiddleware):
+    """The previous BaseHTTPMiddleware structure around the same token check."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.auth = AuthenticationMiddleware(app)
+
+    async def dispatch(self, request, call_next):
+        if request.url.path in self.auth.public_paths:
+            return await call_next(request)
+        try:
+            request.state.user = authenticate(request.scope, self.auth.secret_key, self.auth.algorithm)
+        except AuthenticationError as e:
+            return JSONResponse({"detail": str(e)}, status_code=401)
+        return await call_next(request)
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """The previous BaseHTTPMiddleware structure around the same limiter."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.limiter = RateLimitMiddleware(app)
+
+    async def dispatch(self, request, call_next):
+        if request.url.path == "/health":
+            return await call_next(request)
+        result = await self.limiter.backend.hit(self.limiter._client_key(request.scope))
+        if not result.allowed:
+            return JSONResponse({"detail": "Too many requests"}, status_code=429)
+        response = await call_next(request)
+        response.headers.update(self.limiter._headers(result))
+        return response
+
+def build_app(auth_middleware, rate_limit_middleware):
+    app = FastAPI()
+    app.add_middleware(auth_middleware)
+    app.add_middleware(rate_limit_middleware)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.post("/chat")
+    async def chat(message: dict):
+        return {"response": f"Echo: {message.get('text', '')}", "confidence": 1.0}
+
+    return app
+
+async def run(app, method, path, requests, concurrency, headers, body=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def worker(count):
+            for _ in range(count):
+                response = await client.request(method, path, headers=headers, json=body)
+                response.raise_for_status()
+
+        await worker(10)  # warm up
+        per_worker = requests // concurrency
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+        return per_worker * concurrency / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    token = jwt.encode(
+        {"sub": "benchmark", "exp": datetime.utcnow() + timedelta(hours=1)},
+        os.getenv("JWT_SECRET_KEY", "your-secret-key"),
+        algorithm="HS256"
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    stacks = {
+        "before (BaseHTTPMiddleware)": build_app(LegacyAuthenticationMiddleware, LegacyRateLimitMiddleware),
+        "after (pure ASGI)": build_app(AuthenticationMiddleware, RateLimitMiddleware),
+    }
+
+    results = {}
+    for name, app in stacks.items():
+        results[name] = {
+            "health_rps": round(asyncio.run(
+                run(app, "GET", "/health", args.requests, args.concurrency, headers)
+            )),
+            "chat_rps": round(asyncio.run(
+                run(app, "POST", "/chat", args.requests, args.concurrency, headers, {"text": "hello"})
+            )),
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
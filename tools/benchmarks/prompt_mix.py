@@ -0,0 +1,20 @@
+"""Representative prompts for inference benchmarks.
+
+Formatted the way Chatbot._prepare_input builds model inputs, mixing
+financial analysis and customer support traffic.
+"""
+
+PROMPT_MIX = [
+    "domain: financial\nMessage: What's happening with TSLA today?\nResponse:",
+    "domain: financial\nMessage: Should I be worried about the drop in AAPL after earnings?\nResponse:",
+    "topic: financial user_intent: question domain: financial\nMessage: How do rising interest rates affect bank stocks?\nResponse:",
+    "domain: financial\nMessage: Compare the dividend yield of KO and PEP.\nResponse:",
+    "domain: financial\nMessage: Explain what a P/E ratio tells me about a company.\nResponse:",
+    "domain: support\nMessage: How to reset my password?\nResponse:",
+    "domain: support\nMessage: I can't log in, the app says my account is locked.\nResponse:",
+    "topic: support user_intent: complaint domain: support\nMessage: The export button is not working and I get an error.\nResponse:",
+    "domain: support\nMessage: Can you please help me update my billing address?\nResponse:",
+    "domain: support\nMessage: Why was I charged twice this month?\nResponse:",
+    "Hello, what can you help me with?",
+    "Message: Please summarize the latest market news for technology stocks.\nResponse:",
+]